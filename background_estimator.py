@@ -0,0 +1,96 @@
+"""
+后台大小预估
+
+参数面板每次变化都提交一个预估请求，由后台线程执行，界面不等待试编码：
+- 防抖：请求提交后等待一小段时间，期间又有新请求则只执行最新的
+- 取消：新请求到达后，正在执行的旧请求通过cancelled()得知已过期，在下一个检查点放弃
+- 界面始终显示最近一次完成的结果，新结果到达前标记为已过期
+每个请求使用一个守护线程（被取代的请求在防抖结束或下一个检查点即退出）。
+"""
+
+import threading
+import time
+
+# 后台预估配置
+BACKGROUND_CONFIG = {
+    "debounce": 0.4,  # 秒，最后一次参数变化后等待多久才开始预估
+    "poll_interval": 0.5  # 秒，界面轮询结果的间隔
+}
+
+class BackgroundEstimator:
+    """一个会话的后台预估：只保留最新请求和最近一次完成的结果"""
+
+    def __init__(self, debounce=None):
+        self.debounce = BACKGROUND_CONFIG["debounce"] if debounce is None else debounce
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._requested_key = None
+        self._running_key = None
+        self._result = None
+
+    def submit(self, key, compute, prepare_thread=None):
+        """提交预估请求，与最新请求相同的key不重复提交
+
+        compute(cancelled) 在后台线程执行并返回结果，cancelled() 为True表示已被新请求取代；
+        prepare_thread(thread) 在线程启动前调用（例如绑定界面框架的运行上下文）。
+        返回是否提交了新请求。
+        """
+        with self._lock:
+            if key == self._requested_key:
+                return False
+            self._generation += 1
+            generation = self._generation
+            self._requested_key = key
+
+        thread = threading.Thread(target=self._run, args=(generation, key, compute), daemon=True)
+        if prepare_thread is not None:
+            prepare_thread(thread)
+        thread.start()
+        return True
+
+    def _is_current(self, generation):
+        return generation == self._generation
+
+    def _run(self, generation, key, compute):
+        time.sleep(self.debounce)
+        if not self._is_current(generation):
+            return
+
+        with self._lock:
+            self._running_key = key
+        started = time.perf_counter()
+        try:
+            value = compute(lambda: not self._is_current(generation))
+            error = None
+        except Exception as e:
+            value, error = None, str(e)
+
+        with self._lock:
+            if self._running_key == key:
+                self._running_key = None
+            # 被取代的请求的结果直接丢弃
+            if self._is_current(generation):
+                self._result = {
+                    'key': key,
+                    'value': value,
+                    'error': error,
+                    'elapsed': time.perf_counter() - started,
+                    'finished_at': time.time()
+                }
+
+    def status(self):
+        """返回 {'result', 'stale', 'running'}：result为最近一次完成的结果（可能对应旧参数），
+        stale表示它不是最新请求的结果"""
+        with self._lock:
+            result = self._result
+            return {
+                'result': result,
+                'stale': result is None or result['key'] != self._requested_key,
+                'running': self._running_key is not None
+            }
+
+    def cancel(self):
+        """取消所有未完成的请求（结果保留）"""
+        with self._lock:
+            self._generation += 1
+            self._requested_key = None
@@ -0,0 +1,239 @@
+"""
+批量转换
+
+多个视频使用同一组参数预设和大小约束，在有上限的进程池中转换，结果打包为一个ZIP：
+- 每个工作进程同时只转换一个视频（单个视频的帧数有上限），服务进程只传递文件路径、不持有GIF字节，
+  内存占用由进程数决定，与文件数量无关
+- 进程数不超过CPU核数，吞吐量随核数增长；文件级并行时工作进程内不再启动并行编码
+- 工作进程通过队列报告每个文件的进度；完成的GIF按完成顺序逐个写入磁盘上的ZIP（GIF已压缩，不再压缩）
+"""
+
+import os
+import queue as queue_module
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+
+from PIL import Image
+
+from ffmpeg_decoder import DECODE_CONFIG
+from gif_engine import convert_video
+from parallel_encode import PARALLEL_CONFIG
+from temp_store import get_temp_store
+from video_handle import get_video_handle
+
+# 批量转换配置
+BATCH_CONFIG = {
+    "max_workers": 4,  # 进程数上限（不超过CPU核数）
+    "max_files": 50,  # 单次批量转换的文件数上限
+    "work_dir": Path(__file__).with_name("temp_uploads") / "batch",  # 转换中的GIF和ZIP的存放目录（完成后ZIP移入临时存储）
+    "progress_step": 0.05,  # 工作进程的进度变化超过此值才报告，避免队列被逐帧消息占满
+    "poll_interval": 0.2  # 调度方检查完成情况和进度队列的间隔（秒）
+}
+
+# 工作进程的进度队列（由进程池的initializer设置）
+_progress_queue = None
+
+def worker_count(file_count):
+    return max(1, min(BATCH_CONFIG["max_workers"], os.cpu_count() or 1, file_count))
+
+def init_worker(progress_queue=None, decode_config=None):
+    """工作进程的初始化（进程池的initializer，命令行工具的并行转换同样使用）
+
+    decode_config 为调度方的解码后端配置（spawn启动的工作进程不继承调度方修改过的配置）。
+    """
+    global _progress_queue
+    _progress_queue = progress_queue
+    if decode_config:
+        DECODE_CONFIG.update(decode_config)
+    # 工作进程不回收临时存储中的文件（引用都在服务进程中）
+    get_temp_store(reap=False)
+    # 并行度来自文件级的进程池，单个文件的约束优化按顺序求解
+    PARALLEL_CONFIG["max_workers"] = 1
+
+def preset_params(preset, metadata):
+    """按视频自身的分辨率展开参数预设
+
+    preset 指定 width/height 时按其取值（只指定一项时按原宽高比计算另一项），
+    否则按 preset['scale']（相对原始尺寸的缩放比例）计算。
+    """
+    params = {name: value for name, value in preset.items() if name != 'scale'}
+    width, height = preset.get('width'), preset.get('height')
+    if width or height:
+        width = width or metadata['width'] * height / metadata['height']
+        height = height or metadata['height'] * width / metadata['width']
+    else:
+        scale = preset.get('scale', 1.0)
+        width, height = metadata['width'] * scale, metadata['height'] * scale
+    params['width'] = max(10, min(2000, int(width)))
+    params['height'] = max(10, min(2000, int(height)))
+    return params
+
+def archive_names(names):
+    """ZIP中的文件名：原文件名换成.gif，重名时加序号"""
+    used = set()
+    result = []
+    for name in names:
+        stem = Path(name).stem or "video"
+        candidate = f"{stem}.gif"
+        number = 2
+        while candidate.lower() in used:
+            candidate = f"{stem} ({number}).gif"
+            number += 1
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+def convert_file(video_path, output_path, preset, size_constraint, progress=None):
+    """按参数预设转换一个视频并把GIF写入output_path，返回结果摘要（不包含GIF字节）
+
+    摘要包括 size、width、height、params（展开后的参数）、messages、timings（各阶段耗时）、elapsed，
+    失败时包括 error。
+    """
+    started = time.perf_counter()
+    messages = []
+    timings = {}
+
+    def notify(kind, message):
+        messages.append((kind, message))
+
+    def summary(**fields):
+        fields.update(messages=messages, timings=timings, elapsed=time.perf_counter() - started)
+        return fields
+
+    if progress is not None:
+        progress(0.0, "正在读取视频...")
+    metadata = get_video_handle(video_path).metadata()
+    if not metadata or metadata['width'] <= 0 or metadata['height'] <= 0:
+        return summary(error="无法打开视频文件，可能是格式不支持或文件已损坏")
+
+    params = preset_params(preset, metadata)
+    gif_data = convert_video(video_path, params, size_constraint, notify, progress, timings)
+    if not gif_data:
+        errors = [message for kind, message in messages if kind == 'error']
+        return summary(error=errors[0] if errors else "转换失败", params=params)
+
+    stage_started = time.perf_counter()
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(gif_data)
+    os.replace(tmp_path, output_path)
+    timings['write'] = time.perf_counter() - stage_started
+    try:
+        with Image.open(output_path) as img:
+            width, height = img.width, img.height
+    except Exception:
+        width = height = None
+    return summary(size=len(gif_data), width=width, height=height, params=params)
+
+def _convert_file(number, video_path, output_path, preset, size_constraint):
+    """工作进程：转换一个视频，进度通过队列报告给调度方"""
+    reported = {'fraction': -1.0}
+
+    def progress(fraction, text):
+        if fraction is not None:
+            if fraction < 1.0 and fraction - reported['fraction'] < BATCH_CONFIG["progress_step"]:
+                return
+            reported['fraction'] = fraction
+        _progress_queue.put((number, fraction, text))
+
+    return convert_file(video_path, output_path, preset, size_constraint, progress)
+
+def _drain_progress(progress_queue, finished, on_update):
+    while True:
+        try:
+            number, fraction, text = progress_queue.get_nowait()
+        except queue_module.Empty:
+            return
+        # 文件完成后才到达的进度消息不再覆盖结果
+        if number in finished:
+            continue
+        changes = {'status': 'running', 'text': text}
+        if fraction is not None:
+            changes['fraction'] = fraction
+        on_update(number, changes)
+
+def convert_batch(files, preset, size_constraint, zip_path, on_update=None, cancelled=None):
+    """按同一参数预设和大小约束转换多个视频，GIF按完成顺序写入zip_path
+
+    files 为 [{'path', 'name'}]；on_update(序号, 变化字段) 在文件开始、报告进度和完成时调用，
+    字段包括 status（running/done/failed/cancelled）、fraction、text，完成后另有convert_file的摘要字段
+    和 archive_name。cancelled() 返回True时取消尚未开始的文件（正在转换的文件会完成）。
+    返回 {'zip_path', 'converted', 'failed', 'cancelled', 'bytes', 'elapsed', 'workers'}。
+    """
+    started = time.perf_counter()
+    on_update = on_update or (lambda number, changes: None)
+    zip_path = Path(zip_path)
+    work_dir = zip_path.parent
+    work_dir.mkdir(parents=True, exist_ok=True)
+    names = archive_names([f['name'] for f in files])
+    workers = worker_count(len(files))
+
+    context = get_context("spawn")
+    progress_queue = context.Queue()
+    finished = set()
+    counts = {'done': 0, 'failed': 0, 'cancelled': 0}
+    total_bytes = 0
+
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=init_worker, initargs=(progress_queue, dict(DECODE_CONFIG)))
+    try:
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as archive:
+            futures = {}
+            for number, f in enumerate(files):
+                output_path = str(work_dir / f"{number}.gif")
+                future = executor.submit(_convert_file, number, str(f['path']), output_path, preset, size_constraint)
+                futures[future] = (number, output_path)
+            pending = set(futures)
+            stopping = False
+
+            while pending:
+                done, pending = wait(pending, timeout=BATCH_CONFIG["poll_interval"], return_when=FIRST_COMPLETED)
+                _drain_progress(progress_queue, finished, on_update)
+
+                for future in done:
+                    number, output_path = futures[future]
+                    finished.add(number)
+                    try:
+                        result = future.result()
+                    except CancelledError:
+                        result = {'status': 'cancelled', 'error': "已取消"}
+                    except Exception as e:
+                        result = {'error': str(e)}
+
+                    if 'status' not in result:
+                        result['status'] = 'failed' if result.get('error') else 'done'
+                    if result['status'] == 'done':
+                        try:
+                            archive.write(output_path, names[number])
+                            result['archive_name'] = names[number]
+                            total_bytes += result['size']
+                        except OSError as e:
+                            result.update(status='failed', error=f"写入ZIP失败: {e}")
+                    try:
+                        os.remove(output_path)
+                    except OSError:
+                        pass
+                    counts[result['status']] += 1
+                    result['fraction'] = 1.0
+                    on_update(number, result)
+
+                if not stopping and cancelled is not None and cancelled():
+                    stopping = True
+                    for future in pending:
+                        future.cancel()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        progress_queue.close()
+
+    return {
+        'zip_path': str(zip_path),
+        'converted': counts['done'],
+        'failed': counts['failed'],
+        'cancelled': counts['cancelled'],
+        'bytes': total_bytes,
+        'elapsed': time.perf_counter() - started,
+        'workers': workers
+    }
@@ -0,0 +1,223 @@
+"""
+后台转换任务
+
+转换作为任务提交到进程内共享的任务队列，由有上限的工作线程池执行，不占用页面的脚本线程：
+- 提交后得到任务ID，会话状态只保存ID；进度、提示消息、结果和错误保存在任务记录中，
+  页面重新运行、切换页面或关闭标签页都不影响正在执行的任务，页面按ID轮询任务状态
+- 排队中的任务取消后不再执行；执行中的任务通过 job.cancelled() 得知已取消，在下一个检查点放弃
+- 等待执行的任务数（所有会话合计）和每个会话未结束的任务数都有上限，超出时拒绝提交
+- 已结束的任务记录按数量上限淘汰最早结束的；结果只应是文件句柄等小对象（GIF字节保存在临时存储中）
+任务函数不能调用界面框架，只通过传入的任务句柄报告进度。
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# 任务队列配置
+JOB_CONFIG = {
+    "max_workers": 2,  # 同时执行的任务数（单个任务内部仍可使用进程池）
+    "max_queued": 16,  # 等待执行的任务数上限（所有会话合计）
+    "max_active_per_session": 4,  # 每个会话排队和执行中的任务数上限
+    "max_finished": 64  # 保留的已结束任务记录数
+}
+
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+class JobQueueFull(Exception):
+    """等待执行的任务数或会话未结束的任务数已达上限"""
+
+class JobHandle:
+    """传给任务函数的句柄：报告进度和提示消息，检查是否已取消"""
+
+    def __init__(self, queue, job_id):
+        self._queue = queue
+        self.id = job_id
+
+    def progress(self, fraction, text):
+        """报告进度（fraction为None时只更新状态文字），签名与转换引擎的progress回调一致"""
+        changes = {'text': text}
+        if fraction is not None:
+            changes['fraction'] = fraction
+        self._queue._update(self.id, changes)
+
+    def notify(self, kind, message):
+        """记录提示消息，签名与转换引擎的notify回调一致"""
+        self._queue._append_message(self.id, kind, message)
+
+    def update(self, **detail):
+        """更新任务的附加状态（如批量转换中每个文件的进度），页面轮询时随状态返回"""
+        self._queue._update_detail(self.id, detail)
+
+    def cancelled(self):
+        return self._queue._cancel_requested(self.id)
+
+class JobQueue:
+    """进程内的后台任务队列：有上限的工作线程池，任务记录按ID查询"""
+
+    def __init__(self, max_workers=None, max_queued=None):
+        self.max_workers = max_workers or JOB_CONFIG["max_workers"]
+        self.max_queued = JOB_CONFIG["max_queued"] if max_queued is None else max_queued
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="conversion-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._finished = OrderedDict()
+        self._numbers = itertools.count(1)
+
+    def submit(self, session_id, run, kind="convert", label="", detail=None):
+        """提交任务，返回任务ID；队列已满时抛出JobQueueFull
+
+        run(job) 在工作线程中执行，job 为 JobHandle，返回值作为任务结果（None表示没有产出，
+        原因在提示消息中）。kind 和 label 供页面区分和显示任务，detail 为附加状态的初始值。
+        """
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job['state'] == 'queued')
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"等待中的转换任务已达上限（{self.max_queued}个），请稍后再试")
+            active = sum(1 for job in self._jobs.values()
+                         if job['session_id'] == session_id and job['state'] not in FINISHED_STATES)
+            if active >= JOB_CONFIG["max_active_per_session"]:
+                raise JobQueueFull(f"本会话未完成的任务已达上限（{JOB_CONFIG['max_active_per_session']}个），"
+                                   "请等待或取消后再提交")
+
+            job_id = f"job-{next(self._numbers)}-{time.time_ns()}"
+            self._jobs[job_id] = {
+                'id': job_id,
+                'session_id': session_id,
+                'kind': kind,
+                'label': label,
+                'state': 'queued',
+                'fraction': 0.0,
+                'text': "排队中",
+                'messages': [],
+                'detail': dict(detail or {}),
+                'result': None,
+                'error': None,
+                'cancel_requested': False,
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self._futures[job_id] = self._executor.submit(self._run, job_id, run)
+        return job_id
+
+    def _run(self, job_id, run):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] != 'queued':
+                return
+            if job['cancel_requested']:
+                self._finish(job, 'cancelled', None, None)
+                return
+            job.update(state='running', started_at=time.time(), text="正在转换...")
+
+        try:
+            result, error = run(JobHandle(self, job_id)), None
+        except Exception as e:
+            result, error = None, str(e) or e.__class__.__name__
+
+        with self._lock:
+            if job['cancel_requested']:
+                state = 'cancelled'
+            elif error is None and result is not None:
+                state = 'done'
+            else:
+                state = 'failed'
+            self._finish(job, state, result, error)
+
+    def _finish(self, job, state, result, error):
+        """结束任务并淘汰超出数量上限的旧记录（调用方持有锁）"""
+        job.update(state=state, result=result, error=error, finished_at=time.time())
+        if state == 'done':
+            job['fraction'] = 1.0
+        self._futures.pop(job['id'], None)
+        self._finished[job['id']] = True
+        while len(self._finished) > JOB_CONFIG["max_finished"]:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
+
+    def _update(self, job_id, changes):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['state'] == 'running':
+                job.update(changes)
+
+    def _append_message(self, job_id, kind, message):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['messages'].append((kind, message))
+
+    def _update_detail(self, job_id, detail):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['detail'].update(detail)
+
+    def _cancel_requested(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job is None or job['cancel_requested']
+
+    def status(self, job_id):
+        """任务状态的快照，任务不存在（或记录已被淘汰）时返回None
+
+        包括 state（queued/running/done/failed/cancelled）、fraction、text、messages、detail、result、error，
+        排队中的任务另有 position（前面还有几个任务）。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job, messages=list(job['messages']), detail=dict(job['detail']))
+            if job['state'] == 'queued':
+                snapshot['position'] = sum(
+                    1 for other in self._jobs.values()
+                    if other['state'] == 'queued' and other['submitted_at'] < job['submitted_at']
+                )
+            return snapshot
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务不再执行，执行中的任务在下一个检查点放弃。返回任务是否尚未结束"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] in FINISHED_STATES:
+                return False
+            job['cancel_requested'] = True
+            future = self._futures.get(job_id)
+            if job['state'] == 'queued' and future is not None and future.cancel():
+                self._finish(job, 'cancelled', None, None)
+            return True
+
+    def cancel_session(self, session_id):
+        """取消会话的所有未结束任务"""
+        with self._lock:
+            job_ids = [job['id'] for job in self._jobs.values()
+                       if job['session_id'] == session_id and job['state'] not in FINISHED_STATES]
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def usage(self):
+        """{'queued', 'running', 'max_queued', 'max_workers'}"""
+        with self._lock:
+            states = [job['state'] for job in self._jobs.values()]
+        return {
+            'queued': states.count('queued'),
+            'running': states.count('running'),
+            'max_queued': self.max_queued,
+            'max_workers': self.max_workers
+        }
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """进程内共享的任务队列（所有会话共用工作线程和排队上限）"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
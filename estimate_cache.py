@@ -0,0 +1,139 @@
+"""
+GIF大小预估的持久缓存
+
+确认过的预估（试编码或已校准可信的模型预测）按 (视频内容哈希, 规范化参数) 保存到本地SQLite，
+所有会话和重启之间共享：同一视频的同一组参数只需预估一次。
+条目数超过上限时按最近使用时间淘汰（LRU）。预估算法变化时提升版本号，旧条目自然失效并被淘汰。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from gif_codec import encode_options
+
+# 缓存配置
+ESTIMATE_CACHE_CONFIG = {
+    "db_path": Path(__file__).with_name("data") / "estimate_cache.db",
+    "max_entries": 20000,  # 条目数上限，超出时淘汰最久未使用的条目
+    "evict_batch": 500,  # 每次淘汰时额外多删的条目数，避免每次写入都触发淘汰
+    "version": 1  # 预估算法版本，变化后旧条目不再命中
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS estimates (
+    cache_key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    low INTEGER,
+    high INTEGER,
+    source TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_estimates_last_used ON estimates (last_used);
+"""
+
+def normalize_params(params):
+    """影响GIF大小的全部参数，取值范围与正式转换一致"""
+    options = encode_options(params)
+
+    def seconds(value):
+        return None if value is None else round(float(value), 3)
+
+    return {
+        'width': int(params.get('width') or 0),
+        'height': int(params.get('height') or 0),
+        'fps': max(1, min(30, int(params.get('fps', 10)))),
+        'quality': options['quality'],
+        'optimize': bool(options['optimize']),
+        'colors': options['colors'],
+        'lossy': options['lossy'],
+        'start_time': seconds(params.get('start_time')),
+        'end_time': seconds(params.get('end_time'))
+    }
+
+def estimate_cache_key(content_hash, params):
+    normalized = json.dumps(normalize_params(params), sort_keys=True)
+    return f"v{ESTIMATE_CACHE_CONFIG['version']}:{content_hash}:{normalized}", normalized
+
+class EstimateCache:
+    """按内容哈希和参数缓存的预估结果"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or ESTIMATE_CACHE_CONFIG["db_path"])
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交，最后总是关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, content_hash, params):
+        """返回 {'size', 'low', 'high', 'source'}，未命中时返回None"""
+        key, _ = estimate_cache_key(content_hash, params)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT size, low, high, source FROM estimates WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE estimates SET last_used = ?, hits = hits + 1 WHERE cache_key = ?", (time.time(), key)
+            )
+        size, low, high, source = row
+        return {'size': size, 'low': low, 'high': high, 'source': source}
+
+    def put(self, content_hash, params, size, low=None, high=None, source=None):
+        """保存预估结果，超出条目上限时淘汰最久未使用的条目"""
+        key, normalized = estimate_cache_key(content_hash, params)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO estimates (cache_key, content_hash, params, size, low, high, source,"
+                " created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,"
+                " COALESCE((SELECT hits FROM estimates WHERE cache_key = ?), 0))",
+                (key, content_hash, normalized, int(size), None if low is None else int(low),
+                 None if high is None else int(high), source, now, now, key)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM estimates").fetchone()[0]
+            excess = count - ESTIMATE_CACHE_CONFIG["max_entries"]
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM estimates WHERE cache_key IN"
+                    " (SELECT cache_key FROM estimates ORDER BY last_used LIMIT ?)",
+                    (excess + ESTIMATE_CACHE_CONFIG["evict_batch"],)
+                )
+
+    def stats(self):
+        """返回 {'entries', 'hits'}"""
+        with self._lock, self._connect() as conn:
+            entries, hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM estimates").fetchone()
+        return {'entries': entries, 'hits': hits}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_estimate_cache():
+    """进程内共享的预估缓存，无法创建时返回None"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = EstimateCache()
+            except (OSError, sqlite3.Error):
+                return None
+        return _cache
@@ -0,0 +1,174 @@
+"""
+FFmpeg解码后端
+
+正式转换按目标帧率连续读取一段帧时，可以改由本地ffmpeg子进程解码，代替OpenCV逐帧grab/retrieve：
+- 裁剪（输入端 -ss/-t，先跳转到关键帧）、抽帧（fps滤镜，按容器时间戳，可变帧率同样准确）和缩放
+  （scale滤镜）都在ffmpeg内完成，管道里只传输目标尺寸、目标帧数的 rawvideo rgb24
+- 解码和滤镜使用多线程（OpenCV对多数编码只用单线程解码）
+- 从管道直接readinto预先分配的NumPy数组，每帧不再生成中间的bytes对象
+找不到ffmpeg、抽样预估（只读取分散的几段）或ffmpeg解码失败（包括没有读满帧数）时，使用OpenCV路径。
+
+    python -m ffmpeg_decoder video.mp4 --fps 10 --width 480   # 与OpenCV路径对比耗时
+"""
+
+import argparse
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+# 解码后端配置
+DECODE_CONFIG = {
+    "backend": "auto",  # auto（找到ffmpeg时使用）、ffmpeg、opencv
+    "binary": "ffmpeg",  # ffmpeg可执行文件名或路径
+    "threads": 0,  # 解码和滤镜线程数，0为由ffmpeg按CPU核数选择
+    "seek_margin": 1.0,  # 跳转位置比开始时间提前的秒数
+    "scale_flags": "bilinear+full_chroma_int+accurate_rnd"  # 缩放插值：双线性、全分辨率色度插值（画面和GIF大小与OpenCV路径一致）
+}
+
+BACKENDS = ("auto", "ffmpeg", "opencv")
+
+# 已查找过的ffmpeg路径（可执行文件名 → 路径或None）
+_binaries = {}
+
+def find_ffmpeg():
+    """配置的ffmpeg可执行文件的完整路径，找不到时返回None"""
+    binary = DECODE_CONFIG["binary"]
+    if binary not in _binaries:
+        _binaries[binary] = shutil.which(binary)
+    return _binaries[binary]
+
+def use_ffmpeg():
+    """按配置的后端决定是否使用ffmpeg解码（指定ffmpeg但找不到时同样退回OpenCV）"""
+    return DECODE_CONFIG["backend"] != "opencv" and find_ffmpeg() is not None
+
+def build_command(path, fps, size, start_time, count):
+    """ffmpeg命令：从start_time起按fps输出count帧size大小的rgb24原始帧到标准输出"""
+    threads = str(DECODE_CONFIG["threads"])
+    command = [find_ffmpeg(), "-nostdin", "-hide_banner", "-loglevel", "error", "-threads", threads]
+    # 跳转到开始时间之前留出余量，开始时间处正在显示的源帧（时间戳早于开始时间）也会被解码
+    seek = max(0.0, start_time - DECODE_CONFIG["seek_margin"])
+    if seek > 0:
+        command += ["-ss", f"{seek:.6f}"]
+    # 多读一帧的时长，保证最后一个输出时间点之前的源帧都已解码
+    command += ["-t", f"{start_time - seek + (count + 1) / fps:.6f}", "-i", path]
+    # 输出时间点从开始时间起按fps排列；round=up 使每个时间点取当时正在显示的源帧
+    # （默认的就近取整会取到其后一帧），余量内更早的帧被丢弃
+    filters = (f"fps=fps={fps}:start_time={start_time - seek:.6f}:round=up,"
+               f"scale={size[0]}:{size[1]}:flags={DECODE_CONFIG['scale_flags']}")
+    command += ["-filter_threads", threads, "-vf", filters, "-frames:v", str(count),
+                "-an", "-sn", "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1"]
+    return command
+
+def _read_into(stream, view):
+    """从管道读满view，返回实际读取的字节数（管道每次可能只返回一部分）"""
+    filled = 0
+    while filled < len(view):
+        read = stream.readinto(view[filled:])
+        if not read:
+            break
+        filled += read
+    return filled
+
+def read_frames(path, fps, size, start_time, count, progress_callback=None, cancelled=None):
+    """用ffmpeg读取从start_time起按fps的count帧，返回 uint8 [N, H, W, 3] RGB数组（N不超过count）
+
+    size 为 (宽, 高)。ffmpeg不可用、没有读满count帧（ffmpeg中途退出等）时返回None。
+    progress_callback(processed, total) 在每读取一批帧后调用；cancelled() 返回True时结束ffmpeg进程，
+    返回已读取的帧。
+    """
+    if find_ffmpeg() is None or count <= 0:
+        return None
+    width, height = size
+    frames = np.empty((count, height, width, 3), dtype=np.uint8)
+    frame_bytes = width * height * 3
+    update_interval = max(1, count // 20)
+
+    try:
+        process = subprocess.Popen(build_command(path, fps, size, start_time, count),
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+    except OSError:
+        return None
+
+    read = 0
+    try:
+        while read < count:
+            if cancelled is not None and cancelled():
+                break
+            if _read_into(process.stdout, memoryview(frames[read]).cast("B")) < frame_bytes:
+                break
+            read += 1
+            if progress_callback and read % update_interval == 0:
+                try:
+                    progress_callback(read, count)
+                except Exception:
+                    pass
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+    # 没有取消却少读了帧（ffmpeg中途退出或抽出的帧数不足）时视为失败，由调用方改用OpenCV路径
+    if read == 0 or (read < count and not (cancelled is not None and cancelled())):
+        return None
+    return frames[:read]
+
+def benchmark(video_path, params, repeat=3):
+    """分别用OpenCV和ffmpeg读取正式转换的帧，返回各后端的 {'frames', 'seconds'}（取最快一次）"""
+    from gif_engine import read_sampled_frames
+    from video_handle import get_video_handle
+
+    handle = get_video_handle(video_path)
+    backend = DECODE_CONFIG["backend"]
+    results = {}
+    try:
+        for name in ("opencv", "ffmpeg"):
+            if name == "ffmpeg" and find_ffmpeg() is None:
+                continue
+            DECODE_CONFIG["backend"] = name
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                frames = read_sampled_frames(handle, params, max_frames=150, min_frames=10)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = {'frames': len(frames or []), 'seconds': best}
+    finally:
+        DECODE_CONFIG["backend"] = backend
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="对比OpenCV和ffmpeg解码后端读取转换帧的耗时")
+    parser.add_argument("videos", nargs="+", help="视频文件")
+    parser.add_argument("--fps", type=int, default=10, help="目标帧率（默认10）")
+    parser.add_argument("--width", type=int, default=480, help="输出宽度（默认480，高度按原宽高比）")
+    parser.add_argument("--start", type=float, help="开始时间（秒）")
+    parser.add_argument("--end", type=float, help="结束时间（秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个后端重复次数，取最快一次（默认3）")
+    parser.add_argument("--ffmpeg", help="ffmpeg可执行文件路径（默认在PATH中查找）")
+    args = parser.parse_args()
+
+    from video_handle import get_video_handle
+
+    if args.ffmpeg:
+        DECODE_CONFIG["binary"] = args.ffmpeg
+    if find_ffmpeg() is None:
+        print("⚠️ 找不到ffmpeg，只测试OpenCV路径")
+    for video_path in args.videos:
+        metadata = get_video_handle(video_path).metadata()
+        if not metadata or metadata['width'] <= 0:
+            print(f"❌ {video_path}: 无法打开视频文件")
+            continue
+        height = max(10, int(args.width * metadata['height'] / metadata['width']))
+        params = {'fps': args.fps, 'width': args.width, 'height': height,
+                  'start_time': args.start, 'end_time': args.end}
+        results = benchmark(video_path, params, args.repeat)
+        line = " · ".join(f"{name} {r['seconds']:.3f}s（{r['frames']}帧）" for name, r in results.items())
+        if len(results) == 2 and results['ffmpeg']['seconds'] > 0:
+            line += f" · 加速 {results['opencv']['seconds'] / results['ffmpeg']['seconds']:.2f}×"
+        print(f"{video_path} {metadata['width']}×{metadata['height']}: {line}")
+
+if __name__ == "__main__":
+    main()
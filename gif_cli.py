@@ -0,0 +1,250 @@
+"""
+命令行转换工具
+
+不依赖Streamlit，使用与页面相同的转换引擎（gif_engine），可在定时任务和数据处理流程中调用：
+
+    python -m gif_cli convert in.mp4 -o out.gif --fps 10 --width 480 --max-size 2MB
+    python -m gif_cli convert "clips/*.mp4" videos/ -o gifs/ --jobs 4 --json
+
+- 输入可以是文件、目录（目录下的视频文件）或通配符（支持 ** 递归）
+- --jobs N 时在进程池中同时转换N个文件（每个进程内不再并行编码）
+- 每个文件输出各阶段耗时；--json 时在标准输出打印机器可读的结果，其余信息写入标准错误
+- --decoder 选择解码后端（auto：找到ffmpeg时由ffmpeg解码，否则使用OpenCV）
+- 全部成功时退出码为0，有文件失败时为1，没有找到输入文件时为2
+
+除输出的GIF外，缓存和中间文件与页面共用，写在项目目录下（与当前工作目录无关）：
+data/gif_results（转换结果缓存）、data/estimate_cache.db（大小预估缓存）、
+data/size_calibration.db（预估校准记录）、temp_uploads/（临时存储和中间文件）。
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+from batch_convert import archive_names, convert_file, init_worker
+from ffmpeg_decoder import BACKENDS, DECODE_CONFIG, find_ffmpeg
+from temp_store import get_temp_store
+
+# 目录输入时识别的视频扩展名（与页面上传支持的格式一致）
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# 耗时输出的阶段及名称
+STAGES = (
+    ('validate', "验证"),
+    ('read', "读取"),
+    ('encode', "编码"),
+    ('optimize', "优化"),
+    ('write', "写入")
+)
+
+def parse_size(text):
+    """解析文件大小（如 2MB、500KB、1.5M、800000），只有数字时按MB计算"""
+    value = text.strip().upper().replace(" ", "")
+    multipliers = {'GB': 1024 ** 3, 'G': 1024 ** 3, 'MB': 1024 ** 2, 'M': 1024 ** 2,
+                   'KB': 1024, 'K': 1024, 'B': 1}
+    for unit, multiplier in multipliers.items():
+        if value.endswith(unit):
+            number = value[:-len(unit)]
+            break
+    else:
+        number, multiplier = value, 1024 ** 2
+    try:
+        size = float(number) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法解析的文件大小: {text}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"文件大小必须大于0: {text}")
+    return size
+
+def expand_inputs(patterns):
+    """展开输入：文件、目录下的视频文件、通配符，去重并保持顺序"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(str(p) for p in Path(pattern).iterdir()
+                             if p.is_file() and p.suffix.lower() in VIDEO_EXTENSIONS)
+        elif glob.has_magic(pattern):
+            matches = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+        else:
+            matches = [pattern]
+        paths.extend(matches)
+    seen = set()
+    return [p for p in paths if not (os.path.abspath(p) in seen or seen.add(os.path.abspath(p)))]
+
+def output_paths(inputs, output):
+    """每个输入对应的输出路径
+
+    单个输入且 -o 不是目录时直接使用 -o；否则输出到 -o 目录（未指定时为输入文件所在目录），
+    文件名为输入文件名换成.gif，同一目录下重名时加序号。
+    """
+    if output and len(inputs) == 1 and not os.path.isdir(output) and not output.endswith(os.sep):
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        return [output]
+    if output:
+        Path(output).mkdir(parents=True, exist_ok=True)
+        return [str(Path(output) / name) for name in archive_names(inputs)]
+
+    by_dir = {}
+    for number, path in enumerate(inputs):
+        by_dir.setdefault(str(Path(path).parent), []).append(number)
+    result = [None] * len(inputs)
+    for directory, numbers in by_dir.items():
+        for number, name in zip(numbers, archive_names([inputs[n] for n in numbers])):
+            result[number] = str(Path(directory) / name)
+    return result
+
+def build_preset(args):
+    """命令行参数 → 参数预设（未指定宽高时按缩放比例）"""
+    preset = {
+        'fps': args.fps,
+        'quality': args.quality,
+        'optimize': not args.no_optimize,
+        'colors': args.colors,
+        'lossy': args.lossy,
+        'start_time': args.start,
+        'end_time': args.end
+    }
+    if args.width or args.height:
+        preset['width'] = args.width
+        preset['height'] = args.height
+    else:
+        preset['scale'] = args.scale
+    return preset
+
+def format_bytes(size):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.2f}MB"
+    return f"{size / 1024:.1f}KB"
+
+def format_timings(timings, elapsed):
+    parts = [f"{label} {timings[name]:.2f}s" for name, label in STAGES if name in timings]
+    parts.append(f"合计 {elapsed:.2f}s")
+    if timings.get('cache_hit'):
+        parts.append("缓存命中")
+    return " · ".join(parts)
+
+def report_line(result):
+    """单个文件的结果（人可读）"""
+    if result['status'] == 'ok':
+        size = f"{format_bytes(result['size'])} {result['width']}×{result['height']}"
+        return (f"✅ {result['input']} → {result['output']}  {size}\n"
+                f"   {format_timings(result['timings'], result['elapsed'])}")
+    return f"❌ {result['input']} — {result['error']}"
+
+def _result(input_path, output_path, summary):
+    result = {
+        'input': input_path,
+        'output': output_path if not summary.get('error') else None,
+        'status': 'failed' if summary.get('error') else 'ok',
+        'size': summary.get('size'),
+        'width': summary.get('width'),
+        'height': summary.get('height'),
+        'params': summary.get('params'),
+        'timings': summary.get('timings', {}),
+        'elapsed': summary.get('elapsed', 0.0),
+        'error': summary.get('error'),
+        'messages': [{'kind': kind, 'message': message} for kind, message in summary.get('messages', [])]
+    }
+    return result
+
+def run_convert(args):
+    started = time.perf_counter()
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("❌ 没有找到输入文件", file=sys.stderr)
+        return 2
+    outputs = output_paths(inputs, args.output)
+    preset = build_preset(args)
+    size_constraint = {'enabled': bool(args.max_size), 'operator': '<=', 'target_size': args.max_size}
+    jobs = max(1, min(args.jobs, len(inputs)))
+
+    log = sys.stderr if args.json else sys.stdout
+    results = [None] * len(inputs)
+
+    DECODE_CONFIG["backend"] = args.decoder
+    if args.ffmpeg:
+        DECODE_CONFIG["binary"] = args.ffmpeg
+    if args.decoder == "ffmpeg" and find_ffmpeg() is None:
+        print(f"⚠️ 找不到ffmpeg（{DECODE_CONFIG['binary']}），使用OpenCV解码", file=sys.stderr)
+
+    def finish(number, summary):
+        results[number] = _result(inputs[number], outputs[number], summary)
+        print(report_line(results[number]), file=log, flush=True)
+
+    if jobs == 1:
+        # 命令行进程不持有会话引用，不回收临时存储中的文件
+        get_temp_store(reap=False)
+        for number, (input_path, output_path) in enumerate(zip(inputs, outputs)):
+            try:
+                summary = convert_file(input_path, output_path, preset, size_constraint)
+            except Exception as e:
+                summary = {'error': str(e)}
+            finish(number, summary)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=get_context("spawn"), initializer=init_worker,
+                                 initargs=(None, dict(DECODE_CONFIG))) as executor:
+            futures = {
+                executor.submit(convert_file, input_path, output_path, preset, size_constraint): number
+                for number, (input_path, output_path) in enumerate(zip(inputs, outputs))
+            }
+            for future in as_completed(futures):
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    summary = {'error': str(e)}
+                finish(futures[future], summary)
+
+    elapsed = time.perf_counter() - started
+    converted = sum(1 for r in results if r['status'] == 'ok')
+    summary = {
+        'files': len(inputs),
+        'converted': converted,
+        'failed': len(inputs) - converted,
+        'bytes': sum(r['size'] or 0 for r in results),
+        'elapsed': elapsed,
+        'jobs': jobs
+    }
+    print(f"📦 {converted}/{len(inputs)} 个文件转换成功，用时 {elapsed:.2f}s（{jobs} 个进程）", file=log)
+    if args.json:
+        json.dump({'results': results, 'summary': summary}, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    return 0 if converted == len(inputs) else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m gif_cli", description="视频转GIF命令行工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="把视频转换为GIF")
+    convert.add_argument("inputs", nargs="+", help="视频文件、目录或通配符（如 \"clips/**/*.mp4\"）")
+    convert.add_argument("-o", "--output", help="输出文件（单个输入时）或输出目录，默认与输入文件同目录")
+    convert.add_argument("--fps", type=int, default=10, help="帧率，1-30（默认10）")
+    convert.add_argument("--width", type=int, help="输出宽度（只指定宽或高时按原宽高比计算另一项）")
+    convert.add_argument("--height", type=int, help="输出高度")
+    convert.add_argument("--scale", type=float, default=0.5, help="未指定宽高时相对原始尺寸的缩放比例（默认0.5）")
+    convert.add_argument("--quality", type=int, default=85, help="质量，50-100（默认85）")
+    convert.add_argument("--colors", type=int, default=256, help="调色板颜色数，16-256（默认256）")
+    convert.add_argument("--lossy", type=int, default=0, help="有损级别，0-100（默认0）")
+    convert.add_argument("--start", type=float, help="开始时间（秒）")
+    convert.add_argument("--end", type=float, help="结束时间（秒）")
+    convert.add_argument("--max-size", type=parse_size, help="文件大小上限（如 2MB、500KB），超出时自动优化")
+    convert.add_argument("--no-optimize", action="store_true", help="关闭GIF优化")
+    convert.add_argument("--decoder", choices=BACKENDS, default="auto",
+                         help="解码后端：auto（默认，找到ffmpeg时使用ffmpeg）、ffmpeg、opencv")
+    convert.add_argument("--ffmpeg", help="ffmpeg可执行文件路径（默认在PATH中查找）")
+    convert.add_argument("-j", "--jobs", type=int, default=1, help="同时转换的文件数（默认1）")
+    convert.add_argument("--json", action="store_true", help="在标准输出打印JSON结果")
+    convert.set_defaults(handler=run_convert)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
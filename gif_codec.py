@@ -0,0 +1,94 @@
+"""
+GIF编码工具
+
+所有GIF编码统一经过encode_gif，保证预估、预览和正式转换使用完全相同的编码参数。
+除帧率外支持两个压缩选项：
+- colors：调色板颜色数（2-256），颜色越少LZW压缩越好
+- lossy：有损级别（0-100），把低于阈值的帧间变化替换为上一帧像素，使增量区域更小
+设置了任一选项时所有帧共用一个全局调色板：逐帧自适应调色板会让未变化的像素
+在相邻帧得到不同的索引，帧间增量和有损阈值都无法生效。
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+# 压缩选项的默认值（与未设置这些选项时的编码结果完全一致）
+DEFAULT_COLORS = 256
+DEFAULT_LOSSY = 0
+
+# 编码器版本：会改变编码结果的修改需要提升，使缓存的转换结果失效
+ENCODER_VERSION = 2
+
+# 生成全局调色板时最多取样的帧数
+PALETTE_SAMPLE_FRAMES = 8
+
+def frame_duration_ms(fps):
+    """GIF帧间隔（毫秒），与浏览器的最小延迟保持一致"""
+    return max(50, int(1000 / max(1, fps)))
+
+def to_pil_frames(frames):
+    """将RGB数组（或PIL图像）序列转换为PIL图像列表"""
+    return [frame if isinstance(frame, Image.Image) else Image.fromarray(np.ascontiguousarray(frame))
+            for frame in frames]
+
+def encode_options(params):
+    """从转换参数中取出编码选项"""
+    return {
+        'quality': max(50, min(100, params.get('quality', 85))),
+        'optimize': params.get('optimize', True),
+        'colors': max(2, min(256, int(params.get('colors') or DEFAULT_COLORS))),
+        'lossy': max(0, min(100, int(params.get('lossy') or DEFAULT_LOSSY)))
+    }
+
+def apply_lossy(frames, lossy):
+    """有损预处理：把小于阈值的帧间变化替换为上一帧像素，返回RGB数组列表"""
+    threshold = lossy * 0.5
+    result = []
+    previous = None
+    for frame in frames:
+        current = np.array(frame.convert('RGB') if isinstance(frame, Image.Image) else frame)
+        if previous is not None and threshold > 0 and current.shape == previous.shape:
+            # uint8上计算|a-b|，避免转换为更宽的整数类型
+            difference = np.maximum(current, previous) - np.minimum(current, previous)
+            difference = np.maximum(np.maximum(difference[..., 0], difference[..., 1]), difference[..., 2])
+            np.copyto(current, previous, where=(difference < threshold)[..., None])
+        result.append(current)
+        previous = current
+    return result
+
+def quantize_global(images, colors):
+    """用抽样帧生成一个全局调色板，所有帧拼接后一次性按该调色板量化（不抖动）再切回单帧"""
+    arrays = [np.asarray(image.convert('RGB')) for image in images]
+    height, width = arrays[0].shape[:2]
+    arrays = [array if array.shape[:2] == (height, width) else np.asarray(Image.fromarray(array).resize((width, height)))
+              for array in arrays]
+    step = max(1, len(arrays) // PALETTE_SAMPLE_FRAMES)
+    samples = Image.fromarray(np.concatenate(arrays[::step][:PALETTE_SAMPLE_FRAMES]))
+    palette = samples.quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+    stacked = Image.fromarray(np.concatenate(arrays)).quantize(palette=palette, dither=Image.Dither.NONE)
+    return [stacked.crop((0, i * height, width, (i + 1) * height)) for i in range(len(arrays))]
+
+def encode_gif(frames, fps, quality=85, optimize=True, colors=DEFAULT_COLORS, lossy=DEFAULT_LOSSY):
+    """编码GIF并返回字节数据，frames为RGB数组或PIL图像序列"""
+    if lossy:
+        frames = apply_lossy(frames, lossy)
+    images = to_pil_frames(frames)
+    if not images:
+        return b""
+    if colors < DEFAULT_COLORS or lossy:
+        images = quantize_global(images, colors)
+
+    gif_buffer = io.BytesIO()
+    images[0].save(
+        gif_buffer,
+        format='GIF',
+        save_all=True,
+        append_images=images[1:],
+        duration=frame_duration_ms(fps),
+        loop=0,
+        optimize=bool(optimize),
+        quality=quality
+    )
+    return gif_buffer.getvalue()
@@ -0,0 +1,910 @@
+"""
+GIF转换引擎
+
+视频分析、GIF大小预估与约束求解、视频到GIF的转换流程（验证、按帧索引读取帧、编码、大小约束优化、结果缓存），
+不依赖任何界面框架，所有输入显式传入：
+- 提示消息通过 notify(kind, message) 回调报告，kind 为 success/info/warning/error/caption
+- 进度通过 progress(fraction, text) 回调报告（fraction为None时只更新状态文字）
+- 各阶段耗时写入调用方传入的 stats 字典，约束求解过程写入 report 字典
+- 预估缓存存放在调用方传入的 cache 映射中（页面传入会话条目容器，工作进程可传入自己的字典）
+页面只是这一层之上的适配：把回调接到页面元素、把会话状态作为缓存传入。
+页面、批量转换的工作进程和命令行工具共用此模块。
+"""
+
+import gc
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from video_handle import get_video_handle
+from video_index import get_frame_index, iter_frames, output_timestamps
+from video_proxy import get_proxy, estimate_size_from_proxy
+from ffmpeg_decoder import read_frames as read_ffmpeg_frames, use_ffmpeg
+from gif_estimator import estimate_from_bursts
+from gif_size_model import get_content_features, get_encode_option_factor
+from size_calibration import calibrated_prediction, record_conversion
+from size_solver import SOLVER_CONFIG, solve_for_target
+from parallel_encode import encode_from_frames, optimize_in_parallel, worker_count
+from gif_codec import encode_gif, encode_options
+from estimate_cache import get_estimate_cache
+from result_cache import get_result_cache
+from quality_metrics import measure_output_quality, measure_proxy_quality
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+def _ignore(*args):
+    pass
+
+def safe_encode_string(text):
+    """安全地处理字符串编码，避免ASCII错误"""
+    if not text:
+        return ""
+    
+    try:
+        # 尝试编码为UTF-8然后解码，确保字符串是安全的
+        if isinstance(text, str):
+            return text.encode('utf-8').decode('utf-8')
+        else:
+            return str(text).encode('utf-8').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        # 如果出现编码问题，移除非ASCII字符
+        return ''.join(char for char in str(text) if ord(char) < 128)
+
+def validate_video_file(video_path):
+    """验证视频文件的完整性和可读性（结果按内容哈希缓存在共享句柄中）"""
+    try:
+        # 检查OpenCV是否可用
+        if not OPENCV_AVAILABLE or cv2 is None:
+            return False, "OpenCV不可用"
+            
+        # 检查文件是否存在
+        if not os.path.exists(video_path):
+            return False, "文件不存在"
+        
+        return get_video_handle(video_path).validate()
+        
+    except Exception as e:
+        return False, f"文件验证失败: {str(e)}"
+
+def analyze_video_properties(video_path, notify=None):
+    """分析视频属性 - 增强版本，具有更强的错误处理（提示消息通过notify报告）"""
+    notify = notify or _ignore
+    try:
+        # 检查OpenCV是否可用
+        if not OPENCV_AVAILABLE or cv2 is None:
+            notify('error', "❌ OpenCV不可用，无法分析视频文件")
+            return None
+            
+        # 首先验证视频文件
+        is_valid, message = validate_video_file(video_path)
+        if not is_valid:
+            notify('error', f"❌ 视频文件验证失败: {message}")
+            return None
+        
+        # MP4/MOV直接读取容器表（毫秒级，VFR视频帧数同样准确），其他容器读取OpenCV属性
+        try:
+            metadata = get_video_handle(video_path).metadata()
+        except Exception as e:
+            notify('error', f"❌ 打开视频文件失败: {str(e)}")
+            return None
+        
+        if metadata is None:
+            notify('error', "❌ 无法打开视频文件，可能是格式不支持或文件已损坏")
+            return None
+        
+        try:
+            video_props = dict(metadata)
+            fps = video_props['fps']
+            frame_count = video_props['frame_count']
+            width = video_props['width']
+            height = video_props['height']
+            
+            # 验证获取的属性是否合理
+            if fps <= 0 or fps > 120:  # FPS不合理
+                fps = 25.0  # 使用默认FPS
+                notify('warning', "⚠️ 检测到异常帧率，使用默认值25FPS")
+            
+            if frame_count <= 0:  # 帧数不合理
+                frame_count = 1
+                notify('warning', "⚠️ 无法获取准确帧数，使用估算值")
+            
+            if width <= 0 or height <= 0 or width > 4000 or height > 4000:  # 分辨率不合理
+                notify('error', "❌ 检测到异常的视频分辨率，无法处理此视频")
+                return None
+            
+            # 计算时长（容器表给出的时长更精确，优先使用）
+            duration = video_props.get('duration') or 0
+            if video_props.get('source') != 'container' or duration <= 0:
+                duration = frame_count / fps if fps > 0 else 1.0
+            
+            video_props.update({
+                'fps': fps,
+                'frame_count': frame_count,
+                'duration': duration,
+                # 获取文件大小
+                'file_size': os.path.getsize(video_path)
+            })
+            
+            # 显示成功信息
+            notify('success', "✅ 视频分析完成")
+            
+            return video_props
+            
+        except Exception as e:
+            notify('error', f"❌ 分析视频属性时出错: {str(e)}")
+            return None
+            
+    except Exception as e:
+        notify('error', f"❌ 视频分析失败: {str(e)}")
+        notify('info', "💡 这可能是由于视频文件损坏、格式不支持或编码问题导致的")
+        return None
+
+def plan_output_frame_count(video_props, params, max_frames=150):
+    """按与read_sampled_frames相同的时间点规则计算正式转换将输出的帧数"""
+    fps = max(1, min(30, params.get('fps', 10)))
+    duration = video_props.get('duration', 0)
+    if duration <= 0:
+        original_fps = video_props.get('fps', 0)
+        if original_fps <= 0 or original_fps > 120:
+            original_fps = 25.0
+        duration = (video_props.get('frame_count', 0) or 100) / original_fps
+    timestamps = output_timestamps(
+        duration, fps, params.get('start_time'), params.get('end_time'), max_frames
+    )
+    return max(2, len(timestamps))
+
+def read_sampled_frames(handle, params, max_frames, min_frames=5, progress_callback=None, positions=None,
+                        cancelled=None):
+    """按目标帧率的精确时间点从共享句柄读取帧，返回PIL图像列表；无法打开视频时返回None
+
+    选帧和跳转依据持久化的帧索引：每个输出时间点取显示时间最近的源帧，
+    远处的帧先跳转到其前面的关键帧再向前读取。可以使用ffmpeg时连续读取由ffmpeg解码（见ffmpeg_decoder）。
+    positions 指定时只读取输出时间轴上的这些位置（用于抽样预估）。
+    progress_callback(processed, total) 在每读取一批帧后调用。
+    cancelled() 返回True时停止读取，返回已读取的帧。
+    """
+    # 预分配变量，增加安全检查
+    fps = max(1, min(30, params.get('fps', 10)))  # 限制FPS范围
+    target_width = max(10, min(2000, params.get('width', 640)))  # 限制宽度范围
+    target_height = max(10, min(2000, params.get('height', 480)))  # 限制高度范围
+    
+    index = get_frame_index(handle)
+    if index is None:
+        return None
+    
+    # 输出帧号（目标帧率高于源帧率时会重复取同一源帧，保证播放时长不变）
+    frame_numbers = index.select_frames(
+        fps, params.get('start_time'), params.get('end_time'), max(max_frames, min_frames)
+    )
+    if positions is not None:
+        frame_numbers = frame_numbers[np.asarray(positions)[np.asarray(positions) < len(frame_numbers)]]
+    frame_limit = len(frame_numbers)
+    update_interval = max(1, frame_limit // 20)
+    
+    # 连续读取整段时由ffmpeg完成裁剪、抽帧和缩放（抽样预估只读取分散的几段，仍使用OpenCV）
+    if positions is None and use_ffmpeg():
+        decoded = read_ffmpeg_frames(handle.path, fps, (target_width, target_height),
+                                     max(0.0, params.get('start_time') or 0.0), frame_limit, progress_callback,
+                                     cancelled)
+        if decoded is not None:
+            if progress_callback:
+                try:
+                    progress_callback(frame_limit, frame_limit)
+                except Exception:
+                    pass
+            return [Image.fromarray(frame) for frame in decoded]
+    
+    # 预设置resize插值方法
+    resize_interpolation = cv2.INTER_LINEAR
+    
+    images = {}
+    frames = []
+    with handle.capture() as cap:
+        if cap is None:
+            return None
+        
+        try:
+            for frame_number, frame in iter_frames(cap, index, np.unique(frame_numbers)):
+                if cancelled is not None and cancelled():
+                    break
+                try:
+                    # 验证帧的有效性
+                    if frame.shape[0] <= 0 or frame.shape[1] <= 0:
+                        continue
+                    
+                    frame = cv2.resize(frame, (target_width, target_height), interpolation=resize_interpolation)
+                    images[frame_number] = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    
+                    # 更新进度
+                    if progress_callback and (len(images) % update_interval == 0):
+                        try:
+                            progress_callback(min(len(images), frame_limit), frame_limit)
+                        except Exception:
+                            pass  # 进度更新失败不影响转换
+                    
+                    # 内存管理
+                    if len(images) % 50 == 0:
+                        gc.collect()
+                        
+                except Exception:
+                    # 处理单帧时的任何异常，继续处理下一帧
+                    pass
+        except Exception:
+            # 读取中途出错时保留已读取的帧
+            pass
+    
+    for frame_number in frame_numbers:
+        if frame_number in images:
+            frames.append(images[frame_number])
+    
+    if progress_callback:
+        try:
+            progress_callback(frame_limit, frame_limit)
+        except Exception:
+            pass
+    
+    return frames
+
+def get_cached_result(video_path, params, size_constraint=None):
+    """从结果缓存读取完成的GIF，未命中或不可用时返回None"""
+    try:
+        cache = get_result_cache()
+        if cache is None:
+            return None
+        return cache.get(get_video_handle(video_path).content_hash, params, size_constraint)
+    except Exception:
+        return None
+
+def put_cached_result(video_path, params, gif_data, size_constraint=None):
+    """把完成的GIF写入结果缓存（失败不影响转换）"""
+    try:
+        cache = get_result_cache()
+        if cache is not None:
+            cache.put(get_video_handle(video_path).content_hash, params, gif_data, size_constraint)
+    except Exception:
+        pass
+
+def convert_video(video_path, params, size_constraint=None, notify=None, progress=None, stats=None,
+                  cancelled=None):
+    """将视频转换为GIF，相同视频内容和设置的结果直接从结果缓存返回，失败或取消时返回None
+
+    notify/progress 为None时不报告；stats 为字典时写入各阶段耗时（秒）：
+    validate、read、encode、optimize、total，以及 frames（读取的帧数）和 cache_hit。
+    cancelled() 返回True时（后台任务被取消）在下一个检查点放弃转换。
+    """
+    notify = notify or _ignore
+    progress = progress or _ignore
+    stats = stats if stats is not None else {}
+    started = time.perf_counter()
+    stats['cache_hit'] = False
+    if OPENCV_AVAILABLE and video_path and os.path.exists(video_path):
+        cached = get_cached_result(video_path, params, size_constraint)
+        if cached:
+            stats['cache_hit'] = True
+            stats['total'] = time.perf_counter() - started
+            notify('success', "⚡ 相同视频和设置已转换过，直接使用缓存的结果")
+            return cached
+
+    gif_data = run_conversion(video_path, params, size_constraint, notify, progress, stats, cancelled)
+    if gif_data:
+        put_cached_result(video_path, params, gif_data, size_constraint)
+    stats['total'] = time.perf_counter() - started
+    return gif_data
+
+def run_conversion(video_path, params, size_constraint, notify, progress, stats=None, cancelled=None):
+    """将视频转换为GIF - 高性能优化版本，增强错误处理
+    
+    notify(kind, message) 接收提示消息，progress(fraction, text) 报告进度（fraction为None时只更新状态文字），
+    各阶段耗时写入 stats。cancelled() 返回True时在读取帧、编码和约束优化之间放弃，返回None。
+    """
+    stats = stats if stats is not None else {}
+    cancelled = cancelled or (lambda: False)
+    stage_started = time.perf_counter()
+    try:
+        # 检查OpenCV可用性
+        if not OPENCV_AVAILABLE or cv2 is None:
+            notify('error', "❌ OpenCV不可用，无法进行视频转换")
+            return None
+            
+        # 首先验证视频文件
+        is_valid, message = validate_video_file(video_path)
+        if not is_valid:
+            notify('error', f"❌ 视频文件验证失败: {message}")
+            return None
+        
+        stats['validate'] = time.perf_counter() - stage_started
+        stage_started = time.perf_counter()
+        
+        # 使用共享句柄，视频属性来自缓存的元数据
+        handle = get_video_handle(video_path)
+        metadata = handle.metadata()
+        if metadata is None:
+            notify('error', "❌ 无法打开视频文件，可能是格式不支持或文件已损坏")
+            return None
+        
+        # 转换前的模型预测（与页面显示的即时预估相同），编码后按真实大小记录其误差
+        prediction = get_model_prediction(metadata, params, video_path)
+        
+        # 预先分配变量，增加安全检查
+        fps = max(1, min(30, params.get('fps', 10)))
+        
+        # 验证获取的属性
+        if metadata['fps'] <= 0 or metadata['fps'] > 120:
+            notify('warning', "⚠️ 检测到异常帧率，使用默认值25FPS")
+        
+        if metadata['frame_count'] <= 0:
+            notify('warning', "⚠️ 无法获取准确帧数，使用估算值")
+        
+        def update_progress(processed_frames, max_frames):
+            progress(processed_frames / max_frames, f"正在处理视频帧... {processed_frames}/{max_frames}")
+        
+        # 限制最大帧数以提高速度和稳定性
+        frames = read_sampled_frames(
+            handle, params,
+            max_frames=150, min_frames=10,
+            progress_callback=update_progress, cancelled=cancelled
+        )
+        stats['read'] = time.perf_counter() - stage_started
+        if cancelled():
+            return None
+        if frames is None:
+            notify('error', "❌ 无法打开视频文件，可能是格式不支持或文件已损坏")
+            return None
+        stats['frames'] = len(frames)
+        
+        # 检查是否成功处理了足够的帧
+        if not frames or len(frames) < 2:
+            notify('error', "❌ 没有提取到足够的有效帧，无法生成GIF")
+            notify('info', "💡 这可能是由于视频文件损坏或格式不兼容导致的")
+            return None
+        
+        # 安全地创建GIF
+        try:
+            progress(None, "正在生成GIF文件...")
+            
+            # 验证frames是否有效
+            if not frames or len(frames) == 0:
+                notify('error', "❌ 没有有效的帧数据")
+                return None
+            
+            # 安全地保存GIF
+            stage_started = time.perf_counter()
+            options = encode_options(params)
+            gif_data = encode_gif(frames, fps, **options)
+            stats['encode'] = time.perf_counter() - stage_started
+            
+            # 保留未量化的原始帧和实际编码参数，超出约束时从原始像素重新编码
+            encoded_params = dict(params, fps=fps, width=frames[0].width, height=frames[0].height)
+            
+            # 验证生成的GIF数据
+            if not gif_data or len(gif_data) == 0:
+                notify('error', "❌ 生成的GIF文件为空")
+                return None
+            if cancelled():
+                return None
+            
+            # 用真实大小校准预估模型（约束优化前的大小才与这组参数对应）
+            try:
+                record_conversion(
+                    get_content_features(handle), params, len(frames), prediction, len(gif_data), handle.content_hash
+                )
+            except Exception:
+                pass  # 校准记录失败不影响转换
+                
+        except Exception as gif_e:
+            notify('error', f"❌ 生成GIF文件时出错: {str(gif_e)}")
+            notify('info', "💡 请尝试调整参数（降低质量或分辨率）后重试")
+            return None
+        
+        # 检查文件大小约束
+        if size_constraint and size_constraint['enabled']:
+            gif_size = len(gif_data)
+            target_size = size_constraint['target_size']
+            operator = size_constraint['operator']
+            
+            # 显示当前GIF文件大小信息
+            gif_size_mb = gif_size / (1024 * 1024)
+            gif_size_kb = gif_size / 1024
+            target_size_mb = target_size / (1024 * 1024)
+            target_size_kb = target_size / 1024
+            
+            if gif_size_mb >= 1:
+                gif_size_display = f"{gif_size_mb:.2f}MB"
+            else:
+                gif_size_display = f"{gif_size_kb:.1f}KB"
+                
+            if target_size_mb >= 1:
+                target_size_display = f"{target_size_mb:.2f}MB"
+            else:
+                target_size_display = f"{target_size_kb:.1f}KB"
+            
+            # 强制优化逻辑 - 当设置为小于某数值时，强制调整到目标大小以下
+            if operator in ['<', '<=']:
+                if gif_size > target_size:
+                    progress(None, f"正在智能优化GIF文件大小到 {target_size_display} 以下...")
+                    
+                    # 增加错误处理
+                    stage_started = time.perf_counter()
+                    try:
+                        optimized_data, report = optimize_gif_size(frames, encoded_params, target_size, operator, gif_data)
+                        quality_note = f"，实测SSIM {report['ssim']:.3f}" if report.get('ssim') is not None else ""
+                        notify('caption', f"🧮 从原始帧重新编码，共评估{report['evaluations']}组参数{quality_note}")
+                    except Exception as opt_e:
+                        notify('error', f"❌ 优化过程失败: {str(opt_e)}")
+                        progress(None, "优化失败，返回原始文件")
+                        optimized_data = None
+                    stats['optimize'] = time.perf_counter() - stage_started
+                    if optimized_data and optimized_data is not gif_data:
+                        optimized_size = len(optimized_data)
+                        optimized_size_mb = optimized_size / (1024 * 1024)
+                        optimized_size_kb = optimized_size / 1024
+                        
+                        if optimized_size_mb >= 1:
+                            optimized_display = f"{optimized_size_mb:.2f}MB"
+                        else:
+                            optimized_display = f"{optimized_size_kb:.1f}KB"
+                        
+                        if optimized_size <= target_size:
+                            notify('success', f"✅ 智能优化成功！文件大小从 {gif_size_display} 优化到 {optimized_display}")
+                        else:
+                            notify('info', f"📊 文件大小: {optimized_display}")
+                            notify('info', "💡 已达到在保持可接受质量下的最佳压缩效果")
+                        
+                        return optimized_data
+                    else:
+                        notify('warning', "⚠️ 智能优化未能显著减小文件大小，返回原始文件")
+                        notify('info', "💡 建议：使用AI智能建议功能或手动调整参数（降低分辨率、帧率或质量）")
+                        return gif_data
+                else:
+                    notify('success', f"✅ 文件大小 {gif_size_display} 已满足约束要求 ≤ {target_size_display}")
+            
+            elif operator in ['>', '>=']:
+                if gif_size < target_size:
+                    notify('info', f"📊 文件大小 {gif_size_display} 小于目标 {target_size_display}")
+                else:
+                    notify('success', f"✅ 文件大小 {gif_size_display} 已满足约束要求 {target_size_display}")
+            
+            elif operator == '=':
+                tolerance = 0.1  # 10%的容差
+                if abs(gif_size - target_size) / target_size > tolerance:
+                    if gif_size > target_size:
+                        progress(None, f"正在优化GIF文件大小到 {target_size_display}...")
+                        
+                        # 增加错误处理
+                        stage_started = time.perf_counter()
+                        try:
+                            optimized_data, _ = optimize_gif_size(frames, encoded_params, target_size, operator, gif_data)
+                        except Exception as opt_e:
+                            notify('error', f"❌ 优化过程失败: {str(opt_e)}")
+                            progress(None, "优化失败，返回原始文件")
+                            optimized_data = None
+                        stats['optimize'] = time.perf_counter() - stage_started
+                        if optimized_data:
+                            return optimized_data
+                        else:
+                            return gif_data
+                    else:
+                        notify('info', f"📊 文件大小 {gif_size_display} 小于目标 {target_size_display}")
+                else:
+                    notify('success', f"✅ 文件大小 {gif_size_display} 已满足约束要求 {target_size_display}")
+        
+        return gif_data
+        
+    except Exception as e:
+        # 安全地处理异常信息
+        error_msg = safe_encode_string(str(e))
+        if not error_msg:
+            error_msg = "未知错误"
+            
+        notify('error', f"❌ 视频转换失败: {error_msg}")
+        notify('info', "💡 这可能是由于以下原因导致的：")
+        notify('info', "   • 视频文件损坏或格式不兼容")
+        notify('info', "   • 参数设置不当（分辨率过大、质量过高等）")
+        notify('info', "   • 系统内存不足")
+        notify('info', "   • 请尝试上传不同的视频文件或调整参数")
+        return None
+
+def optimize_gif_size(frames, params, target_size_bytes, operator='<', gif_data=None):
+    """转换结果超出大小约束时，从保留的原始帧重新求解参数并编码
+    
+    多核时在进程池中同时编码沿降级路径的一组候选，满足目标且质量足够高时取消其余候选；
+    单核或进程池不可用时按求解器顺序尝试。每次尝试都是从原始帧的一次编码（不再解码已生成的GIF）。
+    满足目标的候选之间按解码后与原始帧比较的实测质量（SSIM）选择。
+    返回 (GIF数据, 求解报告)，无法减小时返回 (gif_data, 报告)。
+    """
+    def measure_data(data, candidate):
+        return measure_output_quality(frames, params, data, candidate)
+    
+    if worker_count() > 1:
+        result = optimize_in_parallel(frames, params, target_size_bytes, operator, measure=measure_data)
+        if result:
+            report = {
+                'params': result['params'],
+                'evaluations': result['evaluations'],
+                'estimated_size': result['size'],
+                'margin': (target_size_bytes - result['size']) / target_size_bytes,
+                'satisfied': result['satisfied'],
+                'quality': result['quality'],
+                'ssim': result['ssim'],
+                'psnr': result['psnr']
+            }
+            if gif_data and result['size'] >= len(gif_data):
+                return gif_data, report
+            return result['data'], report
+    
+    encoded = {}
+    
+    def candidate_key(candidate):
+        return (candidate['width'], candidate['height'], candidate['fps'],
+                candidate.get('colors'), candidate.get('lossy'))
+    
+    def encode_size(candidate):
+        key = candidate_key(candidate)
+        # 原参数的结果就是已生成的GIF，无需重新编码
+        if gif_data and key == candidate_key(params):
+            encoded[key] = gif_data
+        else:
+            encoded[key] = encode_from_frames(frames, candidate, params)
+        return len(encoded[key])
+    
+    def measure(candidate):
+        data = encoded.get(candidate_key(candidate))
+        return measure_data(data, candidate) if data else None
+    
+    report = solve_for_target(params, target_size_bytes, operator, encode_size,
+                              budget=SOLVER_CONFIG["encode_budget"], measure=measure)
+    data = encoded.get(candidate_key(report['params']))
+    
+    if not data or (gif_data and len(data) >= len(gif_data)):
+        return gif_data, report
+    return data, report
+
+def get_gif_size_estimate(video_path, params, cancelled=None):
+    """在整个时间轴上分层抽样试编码预估GIF大小，返回带95%置信区间的预估结果，失败或取消时返回None"""
+    try:
+        # 检查OpenCV可用性
+        if not OPENCV_AVAILABLE or cv2 is None:
+            return None
+            
+        # 首先验证视频文件（结果已缓存）
+        is_valid, message = validate_video_file(video_path)
+        if not is_valid:
+            return None
+        
+        fps = max(1, min(30, params.get('fps', 10)))  # 限制FPS范围
+        
+        handle = get_video_handle(video_path)
+        metadata = handle.metadata() or {}
+        output_frames = plan_output_frame_count(metadata, params)
+        
+        # 优先在上传时生成的代理帧上试编码，不再解码原视频
+        try:
+            proxy = get_proxy(handle)
+            if proxy is not None:
+                estimate = estimate_size_from_proxy(proxy, params, output_frames, cancelled)
+                if estimate and estimate['size'] > 0:
+                    return estimate
+        except Exception:
+            pass
+        
+        # 代理不可用时，按同样的抽样位置从共享句柄读取原视频帧
+        def read_frames(positions):
+            return read_sampled_frames(handle, params, max_frames=output_frames, positions=positions)
+        
+        if cancelled is not None and cancelled():
+            return None
+        estimate = estimate_from_bursts(read_frames, output_frames, fps, cancelled=cancelled, **encode_options(params))
+        if estimate and estimate['size'] > 0:
+            return estimate
+        return None
+        
+    except Exception as e:
+        # 捕获所有未预期的异常
+        return None
+
+def get_real_gif_size_preview(video_path, params):
+    """通过真实试编码获得准确的GIF文件大小预估（字节），失败时返回None"""
+    estimate = get_gif_size_estimate(video_path, params)
+    return estimate['size'] if estimate else None
+
+def get_model_prediction(video_props, params, video_path=None):
+    """用校准模型即时预测GIF大小（不试编码），经过真实转换结果的偏差校正；不可用时返回None"""
+    if not video_path or not OPENCV_AVAILABLE or not os.path.exists(video_path):
+        return None
+    try:
+        handle = get_video_handle(video_path)
+        options = encode_options(params)
+        prediction = calibrated_prediction(
+            get_content_features(handle), params, plan_output_frame_count(video_props, params),
+            get_encode_option_factor(handle, options['colors'], options['lossy'])
+        )
+        if prediction and prediction['size'] > 0:
+            return prediction
+    except Exception:
+        pass
+    return None
+
+def predict_gif_size_instant(video_props, params, video_path=None):
+    """即时预测的GIF大小（字节），不可用时返回None"""
+    prediction = get_model_prediction(video_props, params, video_path)
+    return prediction['size'] if prediction else None
+
+def get_fallback_estimate_size(video_props, params, video_path=None):
+    """获取备用的文件大小估算：优先使用校准模型，不可用时按源文件大小保守估计"""
+    predicted = predict_gif_size_instant(video_props, params, video_path)
+    if predicted:
+        return predicted
+    
+    # 基于视频文件大小的简单估算：通常GIF是视频大小的1/3到1/2
+    file_size = video_props.get('file_size', 5 * 1024 * 1024)
+    return max(10 * 1024, file_size // 3)  # 最少10KB
+
+def size_estimate_cache_key(params, video_path=None):
+    """预估缓存键（包含视频路径，临时存储中的路径即内容哈希，换视频后不会命中旧结果）"""
+    try:
+        return f"{Path(video_path).name if video_path else ''}_{params.get('width', 0)}x{params.get('height', 0)}_{params.get('fps', 10)}fps_{params.get('quality', 85)}q_{params.get('optimize', True)}o_{params.get('colors', 256)}c_{params.get('lossy', 0)}l_{params.get('start_time')}-{params.get('end_time')}"
+    except Exception:
+        return "default_params"
+
+def get_persistent_estimate(video_path, params):
+    """从持久缓存读取确认过的预估，返回 {'size', 'low', 'high', 'source'}，未命中或不可用时返回None"""
+    if not video_path or not os.path.exists(video_path):
+        return None
+    try:
+        cache = get_estimate_cache()
+        if cache is None:
+            return None
+        return cache.get(get_video_handle(video_path).content_hash, params)
+    except Exception:
+        return None
+
+def put_persistent_estimate(video_path, params, estimate):
+    """把确认过的预估写入持久缓存（失败不影响预估）"""
+    try:
+        cache = get_estimate_cache()
+        if cache is not None and estimate['size'] > 0:
+            cache.put(get_video_handle(video_path).content_hash, params, estimate['size'],
+                      estimate.get('low'), estimate.get('high'), estimate.get('source'))
+    except Exception:
+        pass
+
+def get_size_estimate_interval(params, video_path=None, cache=None):
+    """取已缓存预估的95%置信区间(下限, 上限)，没有时返回None"""
+    if cache is None:
+        return None
+    return cache.get('size_estimate_intervals', {}).get(size_estimate_cache_key(params, video_path))
+
+def estimate_gif_size(video_props, params, video_path=None, confirm=False, cancelled=None, cache=None):
+    """预估GIF文件大小 - 默认用校准模型即时预测，confirm=True时用真实试编码确认，带备用机制
+    
+    cancelled() 返回True时（后台预估已被新参数取代）放弃试编码，结果不写入缓存。
+    cache 为存放预估缓存的映射（页面传入会话条目容器），其中的 size_estimate_cache 和
+    size_estimate_intervals 在调用之间复用；为None时只在本次调用内有效。
+    """
+    
+    # 验证输入参数
+    if not video_props or not params:
+        return 1024 * 1024  # 返回1MB作为默认值
+    
+    # 生成参数缓存键
+    params_key = size_estimate_cache_key(params, video_path)
+    
+    # 初始化预估缓存（会话条目受会话内存预算管理，可能已被回收）
+    cache = cache if cache is not None else {}
+    size_cache = cache.setdefault('size_estimate_cache', {})
+    intervals = cache.setdefault('size_estimate_intervals', {})
+    
+    # 检查缓存（只缓存试编码确认过的结果）
+    if params_key in size_cache:
+        cached_size = size_cache[params_key]
+        if cached_size and cached_size > 0:
+            return cached_size
+    
+    # 检查跨会话的持久缓存（按视频内容哈希和完整参数）
+    persistent = get_persistent_estimate(video_path, params)
+    if persistent:
+        if persistent['low'] is not None and persistent['high'] is not None:
+            intervals[params_key] = (persistent['low'], persistent['high'])
+        size_cache[params_key] = persistent['size']
+        return persistent['size']
+    
+    # 参数搜索等场景使用模型即时预测，不做试编码
+    if not confirm:
+        predicted = predict_gif_size_instant(video_props, params, video_path)
+        if predicted:
+            return predicted
+    
+    estimated_size = None
+    confirmed = None
+    
+    # 校准后近期误差已足够低的内容类别，直接采用模型预测，不再试编码确认
+    prediction = get_model_prediction(video_props, params, video_path)
+    if prediction and prediction['trusted']:
+        estimated_size = prediction['size']
+        confirmed = dict(prediction, source='calibrated')
+        intervals[params_key] = (prediction['low'], prediction['high'])
+    
+    # 真实试编码预估（只有在视频文件有效时）
+    elif video_path and os.path.exists(video_path):
+        try:
+            # 验证视频文件状态
+            is_valid, _ = validate_video_file(video_path)
+            if is_valid:
+                estimate = get_gif_size_estimate(video_path, params, cancelled)
+                if estimate:
+                    estimated_size = estimate['size']
+                    confirmed = dict(estimate, source='trial')
+                    # 记录置信区间供界面显示
+                    intervals[params_key] = (estimate['low'], estimate['high'])
+        except Exception as e:
+            estimated_size = None
+    
+    # 试编码失败时使用模型预测或保守估计
+    if estimated_size is None or estimated_size <= 0:
+        estimated_size = get_fallback_estimate_size(video_props, params, video_path)
+    
+    # 验证估算结果的合理性
+    if estimated_size is None or estimated_size <= 0:
+        estimated_size = 1024 * 1024  # 默认1MB
+    
+    # 已取消的预估只是备用值，不缓存
+    if cancelled is not None and cancelled():
+        return estimated_size
+    
+    # 缓存结果
+    try:
+        size_cache[params_key] = estimated_size
+    except Exception:
+        pass  # 缓存失败不影响功能
+    
+    # 确认过的预估写入持久缓存（备用估算不写入）
+    if confirmed:
+        put_persistent_estimate(video_path, params, confirmed)
+    
+    return estimated_size
+
+def validate_params_against_constraint(video_props, params, size_constraint, video_path=None, confirm=False, cache=None):
+    """验证参数是否能满足大小约束（confirm=True时以真实试编码结果为准）"""
+    if not size_constraint or not size_constraint.get('enabled'):
+        return True, None
+    
+    estimated_size = estimate_gif_size(video_props, params, video_path, confirm, cache=cache)
+    target_size = size_constraint['target_size']
+    operator = size_constraint['operator']
+    
+    # 检查是否满足约束
+    satisfied = False
+    if operator == '<':
+        satisfied = estimated_size < target_size
+    elif operator == '<=':
+        satisfied = estimated_size <= target_size
+    elif operator == '>':
+        satisfied = estimated_size > target_size
+    elif operator == '>=':
+        satisfied = estimated_size >= target_size
+    elif operator == '=':
+        # 允许10%的误差
+        satisfied = abs(estimated_size - target_size) / target_size <= 0.1
+    
+    return satisfied, estimated_size
+
+def measure_params_quality(params, video_path):
+    """参数在代理帧上的实测质量 {'ssim', 'psnr'}，代理不可用时返回None"""
+    if not OPENCV_AVAILABLE or not video_path or not params.get('width') or not params.get('height'):
+        return None
+    try:
+        proxy = get_proxy(get_video_handle(video_path))
+        if proxy is None:
+            return None
+        return measure_proxy_quality(proxy, params)
+    except Exception:
+        return None
+
+def adjust_params_for_constraint(video_props, base_params, size_constraint, video_path=None, cache=None, report=None):
+    """根据大小约束求解参数：在分辨率、帧率、调色板和有损级别上搜索满足约束的最高质量参数
+    
+    report 为字典时写入求解过程（evaluations、estimated_size、margin、satisfied、ssim）。
+    """
+    if not size_constraint or not size_constraint.get('enabled'):
+        return base_params
+    
+    target_size = size_constraint['target_size']
+    operator = size_constraint['operator']
+    
+    # 只对小于和等于类型的约束进行自动调整
+    if operator not in ['<', '<=', '=']:
+        return base_params
+    
+    # 求解需要明确的原始尺寸
+    solver_params = base_params.copy()
+    if not solver_params.get('width') or not solver_params.get('height'):
+        solver_params['width'] = video_props.get('width', 640)
+        solver_params['height'] = video_props.get('height', 480)
+    
+    # 每次评估都用模型即时预测（已缓存），不做试编码
+    def estimate(params):
+        return estimate_gif_size(video_props, params, video_path, cache=cache)
+    
+    # 满足约束的参数之间按代理帧上的实测质量选择
+    def measure(params):
+        return measure_params_quality(params, video_path)
+    
+    try:
+        solved = solve_for_target(solver_params, target_size, operator, estimate, measure=measure)
+    except Exception:
+        return base_params
+    
+    # 记录求解过程供界面显示
+    if report is not None:
+        report.update({
+            'evaluations': solved['evaluations'],
+            'estimated_size': solved['estimated_size'],
+            'margin': solved['margin'],
+            'satisfied': solved['satisfied'],
+            'ssim': solved['ssim']
+        })
+    
+    return solved['params']
+
+def compute_panel_estimate(video_props, params, size_constraint, video_path=None, cancelled=None, cache=None):
+    """参数面板的预估：按约束求解参数并用试编码确认大小（不输出界面元素，可在后台线程执行）
+    
+    返回 {'estimated_size', 'interval', 'satisfied', 'constraint', 'adjusted_params', 'solver_report'}，
+    已被取消时返回None。
+    """
+    constraint = None
+    adjusted_params = None
+    solver_report = None
+    estimate_params = params
+    
+    if size_constraint and size_constraint.get('enabled', False):
+        constraint = dict(size_constraint)
+        
+        # 确保约束包含target_size字段
+        if 'target_size' not in constraint:
+            unit_multipliers = {
+                'B': 1,
+                'KB': 1024,
+                'MB': 1024 * 1024,
+                'GB': 1024 * 1024 * 1024
+            }
+            multiplier = unit_multipliers.get(constraint.get('unit', 'MB').upper(), 1024 * 1024)
+            constraint['target_size'] = constraint.get('value', 5.0) * multiplier
+        
+        # 基于约束调整参数
+        solver_report = {}
+        adjusted_params = adjust_params_for_constraint(video_props, params, constraint, video_path, cache, solver_report)
+        solver_report = solver_report or None
+        estimate_params = adjusted_params
+    
+    if cancelled is not None and cancelled():
+        return None
+    
+    # 使用调整后的参数进行预估
+    estimated_size = estimate_gif_size(video_props, estimate_params, video_path, confirm=True, cancelled=cancelled,
+                                       cache=cache)
+    if cancelled is not None and cancelled():
+        return None
+    
+    satisfied = True
+    if constraint:
+        satisfied, _ = validate_params_against_constraint(
+            video_props, estimate_params, constraint, video_path, confirm=True, cache=cache
+        )
+    
+    return {
+        'estimated_size': estimated_size,
+        'interval': get_size_estimate_interval(estimate_params, video_path, cache),
+        'satisfied': satisfied,
+        'constraint': constraint,
+        'adjusted_params': adjusted_params,
+        'solver_report': solver_report
+    }
@@ -0,0 +1,447 @@
+"""
+GIF大小预测模型
+
+GIF由一个完整的首帧和之后每帧的增量区域组成，模型分两部分预测：
+- 首帧字节数 F = exp(a·x_F)
+- 每帧增量字节数 D = exp(b·x_D)
+总大小 = F + (帧数 - 1) × D，在对数空间用Levenberg-Marquardt拟合。
+输入是代理帧上的廉价特征（空间细节、运动能量、变化区域、小尺寸试编码的每像素字节数）
+和输出参数（分辨率、帧率、帧数），预测耗时在毫秒级，无需对原视频试编码。
+PIL的GIF编码不使用quality参数，因此质量不作为模型输入。
+调色板颜色数和有损级别不进入模型：它们对大小的影响由代理帧上同一段连续帧
+分别按默认选项和目标选项试编码的大小比（选项系数）给出，按视频和选项缓存。
+
+模型系数保存在同目录的 gif_size_model.json 中随项目发布。重新训练：
+    python gif_size_model.py --videos 48
+会用cv2.VideoWriter在本地生成合成校准视频，按正式转换的流程真实编码得到样本。
+"""
+
+import argparse
+import json
+import math
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from gif_codec import DEFAULT_COLORS, DEFAULT_LOSSY, encode_gif
+from video_handle import get_video_handle
+from video_index import get_frame_index, iter_frames
+from video_proxy import get_proxy
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+SIZE_MODEL_PATH = Path(__file__).with_name("gif_size_model.json")
+
+FIRST_FEATURES = ["bias", "log_pixels", "log_first_bpp", "log_pixels_x_log_first_bpp", "log_detail"]
+DELTA_FEATURES = [
+    "bias", "log_pixels", "log_delta_bpp", "log_gap_ratio", "log_first_bpp",
+    "changed", "log_changed", "log_motion_per_frame"
+]
+
+# 特征计算使用的代理帧数上限
+FEATURE_SAMPLE_FRAMES = 24
+
+# 小尺寸试编码：长边像素和相邻帧对数量
+PROBE_SIDE = 128
+PROBE_PAIRS = 3
+
+# 选项系数试编码：连续帧段数量、每段帧数和长边像素
+OPTION_PROBE_RUNS = 2
+OPTION_PROBE_FRAMES = 8
+OPTION_PROBE_SIDE = 160
+
+# 进程内缓存的内容特征数量
+FEATURE_CACHE_SIZE = 64
+
+# 进程内缓存的选项系数数量
+OPTION_FACTOR_CACHE_SIZE = 512
+
+def _probe_encode(proxy):
+    """在缩小的代理帧上编码几个单帧和相邻帧对，得到首帧和增量的每像素字节数"""
+    picks = np.unique(np.linspace(0, proxy.count - 2, PROBE_PAIRS).round().astype(int))
+    scale = min(1.0, PROBE_SIDE / max(proxy.width, proxy.height))
+    size = (max(2, int(proxy.width * scale)), max(2, int(proxy.height * scale)))
+    pixels = size[0] * size[1]
+    first_bpp, delta_bpp, gaps = [], [], []
+    for i in picks:
+        a = cv2.resize(proxy.frames[i], size, interpolation=cv2.INTER_AREA)
+        b = cv2.resize(proxy.frames[i + 1], size, interpolation=cv2.INTER_AREA)
+        single = len(encode_gif([a], 10))
+        pair = len(encode_gif([a, b], 10))
+        first_bpp.append(single / pixels)
+        delta_bpp.append(max(0, pair - single) / pixels)
+        gaps.append(proxy.timestamps[i + 1] - proxy.timestamps[i])
+    return float(np.mean(first_bpp)), float(np.mean(delta_bpp)), float(max(np.mean(gaps), 1e-3))
+
+def extract_content_features(proxy):
+    """从代理帧计算与输出参数无关的内容特征"""
+    count = min(FEATURE_SAMPLE_FRAMES, proxy.count)
+    picks = np.unique(np.linspace(0, proxy.count - 1, count).round().astype(int))
+    gray = proxy.frames[picks].astype(np.float32).mean(axis=3)
+    gradient = np.abs(np.diff(gray, axis=1)).mean() + np.abs(np.diff(gray, axis=2)).mean()
+
+    # 取每个采样帧与其后一帧的差异，反映真实的帧间变化；运动按时间间隔归一化为每秒变化量
+    motion_rate = 0.0
+    changed = 0.0
+    nexts = np.minimum(picks + 1, proxy.count - 1)
+    valid = nexts > picks
+    if valid.any():
+        a = proxy.frames[picks[valid]].astype(np.int16)
+        b = proxy.frames[nexts[valid]].astype(np.int16)
+        diff = np.abs(a - b).max(axis=3)
+        gaps = np.maximum(proxy.timestamps[nexts[valid]] - proxy.timestamps[picks[valid]], 1e-3)
+        motion_rate = float((diff.mean(axis=(1, 2)) / 255 / gaps).mean())
+        # GIF只编码与上一帧不同的外接矩形，变化区域按外接矩形面积计
+        fractions = []
+        for mask in diff > 8:
+            rows = np.flatnonzero(mask.any(axis=1))
+            cols = np.flatnonzero(mask.any(axis=0))
+            if len(rows) and len(cols):
+                fractions.append((rows[-1] - rows[0] + 1) * (cols[-1] - cols[0] + 1) / mask.size)
+            else:
+                fractions.append(0.0)
+        changed = float(np.mean(fractions))
+
+    first_bpp, delta_bpp, probe_gap = _probe_encode(proxy)
+    return {
+        'detail': float(gradient / 255),
+        'motion_rate': motion_rate,
+        'changed': changed,
+        'first_bpp': first_bpp,
+        'delta_bpp': delta_bpp,
+        'probe_gap': probe_gap
+    }
+
+def feature_vectors(content, params):
+    """组合内容特征和输出参数，返回(首帧特征, 增量特征)，顺序与FIRST_FEATURES/DELTA_FEATURES一致"""
+    width = max(10, min(2000, params.get('width', 640)))
+    height = max(10, min(2000, params.get('height', 480)))
+    fps = max(1, min(30, params.get('fps', 10)))
+    log_pixels = math.log(width * height)
+    log_first = math.log(content['first_bpp'])
+    first = np.array([
+        1.0,
+        log_pixels,
+        log_first,
+        log_pixels * log_first,
+        math.log(content['detail'] + 0.01)
+    ])
+    delta = np.array([
+        1.0,
+        log_pixels,
+        math.log(content['delta_bpp'] + 1e-4),
+        math.log((1.0 / fps) / content['probe_gap']),
+        log_first,
+        content['changed'],
+        math.log(content['changed'] + 1e-3),
+        math.log(min(1.0, content['motion_rate'] / fps) + 1e-3)
+    ])
+    return first, delta
+
+_model = None
+_model_lock = threading.Lock()
+
+def load_size_model(path=None):
+    """读取模型系数，文件缺失、损坏或特征不匹配时返回None"""
+    global _model
+    with _model_lock:
+        if _model is not None and path is None:
+            return _model
+        try:
+            with open(path or SIZE_MODEL_PATH, "r", encoding="utf-8") as f:
+                model = json.load(f)
+            if model.get('first_features') != FIRST_FEATURES or model.get('delta_features') != DELTA_FEATURES:
+                return None
+            model['first_coef'] = np.array(model['first_coef'])
+            model['delta_coef'] = np.array(model['delta_coef'])
+        except (OSError, ValueError, KeyError):
+            return None
+        if path is None:
+            _model = model
+        return model
+
+def _predict_log_sizes(first_coef, delta_coef, first_rows, delta_rows, frames):
+    first_bytes = np.exp(first_rows @ first_coef)
+    delta_bytes = np.exp(delta_rows @ delta_coef)
+    return np.log(first_bytes + (frames - 1) * delta_bytes), first_bytes, delta_bytes
+
+def predict_gif_size(content, params, output_frames, model=None):
+    """预测GIF大小，返回 {'size', 'low', 'high'}（95%预测区间），模型不可用时返回None"""
+    model = model or load_size_model()
+    if model is None or not content:
+        return None
+    first, delta = feature_vectors(content, params)
+    log_size = float(_predict_log_sizes(
+        model['first_coef'], model['delta_coef'], first[None, :], delta[None, :], np.array([max(1, output_frames)])
+    )[0][0])
+    spread = 1.96 * model.get('residual_std', 0.3)
+    return {
+        'size': int(math.exp(log_size)),
+        'low': int(math.exp(log_size - spread)),
+        'high': int(math.exp(log_size + spread))
+    }
+
+_content_features = OrderedDict()
+_content_features_lock = threading.Lock()
+
+def get_content_features(handle, build_proxy=True):
+    """视频内容特征，按内容哈希缓存；代理帧不可用时返回None"""
+    with _content_features_lock:
+        content = _content_features.get(handle.content_hash)
+        if content is not None:
+            _content_features.move_to_end(handle.content_hash)
+            return content
+
+    proxy = get_proxy(handle, build=build_proxy)
+    if proxy is None or proxy.count < 2:
+        return None
+    content = extract_content_features(proxy)
+
+    with _content_features_lock:
+        _content_features[handle.content_hash] = content
+        while len(_content_features) > FEATURE_CACHE_SIZE:
+            _content_features.popitem(last=False)
+    return content
+
+def encode_option_factor(proxy, colors=DEFAULT_COLORS, lossy=DEFAULT_LOSSY):
+    """代理帧上按目标选项与默认选项试编码的大小比"""
+    if colors >= DEFAULT_COLORS and not lossy:
+        return 1.0
+    length = min(OPTION_PROBE_FRAMES, proxy.count)
+    starts = np.unique(np.linspace(0, proxy.count - length, OPTION_PROBE_RUNS + 2)[1:-1].round().astype(int))
+    scale = min(1.0, OPTION_PROBE_SIDE / max(proxy.width, proxy.height))
+    size = (max(2, int(proxy.width * scale)), max(2, int(proxy.height * scale)))
+    default_bytes = 0
+    option_bytes = 0
+    for start in starts:
+        frames = [cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                  for frame in proxy.frames[start:start + length]]
+        default_bytes += len(encode_gif(frames, 10))
+        option_bytes += len(encode_gif(frames, 10, colors=colors, lossy=lossy))
+    if default_bytes <= 0:
+        return 1.0
+    return option_bytes / default_bytes
+
+_option_factors = OrderedDict()
+_option_factors_lock = threading.Lock()
+
+def get_encode_option_factor(handle, colors=DEFAULT_COLORS, lossy=DEFAULT_LOSSY):
+    """视频在给定调色板/有损选项下的选项系数，按内容哈希和选项缓存；代理帧不可用时返回1.0"""
+    if colors >= DEFAULT_COLORS and not lossy:
+        return 1.0
+    key = (handle.content_hash, int(colors), int(lossy))
+    with _option_factors_lock:
+        factor = _option_factors.get(key)
+        if factor is not None:
+            _option_factors.move_to_end(key)
+            return factor
+
+    proxy = get_proxy(handle, build=False)
+    if proxy is None or proxy.count < 2 or not OPENCV_AVAILABLE:
+        return 1.0
+    factor = encode_option_factor(proxy, colors, lossy)
+
+    with _option_factors_lock:
+        _option_factors[key] = factor
+        while len(_option_factors) > OPTION_FACTOR_CACHE_SIZE:
+            _option_factors.popitem(last=False)
+    return factor
+
+def _synthetic_frames(kind, width, height, count, rng):
+    """生成一段合成视频帧（BGR），覆盖纯色字幕、纹理平移、移动图形、噪声、渐变淡入等内容"""
+    texture = rng.integers(0, 256, (height, width * 2, 3), dtype=np.uint8)
+    blur = int(rng.choice([1, 3, 7, 15]))
+    if blur > 1:
+        texture = cv2.GaussianBlur(texture, (blur, blur), 0)
+    speed = int(rng.integers(1, 12))
+    background = np.zeros((height, width, 3), np.uint8)
+    background[:] = rng.integers(0, 256, 3)
+    shapes = [(rng.integers(0, width), rng.integers(0, height), rng.integers(5, max(6, width // 4)),
+               tuple(int(c) for c in rng.integers(0, 256, 3)), rng.integers(-6, 7, 2)) for _ in range(rng.integers(1, 8))]
+
+    for i in range(count):
+        if kind == "title":
+            frame = background.copy()
+            cv2.putText(frame, f"TITLE {i // 20}", (width // 8, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        max(0.5, width / 320), (255, 255, 255), 2)
+        elif kind == "pan":
+            offset = (i * speed) % width
+            frame = texture[:, offset:offset + width].copy()
+        elif kind == "shapes":
+            frame = background.copy()
+            for x, y, r, color, velocity in shapes:
+                cx = int(x + velocity[0] * i) % width
+                cy = int(y + velocity[1] * i) % height
+                cv2.circle(frame, (cx, cy), int(r), color, -1)
+        elif kind == "noise":
+            frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            if blur > 1:
+                frame = cv2.GaussianBlur(frame, (blur, blur), 0)
+        elif kind == "gradient":
+            ramp = np.linspace(0, 255, width, dtype=np.float32)
+            shift = (i * speed) % 256
+            frame = np.stack([np.tile((ramp + shift) % 256, (height, 1))] * 3, axis=2).astype(np.uint8)
+            frame = (frame * (0.5 + 0.5 * np.sin(i / 10))).astype(np.uint8)
+        else:  # fade：纹理从黑场淡入
+            alpha = min(1.0, i / max(1, count // 2))
+            frame = (texture[:, :width].astype(np.float32) * alpha).astype(np.uint8)
+        yield frame
+
+def generate_calibration_corpus(output_dir, videos=48, seed=0):
+    """用cv2.VideoWriter生成合成校准视频，返回文件路径列表"""
+    rng = np.random.default_rng(seed)
+    kinds = ["title", "pan", "shapes", "noise", "gradient", "fade"]
+    sizes = [(160, 120), (320, 180), (320, 240), (480, 270), (640, 360)]
+    paths = []
+    for n in range(videos):
+        kind = kinds[n % len(kinds)]
+        width, height = sizes[int(rng.integers(0, len(sizes)))]
+        fps = int(rng.choice([15, 24, 25, 30]))
+        count = int(fps * rng.uniform(2.0, 4.0))
+        path = Path(output_dir) / f"calib_{n:03d}_{kind}.mp4"
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        for frame in _synthetic_frames(kind, width, height, count, rng):
+            writer.write(frame)
+        writer.release()
+        paths.append(path)
+    return paths
+
+def _encode_like_conversion(handle, params, max_frames=150):
+    """按正式转换的取帧和缩放规则真实编码，返回(字节数, 帧数)"""
+    index = get_frame_index(handle)
+    fps = max(1, min(30, params.get('fps', 10)))
+    frame_numbers = index.select_frames(fps, max_frames=max_frames)
+    images = {}
+    with handle.capture() as cap:
+        for frame_number, frame in iter_frames(cap, index, np.unique(frame_numbers)):
+            frame = cv2.resize(frame, (params['width'], params['height']), interpolation=cv2.INTER_LINEAR)
+            images[frame_number] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frames = [images[n] for n in frame_numbers if n in images]
+    return len(encode_gif(frames, fps, params.get('quality', 85), params.get('optimize', True))), len(frames)
+
+def collect_calibration_samples(video_paths):
+    """对每个校准视频按多组参数真实编码，返回样本列表 [(视频序号, 内容特征, 参数, 字节数, 帧数)]"""
+    samples = []
+    for video_number, path in enumerate(video_paths):
+        handle = get_video_handle(path)
+        metadata = handle.metadata()
+        content = get_content_features(handle)
+        if not metadata or content is None:
+            continue
+        for scale in (1.0, 0.5, 0.25):
+            for fps in (5, 10, 15):
+                params = {
+                    'width': max(10, int(metadata['width'] * scale)),
+                    'height': max(10, int(metadata['height'] * scale)),
+                    'fps': fps,
+                    'quality': 85,
+                    'optimize': True
+                }
+                size, frames = _encode_like_conversion(handle, params)
+                if size > 0 and frames > 0:
+                    samples.append((video_number, content, params, size, frames))
+    return samples
+
+def _fit_two_part(first_rows, delta_rows, log_sizes, frames, iterations=200):
+    """Levenberg-Marquardt拟合 log(F + (N-1)·D)"""
+    first_count = first_rows.shape[1]
+    theta = np.zeros(first_count + delta_rows.shape[1])
+    mean_size = np.exp(log_sizes).mean()
+    theta[0] = math.log(mean_size / 2)
+    theta[first_count] = math.log(mean_size / frames.mean() / 2)
+    damping = 1e-2
+
+    def residuals(values):
+        return log_sizes - _predict_log_sizes(values[:first_count], values[first_count:], first_rows, delta_rows, frames)[0]
+
+    current = residuals(theta)
+    for _ in range(iterations):
+        predicted, first_bytes, delta_bytes = _predict_log_sizes(
+            theta[:first_count], theta[first_count:], first_rows, delta_rows, frames
+        )
+        total = np.exp(predicted)
+        jacobian = np.hstack([
+            first_rows * (first_bytes / total)[:, None],
+            delta_rows * ((frames - 1) * delta_bytes / total)[:, None]
+        ])
+        step = np.linalg.solve(jacobian.T @ jacobian + damping * np.eye(len(theta)), jacobian.T @ current)
+        candidate = residuals(theta + step)
+        if (candidate ** 2).sum() < (current ** 2).sum():
+            theta, current = theta + step, candidate
+            damping *= 0.5
+        else:
+            damping *= 10
+    return theta[:first_count], theta[first_count:]
+
+def fit_size_model(samples, holdout_every=5):
+    """拟合模型，按视频划分交叉验证评估对新视频的泛化误差，返回模型字典"""
+    first_rows, delta_rows, log_sizes, frames, groups = [], [], [], [], []
+    for video_number, content, params, size, frame_count in samples:
+        first, delta = feature_vectors(content, params)
+        first_rows.append(first)
+        delta_rows.append(delta)
+        log_sizes.append(math.log(size))
+        frames.append(frame_count)
+        groups.append(video_number)
+    first_rows = np.array(first_rows)
+    delta_rows = np.array(delta_rows)
+    log_sizes = np.array(log_sizes)
+    frames = np.array(frames, dtype=np.float64)
+    groups = np.array(groups)
+
+    errors = np.zeros(len(log_sizes))
+    for fold in range(holdout_every):
+        holdout = groups % holdout_every == fold
+        first_coef, delta_coef = _fit_two_part(first_rows[~holdout], delta_rows[~holdout], log_sizes[~holdout], frames[~holdout])
+        predicted = _predict_log_sizes(first_coef, delta_coef, first_rows[holdout], delta_rows[holdout], frames[holdout])[0]
+        errors[holdout] = np.abs(np.exp(predicted - log_sizes[holdout]) - 1)
+
+    first_coef, delta_coef = _fit_two_part(first_rows, delta_rows, log_sizes, frames)
+    residuals = log_sizes - _predict_log_sizes(first_coef, delta_coef, first_rows, delta_rows, frames)[0]
+    return {
+        'version': 2,
+        'first_features': FIRST_FEATURES,
+        'delta_features': DELTA_FEATURES,
+        'first_coef': first_coef.tolist(),
+        'delta_coef': delta_coef.tolist(),
+        'residual_std': float(residuals.std()),
+        'holdout_mape': float(errors.mean()),
+        'holdout_median_error': float(np.median(errors)),
+        'samples': int(len(log_sizes)),
+        'videos': int(len(set(groups.tolist()))),
+        'trained_at': time.strftime("%Y-%m-%d")
+    }
+
+def save_size_model(model, path=None):
+    with open(path or SIZE_MODEL_PATH, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成校准视频并训练GIF大小预测模型")
+    parser.add_argument("--videos", type=int, default=48, help="校准视频数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", type=Path, default=SIZE_MODEL_PATH, help="模型输出路径")
+    args = parser.parse_args()
+
+    if not OPENCV_AVAILABLE:
+        raise SystemExit("需要安装OpenCV才能生成校准视频")
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        paths = generate_calibration_corpus(corpus_dir, args.videos, args.seed)
+        model = fit_size_model(collect_calibration_samples(paths))
+    save_size_model(model, args.output)
+    print(f"样本数: {model['samples']}，视频数: {model['videos']}，"
+          f"交叉验证平均相对误差: {model['holdout_mape']:.1%}（中位数 {model['holdout_median_error']:.1%}），"
+          f"残差标准差: {model['residual_std']:.3f}")
+
+if __name__ == "__main__":
+    main()
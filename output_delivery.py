@@ -0,0 +1,106 @@
+"""
+转换结果的磁盘交付
+
+完成的GIF写入临时存储（按会话计引用），会话状态只保存文件句柄，不保存字节：
+- 启用静态文件服务（server.enableStaticServing）时，在静态目录下为会话创建存储文件的
+  硬链接，由服务器直接从磁盘发送，不占用会话内存（静态文件服务不跟随指向目录外的符号链接）
+- 链接按会话分目录存放，会话重置或过期、存储文件被回收后链接随之清理
+- 静态文件服务不可用时退回内存下载，单个会话驻留的输出字节数不超过上限
+"""
+
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+# 交付配置
+OUTPUT_DELIVERY_CONFIG = {
+    "static_subdir": "outputs",  # 静态文件目录下存放下载链接的子目录
+    "memory_cap_bytes": 32 * 1024 * 1024  # 内存下载时单个会话驻留的输出字节数上限
+}
+
+def store_output(store, session_id, data, filename, **info):
+    """把GIF写入临时存储并返回句柄 {'path', 'key', 'size', 'filename', ...}"""
+    path = store.put_bytes(session_id, data, filename)
+    handle = {
+        'path': str(path),
+        'key': store.key_for_path(path),
+        'size': len(data),
+        'filename': filename
+    }
+    handle.update(info)
+    return handle
+
+def store_output_file(store, session_id, path, filename, **info):
+    """把已写入磁盘的输出文件（如批量转换的ZIP）移入临时存储并返回句柄"""
+    size = os.path.getsize(path)
+    stored = store.put_file(session_id, path, filename)
+    handle = {
+        'path': str(stored),
+        'key': store.key_for_path(stored),
+        'size': size,
+        'filename': filename
+    }
+    handle.update(info)
+    return handle
+
+def read_output(handle):
+    """从磁盘读取输出内容，文件已被回收时返回None"""
+    try:
+        with open(handle['path'], "rb") as f:
+            return f.read()
+    except (OSError, KeyError, TypeError):
+        return None
+
+def fits_in_memory(handle):
+    """输出是否可以放入会话内存下载"""
+    return handle['size'] <= OUTPUT_DELIVERY_CONFIG["memory_cap_bytes"]
+
+def _session_dir(static_dir, session_id):
+    return Path(static_dir) / OUTPUT_DELIVERY_CONFIG["static_subdir"] / session_id
+
+def publish_output(handle, static_dir, session_id):
+    """在静态目录中为会话创建输出文件的链接，返回相对URL，失败时返回None
+
+    优先使用硬链接（不占用额外空间），跨文件系统等不支持的情况下复制文件。
+    """
+    source = Path(handle['path'])
+    if not source.exists():
+        return None
+    session_dir = _session_dir(static_dir, session_id)
+    name = f"{handle.get('key') or uuid.uuid4().hex}{source.suffix}"
+    target = session_dir / name
+    try:
+        session_dir.mkdir(parents=True, exist_ok=True)
+        if not target.exists():
+            tmp_target = target.with_name(f"{name}.{uuid.uuid4().hex[:8]}.tmp")
+            try:
+                os.link(source, tmp_target)
+            except OSError:
+                shutil.copyfile(source, tmp_target)
+            os.replace(tmp_target, target)
+    except OSError:
+        return None
+    return f"app/static/{OUTPUT_DELIVERY_CONFIG['static_subdir']}/{session_id}/{name}"
+
+def withdraw_outputs(static_dir, session_id):
+    """删除会话的全部下载链接"""
+    shutil.rmtree(_session_dir(static_dir, session_id), ignore_errors=True)
+
+def prune_outputs(static_dir, store):
+    """清理已过期会话的链接目录和存储文件已被回收的链接"""
+    root = Path(static_dir) / OUTPUT_DELIVERY_CONFIG["static_subdir"]
+    if not root.is_dir():
+        return
+    for session_dir in root.iterdir():
+        if not session_dir.is_dir():
+            continue
+        if not store.has_session(session_dir.name):
+            shutil.rmtree(session_dir, ignore_errors=True)
+            continue
+        for link in session_dir.iterdir():
+            if not store.contains(link.name.split(".", 1)[0]):
+                try:
+                    link.unlink()
+                except OSError:
+                    pass
@@ -0,0 +1,234 @@
+"""
+候选参数的并行编码
+
+转换结果超出大小约束时，沿降级路径生成一组候选参数，在进程池中同时编码：
+- 原始帧只写入一次共享内存，各进程按名称映射读取，不经过pickle传输
+- 共享内存头部为取消标记（全部取消一个字节，每个候选各一个字节），进程开始编码前和缩放后检查
+- 某个候选满足目标且质量不低于阈值时，取消其余候选；
+  满足目标的候选出现后，质量更低的候选也不再需要
+- 提供实测质量函数时，在完成的满足目标的候选中按实测质量（同等质量取更小的文件）选择
+总耗时接近最慢的单个候选，而不是所有候选之和。
+"""
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+from PIL import Image
+
+from gif_codec import encode_gif, encode_options
+from quality_metrics import select_best
+from size_solver import SOLVER_CONFIG, is_satisfied, path_candidates, quality_score
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+# 并行编码配置
+PARALLEL_CONFIG = {
+    "max_workers": 4,  # 进程数上限（不超过CPU核数）
+    "candidates": 8,  # 沿降级路径的候选数量
+    "quality_threshold": 0.9  # 满足目标且质量评分不低于此值时取消其余候选
+}
+
+# 共享内存头部：第0字节为全部取消标记，第1+k字节为第k个候选的取消标记，帧数据从对齐的偏移开始
+_HEADER_BYTES = 64
+MAX_CANDIDATES = _HEADER_BYTES - 1
+
+def encode_from_frames(frames, params, source_params, cancelled=None):
+    """从保留的原始帧（正式转换按source_params读取、尚未量化）按新参数编码GIF
+
+    帧率降低时按输出时间点抽帧，分辨率降低时从原始像素缩放，每组参数只编码一次。
+    frames 为PIL图像或RGB数组序列；cancelled() 返回True时放弃编码并返回None。
+    """
+    source_fps = max(1, min(30, source_params.get('fps', 10)))
+    fps = max(1, min(source_fps, params.get('fps', source_fps)))
+    count = max(1, int(round(len(frames) * fps / source_fps)))
+    positions = np.minimum((np.arange(count) * source_fps / fps).round().astype(int), len(frames) - 1)
+
+    size = (max(2, int(params['width'])), max(2, int(params['height'])))
+    resized = {}
+    selected = []
+    for position in positions.tolist():
+        frame = frames[position]
+        # 目标帧率高于源帧率时同一帧对象会重复出现，只缩放一次
+        key = id(frame)
+        if key not in resized:
+            array = np.asarray(frame)
+            if (array.shape[1], array.shape[0]) != size:
+                array = cv2.resize(array, size, interpolation=cv2.INTER_AREA)
+            resized[key] = Image.fromarray(np.array(array))
+        selected.append(resized[key])
+
+    if cancelled is not None and cancelled():
+        return None
+    return encode_gif(selected, fps, **encode_options(params))
+
+class SharedFrames:
+    """把原始帧写入共享内存（重复的帧对象只存一份），供工作进程按名称映射"""
+
+    def __init__(self, frames):
+        unique = {}
+        order = []
+        for frame in frames:
+            order.append(unique.setdefault(id(frame), (len(unique), frame))[0])
+        arrays = [np.asarray(frame) for _, frame in unique.values()]
+        self.shape = (len(arrays),) + arrays[0].shape
+        self.order = order
+        self.memory = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + int(np.prod(self.shape)))
+        self.memory.buf[0] = 0
+        view = np.ndarray(self.shape, dtype=np.uint8, buffer=self.memory.buf, offset=_HEADER_BYTES)
+        for i, array in enumerate(arrays):
+            view[i] = array
+        del view
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def cancel(self, candidate=None):
+        """取消全部候选，或只取消第candidate个"""
+        self.memory.buf[0 if candidate is None else 1 + candidate] = 1
+
+    def close(self):
+        try:
+            self.memory.close()
+            self.memory.unlink()
+        except (OSError, BufferError):
+            pass
+
+def _encode_shared(name, shape, order, candidate, params, source_params):
+    """工作进程：映射共享内存中的帧并编码，已取消时返回None"""
+    try:
+        memory = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return None  # 调度方已结束并释放共享内存
+    try:
+        def cancelled():
+            return bool(memory.buf[0] or memory.buf[1 + candidate])
+
+        if cancelled():
+            return None
+        view = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf, offset=_HEADER_BYTES)
+        frames = [view[i] for i in range(shape[0])]
+        data = encode_from_frames([frames[i] for i in order], params, source_params, cancelled)
+        del frames, view
+        return data
+    finally:
+        try:
+            memory.close()
+        except BufferError:
+            pass
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def worker_count():
+    return max(1, min(PARALLEL_CONFIG["max_workers"], os.cpu_count() or 1))
+
+def get_executor():
+    """进程内共享的编码进程池（spawn启动，避免在多线程的服务进程中fork）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=worker_count(), mp_context=get_context("spawn"))
+        return _executor
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def optimize_in_parallel(frames, params, target_size, operator='<', candidates=None, measure=None):
+    """在进程池中同时编码沿降级路径的候选参数
+
+    measure(data, candidate) 返回实测质量 {'ssim', 'psnr'}，提供时按实测质量在满足约束的候选中选择。
+    返回 {'data', 'params', 'size', 'quality', 'ssim', 'psnr', 'satisfied', 'evaluations', 'cancelled'}：
+    满足约束的候选中质量最高的一个；都不满足时返回最小的结果。进程池不可用时返回None。
+    """
+    candidates = (candidates or path_candidates(params, PARALLEL_CONFIG["candidates"]))[:MAX_CANDIDATES]
+    if not candidates or not OPENCV_AVAILABLE:
+        return None
+    try:
+        shared = SharedFrames(frames)
+    except (OSError, ValueError):
+        return None
+
+    best = None
+    smallest = None
+    satisfied = []
+    evaluations = 0
+    try:
+        executor = get_executor()
+        pending = {}
+        for number, candidate in enumerate(candidates):
+            future = executor.submit(
+                _encode_shared, shared.name, shared.shape, shared.order, number, candidate, params
+            )
+            pending[future] = (number, candidate, quality_score(candidate, params))
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _, candidate, quality = pending.pop(future)
+                try:
+                    data = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    data = None  # 单个候选失败不影响其他候选
+                if not data:
+                    continue
+                evaluations += 1
+                result = {'data': data, 'params': candidate, 'size': len(data), 'quality': quality,
+                          'ssim': None, 'psnr': None, 'satisfied': is_satisfied(len(data), target_size, operator)}
+                if smallest is None or result['size'] < smallest['size']:
+                    smallest = result
+                if result['satisfied']:
+                    satisfied.append(result)
+                    if best is None or quality > best['quality']:
+                        best = result
+
+            if best is None:
+                continue
+            # 质量不高于当前最佳的候选不再需要；最佳已达到阈值时全部取消
+            stale = [future for future, (_, _, quality) in pending.items()
+                     if quality <= best['quality'] or best['quality'] >= PARALLEL_CONFIG["quality_threshold"]]
+            for future in stale:
+                number = pending.pop(future)[0]
+                if not future.cancel():
+                    shared.cancel(number)  # 已在运行的候选由工作进程检查标记后放弃
+    except (BrokenProcessPool, OSError):
+        # 进程池损坏（工作进程被杀死等）时重建，本次退回顺序求解
+        _reset_executor()
+        return None
+    finally:
+        shared.cancel()
+        shared.close()
+
+    if measure is not None and satisfied:
+        best = _select_measured(satisfied, measure) or best
+    result = best or smallest
+    if result is None:
+        return None
+    result['evaluations'] = evaluations
+    result['cancelled'] = len(candidates) - evaluations
+    return result
+
+def _select_measured(results, measure):
+    """按质量评分取前几个满足约束的候选实测质量，按实测质量选择"""
+    results = sorted(results, key=lambda r: r['quality'], reverse=True)[:SOLVER_CONFIG["measure_limit"]]
+    for result in results:
+        try:
+            result.update(measure(result['data'], result['params']))
+        except Exception:
+            pass  # 单个候选测量失败不影响其他候选
+    return select_best(results)
@@ -0,0 +1,160 @@
+"""
+大小-质量帕累托前沿探索
+
+在代理帧上评估 (分辨率缩放, 帧率, 调色板颜色数, 有损级别) 网格中每个点的预估大小和感知质量：
+- 大小：与参数面板相同的分层抽样试编码（estimate_size_from_proxy）
+- 质量：quality_metrics在代理帧上实测的SSIM（按参数编码、解码后与当时应显示的源画面比较）
+网格沿size_solver的降级路径取值（每个维度0为原参数，1为最低可接受参数）。
+各点按实际参数缓存（与基准参数无关）：细化网格时只评估当前前沿附近的新点，已评估的点直接复用。
+各点在线程池中并行评估（缩放和GIF编解码在C扩展中释放GIL）。
+"""
+
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from estimate_cache import normalize_params
+from quality_metrics import measure_proxy_quality
+from size_solver import ASCENT_ORDER, params_at
+from video_proxy import estimate_size_from_proxy
+
+# 探索配置
+PARETO_CONFIG = {
+    "levels": 3,  # 初始网格每个维度的取值数
+    "max_levels": 9,  # 细化后每个维度的取值数上限（3 → 5 → 9）
+    "scale_step": 0.1,  # 分辨率缩放比例按界面滑块的步长取整，应用后参数与评估的参数一致
+    "size_bursts": 3,  # 大小预估的抽样层数（少于参数面板，换取批量评估的速度）
+    "size_burst_frames": 4,
+    "max_workers": 4,
+    "cache_size": 20000  # 进程内缓存的评估点数
+}
+
+# 网格维度（与size_solver的降级维度一致）
+DIMENSIONS = ASCENT_ORDER
+
+_points = OrderedDict()
+_points_lock = threading.Lock()
+
+def grid_values(levels):
+    """每个维度的降级程度取值"""
+    return [round(i / (levels - 1), 6) for i in range(levels)]
+
+def snap_params(params, source_width, source_height):
+    """把分辨率取整到界面滑块可表示的缩放比例"""
+    step = PARETO_CONFIG["scale_step"]
+    scale = max(step, round(params['width'] / source_width / step) * step)
+    return dict(params, width=max(2, int(source_width * scale)), height=max(2, int(source_height * scale)))
+
+def point_key(content_hash, params):
+    return content_hash, json.dumps(normalize_params(params), sort_keys=True)
+
+def evaluate_point(proxy, content_hash, params, output_frames):
+    """评估一个参数点，返回 {'params', 'size', 'quality', 'psnr'}（quality为实测SSIM，进程内缓存）"""
+    key = point_key(content_hash, params)
+    with _points_lock:
+        cached = _points.get(key)
+        if cached is not None:
+            _points.move_to_end(key)
+            return dict(cached, params=params, cached=True)
+
+    estimate = estimate_size_from_proxy(proxy, params, output_frames, bursts=PARETO_CONFIG["size_bursts"],
+                                        burst_frames=PARETO_CONFIG["size_burst_frames"])
+    if not estimate:
+        return None
+    quality = measure_proxy_quality(proxy, params)
+    result = {'size': estimate['size'], 'quality': quality['ssim'], 'psnr': quality['psnr']}
+
+    with _points_lock:
+        _points[key] = result
+        while len(_points) > PARETO_CONFIG["cache_size"]:
+            _points.popitem(last=False)
+    return dict(result, params=params, cached=False)
+
+def pareto_frontier(points):
+    """大小更小或质量更高、不被其他点同时支配的点，按大小从小到大排列"""
+    frontier = []
+    best_quality = -1.0
+    for point in sorted(points, key=lambda p: (p['size'], -p['quality'])):
+        if point['quality'] > best_quality:
+            frontier.append(point)
+            best_quality = point['quality']
+    return frontier
+
+def _grid_points(levels, previous=None):
+    """网格中待评估的降级程度组合：首次为完整网格；细化时只取前沿点沿单个维度相邻一格的新组合"""
+    values = grid_values(levels)
+    if previous is None:
+        return list(itertools.product(values, repeat=len(DIMENSIONS)))
+
+    step = 1.0 / (levels - 1)
+    evaluated = {point['t'] for point in previous['points']}
+    nearby = set()
+    for point in previous['frontier']:
+        for axis, t in enumerate(point['t']):
+            for neighbor in (t - step, t + step):
+                if -1e-9 <= neighbor <= 1 + 1e-9:
+                    nearby.add(point['t'][:axis] + (round(neighbor, 6),) + point['t'][axis + 1:])
+    return sorted(nearby - evaluated)
+
+def explore(proxy, content_hash, base_params, output_frames, source_size, previous=None,
+            progress=None, cancelled=None):
+    """评估参数网格并求帕累托前沿
+
+    base_params 为当前参数（必须包含width和height），source_size 为原视频 (宽, 高)；
+    previous 为上一次的结果时在其基础上细化网格。progress(done, total) 在每个点完成后调用，
+    cancelled() 返回True时停止提交新点并返回已完成的部分。
+    返回 {'levels', 'points', 'frontier', 'evaluated', 'reused'}，每个点为
+    {'t', 'params', 'size', 'quality', 'cached'}。
+    """
+    if previous is None:
+        levels = PARETO_CONFIG["levels"]
+    else:
+        levels = min(PARETO_CONFIG["max_levels"], previous['levels'] * 2 - 1)
+    source_width, source_height = source_size
+
+    # 不同组合可能得到相同的参数（例如原参数已是最低帧率），同一参数只评估一次
+    tasks = {}
+    for t in _grid_points(levels, previous):
+        params = snap_params(params_at(base_params, dict(zip(DIMENSIONS, t))), source_width, source_height)
+        tasks.setdefault(point_key(content_hash, params), (t, params))
+
+    points = list(previous['points']) if previous else []
+    known = {point_key(content_hash, point['params']) for point in points}
+    pending = [task for key, task in tasks.items() if key not in known]
+
+    workers = max(1, min(PARETO_CONFIG["max_workers"], os.cpu_count() or 1))
+    evaluated = reused = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for t, params in pending:
+            if cancelled is not None and cancelled():
+                break
+            futures[executor.submit(evaluate_point, proxy, content_hash, params, output_frames)] = t
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except Exception:
+                result = None  # 单个点失败不影响其他点
+            if result is not None:
+                result['t'] = futures[future]
+                points.append(result)
+                if result['cached']:
+                    reused += 1
+                else:
+                    evaluated += 1
+            if progress is not None:
+                progress(done, len(futures))
+            if cancelled is not None and cancelled():
+                for other in futures:
+                    other.cancel()
+
+    return {
+        'levels': levels,
+        'points': points,
+        'frontier': pareto_frontier(points),
+        'evaluated': evaluated,
+        'reused': reused
+    }
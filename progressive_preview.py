@@ -0,0 +1,58 @@
+"""
+渐进式转换预览
+
+点击转换后先在代理帧上编码一个低分辨率、低帧率的预览GIF立即显示，完整质量的转换在后台进行，完成后替换预览：
+- 只使用内存或磁盘上已有的代理帧（上传时生成），不解码原视频，耗时与视频长度和分辨率无关
+- 预览覆盖与正式转换相同的时间范围（裁剪区间、帧数上限），宽高比与输出一致
+- 分辨率、帧率、帧数和调色板颜色数都有上限，编码走全局调色板的快速路径
+"""
+
+import time
+
+import numpy as np
+
+from gif_codec import encode_gif
+from video_proxy import resize_frames
+
+# 预览配置
+PREVIEW_CONFIG = {
+    "max_side": 240,  # 长边像素上限
+    "max_fps": 8,  # 帧率上限
+    "max_frames": 48,  # 帧数上限，时间范围较长时降低帧率以覆盖整个范围
+    "colors": 64  # 调色板颜色数
+}
+
+def preview_size(proxy, params):
+    """预览尺寸：与输出宽高比一致，不超过长边上限、代理帧和输出尺寸"""
+    width = params.get('width') or proxy.source_width
+    height = params.get('height') or proxy.source_height
+    ratio = min(1.0, PREVIEW_CONFIG["max_side"] / max(width, height), proxy.width / width, proxy.height / height)
+    return max(2, int(round(width * ratio))), max(2, int(round(height * ratio)))
+
+def build_preview(proxy, params, output_frames):
+    """按转换参数在代理帧上生成预览GIF
+
+    output_frames 为正式转换将输出的帧数（与其覆盖的时间范围一致）。
+    返回 {'data', 'width', 'height', 'fps', 'frames', 'elapsed'}。
+    """
+    started = time.perf_counter()
+    fps = max(1, min(30, params.get('fps', 10)))
+    start = max(0.0, params.get('start_time') or 0.0)
+    end = proxy.duration if params.get('end_time') is None else min(proxy.duration, params['end_time'])
+    span = max(1.0 / fps, min(end - start, output_frames / fps))
+
+    preview_fps = min(PREVIEW_CONFIG["max_fps"], fps, PREVIEW_CONFIG["max_frames"] / span)
+    count = max(1, min(PREVIEW_CONFIG["max_frames"], int(np.ceil(span * preview_fps - 1e-6))))
+    times = start + np.arange(count) / preview_fps
+
+    size = preview_size(proxy, params)
+    frames = resize_frames(proxy.frames[proxy.nearest_indices(times)], size)
+    data = encode_gif(frames, preview_fps, colors=PREVIEW_CONFIG["colors"])
+    return {
+        'data': data,
+        'width': size[0],
+        'height': size[1],
+        'fps': preview_fps,
+        'frames': count,
+        'elapsed': time.perf_counter() - started
+    }
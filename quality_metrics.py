@@ -0,0 +1,228 @@
+"""
+GIF质量测量
+
+比较源画面与GIF解码后的画面，给出SSIM和PSNR：
+- 比较在缩小到固定长边的亮度图上进行，所有采样帧堆叠为一个数组一次性计算（OpenCV按通道批量做高斯滤波）
+- 参考时刻沿时间轴均匀采样，每个时刻与当时正在显示的GIF帧比较，帧率降低造成的画面滞后同样计入
+- 候选只编码被采样的输出帧（有损级别大于0时连同前一输出帧，保留帧间替换的影响），单个候选在代理帧上
+  的测量耗时在100ms以内，可以对每个候选参数测量
+候选之间按实测质量选择：质量最高者优先，质量相差不超过阈值时取更小的文件。
+"""
+
+import io
+import math
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from gif_codec import encode_gif, encode_options, frame_duration_ms
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+# 质量测量配置
+QUALITY_CONFIG = {
+    "side": 128,  # 比较时的长边像素
+    "sample_frames": 5,  # 沿时间轴采样的参考帧数
+    "ssim_sigma": 1.5,  # SSIM高斯窗口的标准差
+    "equal_quality": 0.005  # SSIM相差不超过此值视为同等质量，取更小的文件
+}
+
+# SSIM常数（8位像素）
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+# cv2滤波一次处理的通道数上限
+_MAX_CHANNELS = 512
+
+def compare_size(width, height):
+    """比较尺寸：长边缩小到配置值，不放大"""
+    ratio = min(1.0, QUALITY_CONFIG["side"] / max(width, height))
+    return max(8, int(round(width * ratio))), max(8, int(round(height * ratio)))
+
+def to_luma(frames, size=None):
+    """RGB帧序列转换为float32亮度数组 [N, H, W]，指定size时先缩放"""
+    result = []
+    for frame in frames:
+        array = np.asarray(frame.convert('RGB') if isinstance(frame, Image.Image) else frame)
+        if size is not None and (array.shape[1], array.shape[0]) != tuple(size):
+            array = _resize(array, size)
+        array = array.astype(np.float32)
+        result.append(array[..., 0] * 0.299 + array[..., 1] * 0.587 + array[..., 2] * 0.114)
+    return np.stack(result)
+
+def _resize(array, size):
+    if OPENCV_AVAILABLE:
+        shrinking = size[0] < array.shape[1]
+        return cv2.resize(array, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+    return np.asarray(Image.fromarray(array).resize(size, Image.Resampling.BILINEAR))
+
+def _gaussian_kernel(sigma):
+    radius = int(math.ceil(3.5 * sigma))
+    x = np.arange(-radius, radius + 1, dtype=np.float32)
+    kernel = np.exp(-(x * x) / (2 * sigma * sigma))
+    return kernel / kernel.sum()
+
+def _blur(stack, sigma):
+    """对 [N, H, W] 的每一帧做高斯滤波（边界按反射处理）"""
+    if OPENCV_AVAILABLE:
+        # 帧放在通道维上，一次调用处理一批帧
+        planes = np.ascontiguousarray(stack.transpose(1, 2, 0))
+        blurred = [cv2.GaussianBlur(planes[..., i:i + _MAX_CHANNELS], (0, 0), sigma,
+                                    borderType=cv2.BORDER_REFLECT).reshape(planes.shape[:2] + (-1,))
+                   for i in range(0, planes.shape[2], _MAX_CHANNELS)]
+        return np.concatenate(blurred, axis=2).transpose(2, 0, 1)
+    kernel = _gaussian_kernel(sigma)
+    radius = len(kernel) // 2
+    for axis in (1, 2):
+        pad = [(0, 0)] * 3
+        pad[axis] = (radius, radius)
+        padded = np.pad(stack, pad, mode="symmetric")
+        length = stack.shape[axis]
+        stack = sum(weight * np.take(padded, np.arange(i, i + length), axis=axis)
+                    for i, weight in enumerate(kernel))
+    return stack
+
+def ssim(reference, candidate):
+    """两组亮度帧 [N, H, W] 的平均SSIM"""
+    sigma = QUALITY_CONFIG["ssim_sigma"]
+    x = reference.astype(np.float32, copy=False)
+    y = candidate.astype(np.float32, copy=False)
+    # 五个统计量一次滤波
+    moments = _blur(np.concatenate([x, y, x * x, y * y, x * y]), sigma)
+    mu_x, mu_y, xx, yy, xy = np.split(moments, 5)
+    mu_xx, mu_yy, mu_xy = mu_x * mu_x, mu_y * mu_y, mu_x * mu_y
+    numerator = (2 * mu_xy + _C1) * (2 * (xy - mu_xy) + _C2)
+    denominator = (mu_xx + mu_yy + _C1) * ((xx - mu_xx) + (yy - mu_yy) + _C2)
+    return float(np.mean(numerator / denominator))
+
+def psnr(reference, candidate):
+    """两组帧的PSNR（dB），完全相同时返回100"""
+    diff = reference.astype(np.float32) - candidate.astype(np.float32)
+    mse = float(np.mean(diff * diff))
+    if mse <= 1e-10:
+        return 100.0
+    return min(100.0, 10.0 * math.log10(255.0 ** 2 / mse))
+
+def compare(reference, candidate):
+    """返回 {'ssim', 'psnr'}"""
+    return {'ssim': ssim(reference, candidate), 'psnr': psnr(reference, candidate)}
+
+def decode_gif(data, positions, fps):
+    """解码GIF中第positions个输出帧正在显示的画面，返回 {序号: RGB数组}
+
+    GIF优化会把完全相同的相邻帧合并为一帧（时长相加），按累计显示时间对齐到原输出帧序号；
+    只转换被用到的帧（其余帧仍需顺序解码）。
+    """
+    # GIF以1/100秒为单位保存帧时长
+    duration = max(10, frame_duration_ms(fps) // 10 * 10)
+    pending = sorted(set(int(p) for p in positions))
+    found = {}
+    elapsed = 0
+    with Image.open(io.BytesIO(data)) as image:
+        for frame in ImageSequence.Iterator(image):
+            elapsed += frame.info.get('duration') or duration
+            covered = []
+            while pending and pending[0] * duration < elapsed:
+                covered.append(pending.pop(0))
+            if covered:
+                array = np.asarray(frame.convert("RGB"))
+                found.update((p, array) for p in covered)
+            if not pending:
+                break
+        if pending:
+            # 取整误差导致超出末尾的序号取最后一帧
+            array = np.asarray(frame.convert("RGB"))
+            found.update((p, array) for p in pending)
+    return found
+
+def measure_proxy_quality(proxy, params):
+    """参数在代理帧上的实测质量，返回 {'ssim', 'psnr'}
+
+    参考时刻为均匀分布在时间轴上的代理帧；每个时刻取按参数帧率正在显示的输出帧，
+    按参数的缩放比例和编码选项编码后解码，放大回比较尺寸与参考帧比较。
+    """
+    fps = max(1, min(30, params.get('fps', 10)))
+    start = max(0.0, params.get('start_time') or 0.0)
+    end = proxy.duration if params.get('end_time') is None else min(proxy.duration, params['end_time'])
+    end = max(end, start + 1.0 / fps)
+
+    inside = np.flatnonzero((proxy.timestamps >= start) & (proxy.timestamps < end))
+    if len(inside) == 0:
+        inside = proxy.nearest_indices([start])
+    samples = min(QUALITY_CONFIG["sample_frames"], len(inside))
+    references = inside[np.linspace(0, len(inside) - 1, samples).round().astype(int)]
+
+    # 每个参考时刻正在显示的输出帧及其前一帧的时刻
+    shown = np.floor((proxy.timestamps[references] - start) * fps + 1e-6)
+    shown_times = start + shown / fps
+    lossy = encode_options(params)['lossy']
+    if lossy:
+        times = np.stack([np.maximum(start, shown_times - 1.0 / fps), shown_times], axis=1).ravel()
+    else:
+        times = shown_times
+
+    size = compare_size(proxy.width, proxy.height)
+    scale = min(1.0, params['width'] / proxy.source_width, params['height'] / proxy.source_height)
+    encode_size = (max(2, int(round(size[0] * scale))), max(2, int(round(size[1] * scale))))
+    output = [_resize(proxy.frames[index], encode_size) for index in proxy.nearest_indices(times).tolist()]
+
+    step = 2 if lossy else 1
+    displayed = (np.arange(len(references)) * step + step - 1).tolist()
+    decoded = decode_gif(encode_gif(output, fps, **encode_options(params)), displayed, fps)
+
+    reference = to_luma(proxy.frames[references], size)
+    candidate = to_luma([decoded[position] for position in displayed], size)
+    return compare(reference, candidate)
+
+def measure_output_quality(frames, source_params, data, params):
+    """转换结果的实测质量，返回 {'ssim', 'psnr'}
+
+    frames 为正式转换按source_params读取的原始帧，data 为按params编码的GIF
+    （抽帧方式与parallel_encode.encode_from_frames一致）。
+    """
+    source_fps = max(1, min(30, source_params.get('fps', 10)))
+    fps = max(1, min(source_fps, params.get('fps', source_fps)))
+    count = max(1, int(round(len(frames) * fps / source_fps)))
+    positions = np.minimum((np.arange(count) * source_fps / fps).round().astype(int), len(frames) - 1)
+
+    samples = min(QUALITY_CONFIG["sample_frames"], len(frames))
+    references = np.linspace(0, len(frames) - 1, samples).round().astype(int)
+    shown = np.maximum(np.searchsorted(positions, references, side="right") - 1, 0)
+
+    decoded = decode_gif(data, shown.tolist(), fps)
+
+    first = np.asarray(frames[0])
+    size = compare_size(first.shape[1], first.shape[0])
+    # 与代理帧上的测量一致：分辨率损失按相对原始帧的缩放比例在比较尺寸上体现
+    scale = min(1.0, params['width'] / first.shape[1], params['height'] / first.shape[0])
+    reduced = (max(2, int(round(size[0] * scale))), max(2, int(round(size[1] * scale))))
+    reference = to_luma([frames[index] for index in references.tolist()], size)
+    candidate = to_luma([_resize(decoded[position], reduced) for position in shown.tolist()], size)
+    return compare(reference, candidate)
+
+def select_best(candidates):
+    """按实测质量选择候选（每个候选为包含'size'和'ssim'的字典）
+
+    SSIM最高者优先；与最高值相差不超过equal_quality的候选视为同等质量，取其中最小的文件。
+    """
+    measured = [c for c in candidates if c.get('ssim') is not None]
+    if not measured:
+        return None
+    top = max(c['ssim'] for c in measured)
+    equal = [c for c in measured if c['ssim'] >= top - QUALITY_CONFIG["equal_quality"]]
+    return min(equal, key=lambda c: (c['size'], -c['ssim']))
+
+def is_dominated(candidate, candidates):
+    """是否存在文件不更大、SSIM高出equal_quality以上的其他候选（未测量的候选不参与比较）"""
+    if candidate.get('ssim') is None:
+        return False
+    return any(
+        other is not candidate and other.get('ssim') is not None and other['size'] <= candidate['size']
+        and other['ssim'] > candidate['ssim'] + QUALITY_CONFIG["equal_quality"]
+        for other in candidates
+    )
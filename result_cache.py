@@ -0,0 +1,187 @@
+"""
+转换结果缓存
+
+完成的GIF按 (视频内容哈希, 规范化参数, 大小约束, 解码后端, 编码器版本) 保存到本地磁盘，
+同一设置重复转换、或不同用户转换同一视频时直接返回缓存的文件，不再解码和编码。
+索引保存在SQLite中，缓存总字节数超过配额时按最近使用时间淘汰（LRU）。
+同时记录命中、未命中次数和命中节省的字节数，作为缓存效果指标。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from estimate_cache import normalize_params
+from ffmpeg_decoder import use_ffmpeg
+from gif_codec import ENCODER_VERSION
+
+# 缓存配置
+RESULT_CACHE_CONFIG = {
+    "dir": Path(__file__).with_name("data") / "gif_results",
+    "quota_bytes": 1024 * 1024 * 1024,  # 缓存文件总大小上限（1GB）
+    "max_item_bytes": 100 * 1024 * 1024  # 超过此大小的结果不缓存
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    cache_key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+def normalize_constraint(size_constraint):
+    """影响转换结果的大小约束（未启用时为None）"""
+    if not size_constraint or not size_constraint.get('enabled'):
+        return None
+    return {'operator': size_constraint.get('operator'), 'target_size': int(size_constraint.get('target_size', 0))}
+
+def result_cache_key(content_hash, params, size_constraint=None):
+    # 两个解码后端取到的帧可能相差一个源帧，结果按实际使用的后端分开缓存
+    description = json.dumps({
+        'params': normalize_params(params),
+        'constraint': normalize_constraint(size_constraint),
+        'decoder': 'ffmpeg' if use_ffmpeg() else 'opencv',
+        'encoder': ENCODER_VERSION
+    }, sort_keys=True)
+    digest = hashlib.sha256(f"{content_hash}:{description}".encode("utf-8")).hexdigest()
+    return digest, description
+
+class ResultCache:
+    """完成的GIF文件缓存"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir or RESULT_CACHE_CONFIG["dir"])
+        self.db_path = self.cache_dir / "index.db"
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交，最后总是关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _count(conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO metrics (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount)
+        )
+
+    def get(self, content_hash, params, size_constraint=None):
+        """返回缓存的GIF数据，未命中时返回None"""
+        key, _ = result_cache_key(content_hash, params, size_constraint)
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT file_name FROM results WHERE cache_key = ?", (key,)).fetchone()
+            data = None
+            if row is not None:
+                try:
+                    data = (self.cache_dir / row[0]).read_bytes()
+                except OSError:
+                    # 文件已被外部删除，清理索引
+                    conn.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            if data is None:
+                self._count(conn, "misses")
+                return None
+            conn.execute(
+                "UPDATE results SET last_used = ?, hits = hits + 1 WHERE cache_key = ?", (time.time(), key)
+            )
+            self._count(conn, "hits")
+            self._count(conn, "bytes_saved", len(data))
+        return data
+
+    def put(self, content_hash, params, data, size_constraint=None):
+        """保存转换结果，超出配额时淘汰最久未使用的结果"""
+        if not data or len(data) > RESULT_CACHE_CONFIG["max_item_bytes"]:
+            return
+        key, description = result_cache_key(content_hash, params, size_constraint)
+        file_name = f"{key}.gif"
+        path = self.cache_dir / file_name
+        # 临时文件名唯一：批量转换和命令行的多个工作进程可能同时写入同一结果
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        with self._lock:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (cache_key, content_hash, params, file_name, bytes,"
+                    " created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, ?, ?,"
+                    " COALESCE((SELECT hits FROM results WHERE cache_key = ?), 0))",
+                    (key, content_hash, description, file_name, len(data), now, now, key)
+                )
+                self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+        quota = RESULT_CACHE_CONFIG["quota_bytes"]
+        if total <= quota:
+            return
+        for key, file_name, size in conn.execute(
+            "SELECT cache_key, file_name, bytes FROM results ORDER BY last_used"
+        ).fetchall():
+            if total <= quota:
+                break
+            try:
+                (self.cache_dir / file_name).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            conn.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            total -= size
+            self._count(conn, "evictions")
+
+    def metrics(self):
+        """返回 {'entries', 'bytes', 'hits', 'misses', 'hit_rate', 'bytes_saved', 'evictions'}"""
+        with self._lock, self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM metrics").fetchall())
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            'entries': entries,
+            'bytes': total,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+            'bytes_saved': counters.get("bytes_saved", 0),
+            'evictions': counters.get("evictions", 0)
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """进程内共享的结果缓存，无法创建时返回None"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResultCache()
+            except (OSError, sqlite3.Error):
+                return None
+        return _cache
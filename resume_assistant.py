@@ -1,6 +1,5 @@
 import streamlit as st
 import os
-from pathlib import Path
 from openai import OpenAI
 import pandas as pd
 import json
@@ -8,6 +7,8 @@ from datetime import datetime
 import requests
 import re
 import time
+from temp_store import get_temp_store, session_id_from_state
+from session_budget import artifacts_from_state
 
 # 页面配置（必须是第一个Streamlit命令）
 st.set_page_config(
@@ -469,8 +470,6 @@ def init_agent_state():
         st.session_state.resume_agent_data = {
             "jd_text": "",
             "weights": "",
-            "analysis_result": None,
-            "parsed_data": None,
             "debug_mode": False
         }
 
@@ -479,8 +478,6 @@ def save_agent_state():
     st.session_state.resume_agent_data = {
         "jd_text": st.session_state.get("jd_text_input", ""),
         "weights": st.session_state.get("weights_input", ""),
-        "analysis_result": st.session_state.get("analysis_result", None),
-        "parsed_data": st.session_state.get("parsed_data", None),
         "debug_mode": st.session_state.get("debug_mode", False)
     }
 
@@ -492,13 +489,13 @@ def load_agent_state():
             st.session_state.jd_text_input = data["jd_text"]
         if "weights_input" not in st.session_state:
             st.session_state.weights_input = data["weights"]
-        if "analysis_result" not in st.session_state:
-            st.session_state.analysis_result = data["analysis_result"]
-        if "parsed_data" not in st.session_state:
-            st.session_state.parsed_data = data["parsed_data"]
         if "debug_mode" not in st.session_state:
             st.session_state.debug_mode = data["debug_mode"]
 
+def session_artifacts():
+    """当前会话的条目容器（分析结果等大对象受会话内存预算管理，超出时溢出到磁盘）"""
+    return artifacts_from_state(st.session_state, session_id_from_state(st.session_state))
+
 def reset_agent():
     """重置智能体"""
     # 清除所有相关状态
@@ -506,8 +503,6 @@ def reset_agent():
         "resume_agent_data",
         "jd_text_input", 
         "weights_input",
-        "analysis_result",
-        "parsed_data",
         "debug_mode"
     ]
     
@@ -515,13 +510,14 @@ def reset_agent():
         if key in st.session_state:
             del st.session_state[key]
     
-    # 清理临时文件
+    # 分析结果保存在会话条目中
+    artifacts = session_artifacts()
+    artifacts.discard("analysis_result")
+    artifacts.discard("parsed_data")
+    
+    # 释放当前会话的临时文件引用（其他会话的文件不受影响）
     try:
-        temp_dir = Path("temp_uploads")
-        if temp_dir.exists():
-            for file_path in temp_dir.glob("*"):
-                if file_path.is_file():
-                    file_path.unlink()
+        get_temp_store().release(session_id_from_state(st.session_state))
     except Exception as e:
         st.warning(f"清理临时文件失败: {e}")
     
@@ -667,10 +663,9 @@ def main():
         resumes_text = ""
         if uploaded_resumes:
             for resume_file in uploaded_resumes:
-                temp_path = Path("temp_uploads") / resume_file.name
-                temp_path.parent.mkdir(exist_ok=True)
-                with open(temp_path, "wb") as f:
-                    f.write(resume_file.getbuffer())
+                temp_path = get_temp_store().put_bytes(
+                    session_id_from_state(st.session_state), resume_file.getbuffer(), resume_file.name
+                )
                 resumes_text += f"\n--- {resume_file.name} ---\n"
                 extracted_content = extract_text_from_file(temp_path)
                 
@@ -689,10 +684,9 @@ def main():
         
         # 获取岗位描述
         if uploaded_jd:
-            temp_path = Path("temp_uploads") / uploaded_jd.name
-            temp_path.parent.mkdir(exist_ok=True)
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_jd.getbuffer())
+            temp_path = get_temp_store().put_bytes(
+                session_id_from_state(st.session_state), uploaded_jd.getbuffer(), uploaded_jd.name
+            )
             extracted_jd = extract_text_from_file(temp_path)
             
             # 验证提取的岗位描述是否有效
@@ -728,7 +722,7 @@ def main():
                 
                 if result:
                     # 保存分析结果到状态
-                    st.session_state.analysis_result = result
+                    session_artifacts().put("analysis_result", result, spill=True)
                     
                     st.markdown("### 📊 分析结果")
                     st.markdown('<div class="result-table">', unsafe_allow_html=True)
@@ -753,7 +747,7 @@ def main():
                     df = parse_table_from_response(result)
                     if df is not None and not df.empty:
                         # 保存解析数据到状态
-                        st.session_state.parsed_data = df
+                        session_artifacts().put("parsed_data", df, spill=True)
                         
                         st.markdown("### 📋 结构化数据")
                         st.dataframe(df, use_container_width=True)
@@ -805,10 +799,11 @@ def main():
                             st.code(result)
     
     # 显示之前保存的结果（仅在未点击分析按钮时显示）
-    if st.session_state.get("analysis_result") and not analyze_clicked:
+    analysis_result = session_artifacts().get("analysis_result")
+    if analysis_result and not analyze_clicked:
         st.markdown("### 📊 分析结果")
         st.markdown('<div class="result-table">', unsafe_allow_html=True)
-        st.markdown(st.session_state.analysis_result)
+        st.markdown(analysis_result)
         st.markdown('</div>', unsafe_allow_html=True)
         
         # 添加复制按钮
@@ -817,10 +812,10 @@ def main():
             if st.button("📋 复制", key="copy_result_2"):
                 st.write("✅ 已复制到剪贴板")
         with col_copy2:
-            st.markdown(f"<script>navigator.clipboard.writeText(`{st.session_state.analysis_result}`)</script>", unsafe_allow_html=True)
+            st.markdown(f"<script>navigator.clipboard.writeText(`{analysis_result}`)</script>", unsafe_allow_html=True)
         
-        if st.session_state.get("parsed_data") is not None:
-            df = st.session_state.parsed_data
+        df = session_artifacts().get("parsed_data")
+        if df is not None:
             st.markdown("### 📋 结构化数据")
             st.dataframe(df, use_container_width=True)
             
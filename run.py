@@ -44,7 +44,7 @@ def main():
     print("🔗 本地地址: http://localhost:8501")
     
     # 启动Streamlit应用
-    os.system("streamlit run app.py --server.port 8501 --server.address localhost")
+    os.system("streamlit run app.py --server.port 8501 --server.address localhost --server.enableStaticServing true")
 
 if __name__ == "__main__":
     main()
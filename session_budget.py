@@ -0,0 +1,268 @@
+"""
+会话内存预算
+
+页面在会话状态中保存的大对象（预估缓存、AI建议缓存、分析结果表格等）登记为会话条目，
+由进程内共享的预算管理器统计近似字节数：
+- 单个会话或全部会话的常驻字节数超过上限时，按最近使用时间（LRU）回收条目
+- 可重新计算的缓存直接丢弃；用户数据（spill=True）序列化到磁盘，下次读取时再载入
+- 会话结束（会话状态被回收）后其条目和磁盘文件随之释放
+内存增长由配置决定，而不是由活跃用户数量决定。
+"""
+
+import itertools
+import os
+import pickle
+import shutil
+import sys
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+# 预算配置
+SESSION_BUDGET_CONFIG = {
+    "session_bytes": 64 * 1024 * 1024,  # 单个会话常驻字节数上限
+    "global_bytes": 1024 * 1024 * 1024,  # 全部会话常驻字节数上限
+    "spill_dir": Path(__file__).with_name("temp_uploads") / "spill"  # 溢出到磁盘的条目存放目录
+}
+
+# 会话条目容器在session_state中的键名
+ARTIFACTS_KEY = "session_artifacts"
+
+_MISSING = object()
+
+def approx_size(obj, _seen=None):
+    """对象的近似内存字节数（容器递归统计，共享的对象只计一次）"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, str):
+        return sys.getsizeof(obj)
+    if hasattr(obj, "memory_usage") and callable(obj.memory_usage):
+        # pandas DataFrame/Series
+        try:
+            usage = obj.memory_usage(deep=True)
+            return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        except Exception:
+            pass
+    if hasattr(obj, "nbytes"):
+        # numpy数组
+        try:
+            return int(obj.nbytes)
+        except Exception:
+            pass
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            approx_size(k, _seen) + approx_size(v, _seen) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(approx_size(item, _seen) for item in obj)
+    return sys.getsizeof(obj)
+
+class SessionArtifacts:
+    """一个会话的条目容器，保存在该会话的session_state中"""
+
+    def __init__(self, budget, session_id):
+        self.budget = budget
+        self.session_id = session_id
+        self.spill_dir = Path(budget.spill_dir) / f"{session_id}-{uuid.uuid4().hex[:8]}"
+        # name -> {'value', 'bytes', 'last_used', 'spill', 'path'}
+        self._items = OrderedDict()
+        weakref.finalize(self, shutil.rmtree, str(self.spill_dir), True)
+
+    def get(self, name, default=None):
+        """读取条目（已溢出的从磁盘载入），不存在或已被回收时返回default"""
+        with self.budget.lock:
+            item = self._items.get(name)
+            if item is None:
+                return default
+            if item['path'] is not None:
+                try:
+                    with open(item['path'], "rb") as f:
+                        item['value'] = pickle.load(f)
+                except (OSError, pickle.PickleError, EOFError):
+                    self._drop(name)
+                    return default
+                self._remove_spill_file(item)
+            # 调用方可能原地修改过条目，读取时重新统计大小
+            item['bytes'] = approx_size(item['value'])
+            item['last_used'] = self.budget.tick()
+            self.budget.enforce(self, name)
+            return item['value']
+
+    def put(self, name, value, spill=False):
+        """保存条目；spill=True 表示超出预算时溢出到磁盘而不是丢弃"""
+        with self.budget.lock:
+            old = self._items.pop(name, None)
+            if old is not None:
+                self._remove_spill_file(old)
+            self._items[name] = {
+                'value': value,
+                'bytes': approx_size(value),
+                'last_used': self.budget.tick(),
+                'spill': spill,
+                'path': None
+            }
+            self.budget.enforce(self, name)
+        return value
+
+    def setdefault(self, name, default, spill=False):
+        """读取条目，不存在时保存并返回default"""
+        with self.budget.lock:
+            value = self.get(name, _MISSING)
+            if value is _MISSING:
+                value = self.put(name, default, spill)
+            return value
+
+    def discard(self, name):
+        with self.budget.lock:
+            self._drop(name)
+
+    def clear(self):
+        with self.budget.lock:
+            for name in list(self._items):
+                self._drop(name)
+
+    def _drop(self, name):
+        item = self._items.pop(name, None)
+        if item is not None:
+            self._remove_spill_file(item)
+
+    @staticmethod
+    def _remove_spill_file(item):
+        if item['path'] is not None:
+            try:
+                os.remove(item['path'])
+            except OSError:
+                pass
+            item['path'] = None
+
+    def resident_items(self):
+        """常驻内存的条目 [(last_used, name, item)]"""
+        return [(item['last_used'], name, item) for name, item in self._items.items() if item['path'] is None]
+
+    def reclaim(self, name):
+        """回收一个常驻条目：允许溢出的写入磁盘，否则丢弃。返回释放的字节数"""
+        item = self._items.get(name)
+        if item is None or item['path'] is not None:
+            return 0
+        freed = item['bytes']
+        if item['spill']:
+            path = self.spill_dir / f"{uuid.uuid4().hex}.pkl"
+            try:
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(item['value'], f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+                item['path'] = str(path)
+                item['value'] = None
+                self.budget.count("spills")
+                return freed
+            except (OSError, pickle.PickleError, TypeError, AttributeError):
+                pass  # 无法序列化时退回丢弃
+        self._items.pop(name, None)
+        self.budget.count("evictions")
+        return freed
+
+    def usage(self):
+        """返回 {'resident_bytes', 'spilled_items', 'items'}"""
+        with self.budget.lock:
+            return {
+                'resident_bytes': sum(item['bytes'] for _, _, item in self.resident_items()),
+                'spilled_items': sum(1 for item in self._items.values() if item['path'] is not None),
+                'items': {name: {'bytes': item['bytes'], 'spilled': item['path'] is not None}
+                          for name, item in self._items.items()}
+            }
+
+class SessionBudget:
+    """进程内全部会话条目的预算管理"""
+
+    def __init__(self, session_bytes=None, global_bytes=None, spill_dir=None):
+        self.session_bytes = session_bytes or SESSION_BUDGET_CONFIG["session_bytes"]
+        self.global_bytes = global_bytes or SESSION_BUDGET_CONFIG["global_bytes"]
+        self.spill_dir = Path(spill_dir or SESSION_BUDGET_CONFIG["spill_dir"])
+        self.lock = threading.RLock()
+        self._clock = itertools.count()
+        # 容器保存在各会话的session_state中，这里只持有弱引用，会话结束后自动移除
+        self._sessions = weakref.WeakSet()
+        self._counters = {"spills": 0, "evictions": 0}
+
+    def tick(self):
+        return next(self._clock)
+
+    def count(self, name):
+        self._counters[name] += 1
+
+    def artifacts(self, session_id):
+        """为会话创建条目容器"""
+        artifacts = SessionArtifacts(self, session_id)
+        with self.lock:
+            self._sessions.add(artifacts)
+        return artifacts
+
+    def enforce(self, artifacts, protected=None):
+        """回收最久未使用的条目，直到会话和全局常驻字节数都不超过上限（刚访问的条目除外）"""
+        with self.lock:
+            self._reclaim([artifacts], self.session_bytes, (artifacts, protected))
+            self._reclaim(list(self._sessions), self.global_bytes, (artifacts, protected))
+
+    def _reclaim(self, sessions, limit, protected):
+        candidates = []
+        used = 0
+        for owner in sessions:
+            for last_used, name, item in owner.resident_items():
+                used += item['bytes']
+                if (owner, name) != protected:
+                    candidates.append((last_used, name, owner))
+        if used <= limit:
+            return
+        for _, name, owner in sorted(candidates, key=lambda c: c[0]):
+            used -= owner.reclaim(name)
+            if used <= limit:
+                return
+
+    def usage(self):
+        """返回 {'sessions': {session_id: {...}}, 'resident_bytes', 'session_bytes', 'global_bytes',
+        'spills', 'evictions'}，供监控使用"""
+        with self.lock:
+            sessions = {}
+            for owner in list(self._sessions):
+                usage = owner.usage()
+                merged = sessions.setdefault(owner.session_id, {'resident_bytes': 0, 'spilled_items': 0, 'items': {}})
+                merged['resident_bytes'] += usage['resident_bytes']
+                merged['spilled_items'] += usage['spilled_items']
+                merged['items'].update(usage['items'])
+            return {
+                'sessions': sessions,
+                'resident_bytes': sum(s['resident_bytes'] for s in sessions.values()),
+                'session_bytes': self.session_bytes,
+                'global_bytes': self.global_bytes,
+                'spills': self._counters["spills"],
+                'evictions': self._counters["evictions"]
+            }
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_session_budget():
+    """进程内共享的预算管理器"""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = SessionBudget()
+        return _budget
+
+def artifacts_from_state(state, session_id):
+    """从会话状态（如st.session_state）中获取或创建该会话的条目容器"""
+    artifacts = state.get(ARTIFACTS_KEY)
+    if artifacts is None:
+        artifacts = get_session_budget().artifacts(session_id)
+        state[ARTIFACTS_KEY] = artifacts
+    return artifacts
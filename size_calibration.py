@@ -0,0 +1,217 @@
+"""
+GIF大小预测的在线校准
+
+每次正式转换都得到一组(内容特征, 参数, 预测大小, 实际大小)，记录到本地SQLite。
+按内容类别（细节 × 运动）统计对数残差，对模型预测做偏差校正：
+类别样本少时向全局偏差收缩，全局样本少时向0收缩。
+同时记录每次转换前给出的（校正后）预测误差，作为预估器的滚动误差；
+某类别近期误差足够低时，界面确认预估可以直接采用校正后的预测，不再试编码。
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from gif_size_model import predict_gif_size
+
+# 校准配置
+CALIBRATION_CONFIG = {
+    "db_path": Path(__file__).with_name("data") / "size_calibration.db",
+    "window": 200,  # 统计偏差和误差使用的最近记录数（每个类别）
+    "prior_weight": 5,  # 收缩强度：相当于多少条先验样本
+    "min_samples": 5,  # 类别至少有这么多记录才可能被信任
+    "trusted_error": 0.12  # 类别近期平均相对误差低于此值时不再试编码确认
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    content_hash TEXT,
+    content_class TEXT NOT NULL,
+    features TEXT NOT NULL,
+    params TEXT NOT NULL,
+    output_frames INTEGER NOT NULL,
+    predicted INTEGER NOT NULL,
+    corrected INTEGER NOT NULL,
+    actual INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversions_class ON conversions (content_class, id);
+"""
+
+def content_class(content):
+    """按空间细节和帧间变化把视频分为6类"""
+    detail = "detailed" if content['detail'] > 0.08 else "flat"
+    if content['changed'] < 0.05:
+        motion = "static"
+    elif content['changed'] < 0.5:
+        motion = "partial"
+    else:
+        motion = "full"
+    return f"{detail}/{motion}"
+
+class CalibrationStore:
+    """转换结果记录与偏差校正"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or CALIBRATION_CONFIG["db_path"])
+        self._lock = threading.Lock()
+        self._bias_cache = {}
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """打开连接，正常退出时提交，最后总是关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, content, params, output_frames, predicted, corrected, actual, content_hash=None):
+        """记录一次转换结果"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversions (created_at, content_hash, content_class, features, params,"
+                " output_frames, predicted, corrected, actual) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), content_hash, content_class(content), json.dumps(content),
+                 json.dumps({k: params.get(k) for k in sorted(params)}), int(output_frames),
+                 int(predicted), int(corrected), int(actual))
+            )
+            self._bias_cache.clear()
+
+    def _recent(self, conn, cls=None):
+        window = CALIBRATION_CONFIG["window"]
+        if cls is None:
+            rows = conn.execute(
+                "SELECT predicted, corrected, actual FROM conversions ORDER BY id DESC LIMIT ?", (window,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT predicted, corrected, actual FROM conversions WHERE content_class = ?"
+                " ORDER BY id DESC LIMIT ?", (cls, window)
+            ).fetchall()
+        return [row for row in rows if row[0] > 0 and row[1] > 0 and row[2] > 0]
+
+    def bias(self, cls):
+        """类别的对数偏差校正，返回 {'bias', 'spread', 'samples', 'error'}"""
+        with self._lock:
+            cached = self._bias_cache.get(cls)
+            if cached is not None:
+                return cached
+            with self._connect() as conn:
+                global_rows = self._recent(conn)
+                class_rows = self._recent(conn, cls)
+
+            prior = CALIBRATION_CONFIG["prior_weight"]
+            global_residuals = [math.log(actual / predicted) for predicted, _, actual in global_rows]
+            global_bias = sum(global_residuals) / (len(global_residuals) + prior)
+
+            residuals = [math.log(actual / predicted) for predicted, _, actual in class_rows]
+            class_bias = (sum(residuals) + prior * global_bias) / (len(residuals) + prior)
+            spread = None
+            if len(residuals) >= 2:
+                spread = math.sqrt(sum((r - class_bias) ** 2 for r in residuals) / (len(residuals) - 1))
+            error = None
+            if class_rows:
+                error = sum(abs(corrected / actual - 1) for _, corrected, actual in class_rows) / len(class_rows)
+
+            result = {'bias': class_bias, 'spread': spread, 'samples': len(residuals), 'error': error}
+            self._bias_cache[cls] = result
+            return result
+
+    def running_error(self):
+        """预估器的滚动误差：每次转换前给出的预测与实际大小的平均相对误差（校正前后）"""
+        with self._lock, self._connect() as conn:
+            rows = self._recent(conn)
+            classes = conn.execute("SELECT DISTINCT content_class FROM conversions").fetchall()
+            by_class = {}
+            for (cls,) in classes:
+                class_rows = self._recent(conn, cls)
+                if class_rows:
+                    by_class[cls] = {
+                        'samples': len(class_rows),
+                        'error': sum(abs(c / a - 1) for _, c, a in class_rows) / len(class_rows)
+                    }
+        if not rows:
+            return {'samples': 0, 'raw_error': None, 'corrected_error': None, 'by_class': {}}
+        return {
+            'samples': len(rows),
+            'raw_error': sum(abs(p / a - 1) for p, _, a in rows) / len(rows),
+            'corrected_error': sum(abs(c / a - 1) for _, c, a in rows) / len(rows),
+            'by_class': by_class
+        }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_calibration_store():
+    """进程内共享的校准记录库，无法创建时返回None"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = CalibrationStore()
+            except (OSError, sqlite3.Error):
+                return None
+        return _store
+
+def calibrated_prediction(content, params, output_frames, option_factor=1.0):
+    """经偏差校正的模型预测
+
+    option_factor 为调色板/有损选项相对默认编码的大小比（见gif_size_model.get_encode_option_factor）。
+    返回 {'size', 'low', 'high', 'raw', 'trusted', 'content_class'}，模型不可用时返回None。
+    trusted 表示该类别近期误差已足够低，可以不试编码直接采用。
+    """
+    prediction = predict_gif_size(content, params, output_frames)
+    if prediction is None:
+        return None
+    if option_factor != 1.0:
+        prediction = {key: int(value * option_factor) for key, value in prediction.items()}
+    cls = content_class(content)
+    store = get_calibration_store()
+    correction = store.bias(cls) if store is not None else None
+    if not correction:
+        return dict(prediction, raw=prediction['size'], trusted=False, content_class=cls)
+
+    corrected = prediction['size'] * math.exp(correction['bias'])
+    spread = correction['spread']
+    if spread is None:
+        low, high = prediction['low'] * math.exp(correction['bias']), prediction['high'] * math.exp(correction['bias'])
+    else:
+        low, high = corrected * math.exp(-1.96 * spread), corrected * math.exp(1.96 * spread)
+    trusted = (
+        correction['samples'] >= CALIBRATION_CONFIG["min_samples"]
+        and correction['error'] is not None
+        and correction['error'] <= CALIBRATION_CONFIG["trusted_error"]
+    )
+    return {
+        'size': int(corrected),
+        'low': int(low),
+        'high': int(high),
+        'raw': prediction['size'],
+        'trusted': trusted,
+        'content_class': cls
+    }
+
+def record_conversion(content, params, output_frames, prediction, actual_size, content_hash=None):
+    """记录一次正式转换的实际大小（记录失败不影响转换）
+
+    prediction 为转换开始前 calibrated_prediction 的结果，即用户看到的预测；
+    转换期间其他会话更新了偏差也按这一预测记录误差。
+    """
+    store = get_calibration_store()
+    if store is None or not content or not prediction or actual_size <= 0:
+        return
+    try:
+        store.record(content, params, output_frames, prediction['raw'], prediction['size'],
+                     actual_size, content_hash)
+    except (OSError, sqlite3.Error):
+        pass
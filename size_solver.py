@@ -0,0 +1,272 @@
+"""
+目标大小参数求解
+
+把分辨率、帧率、调色板颜色数和有损级别组合成一条从原参数(t=0)到最低可接受参数(t=1)的
+降级路径，各维度按几何插值同时降低，GIF大小随t单调（近似）下降：
+1. 在t上二分，找到满足约束的最小降级程度
+2. 以该点为起点做坐标上升：逐个维度尝试恢复到更接近原参数的取值，仍满足约束则保留
+所有评估经过缓存，总评估次数不超过预算；结果报告评估次数和相对目标大小的余量。
+提供实测质量函数时，满足约束的已评估参数中按评分取前几个实测画质，按实测质量（同等质量取更小的文件）选择。
+"""
+
+import math
+
+from gif_codec import DEFAULT_COLORS, DEFAULT_LOSSY
+from quality_metrics import select_best
+
+# 求解配置
+SOLVER_CONFIG = {
+    "budget": 12,  # 最多评估次数（不含缓存命中）
+    "encode_budget": 6,  # 用真实编码评估时的预算（转换后超出约束的重新优化）
+    "bisect_steps": 6,  # 二分步数上限
+    "min_scale": 0.25,  # 分辨率最低缩放比例
+    "min_width": 80,
+    "min_height": 60,
+    "min_fps": 4,
+    "min_colors": 32,
+    "max_lossy": 60,
+    "equal_tolerance": 0.1,  # "="约束允许的相对误差
+    "measure_limit": 4  # 最多实测质量的满足约束的参数数
+}
+
+# 坐标上升时恢复各维度的顺序（对观感影响从大到小）
+ASCENT_ORDER = ["scale", "fps", "colors", "lossy"]
+
+# 质量评分中各维度的权重
+QUALITY_WEIGHTS = {"scale": 0.4, "fps": 0.3, "colors": 0.2, "lossy": 0.1}
+
+def is_satisfied(size, target_size, operator):
+    """预估大小是否满足约束"""
+    if operator == '<':
+        return size < target_size
+    if operator == '<=':
+        return size <= target_size
+    if operator == '>':
+        return size > target_size
+    if operator == '>=':
+        return size >= target_size
+    if operator == '=':
+        return abs(size - target_size) / target_size <= SOLVER_CONFIG["equal_tolerance"]
+    return False
+
+def _limits(base):
+    """各维度的原值和最低值"""
+    width, height = base['width'], base['height']
+    min_scale = min(1.0, max(
+        SOLVER_CONFIG["min_scale"],
+        SOLVER_CONFIG["min_width"] / max(1, width),
+        SOLVER_CONFIG["min_height"] / max(1, height)
+    ))
+    fps = base.get('fps', 10)
+    colors = int(base.get('colors') or DEFAULT_COLORS)
+    lossy = int(base.get('lossy') or DEFAULT_LOSSY)
+    return {
+        "scale": (1.0, min_scale),
+        "fps": (fps, min(fps, SOLVER_CONFIG["min_fps"])),
+        "colors": (colors, min(colors, SOLVER_CONFIG["min_colors"])),
+        "lossy": (lossy, max(lossy, SOLVER_CONFIG["max_lossy"]))
+    }
+
+def _interpolate(name, start, end, t):
+    """维度在降级程度t处的取值：分辨率、帧率、颜色数按几何插值，有损级别按线性插值"""
+    if name == "lossy":
+        return start + (end - start) * t
+    return start * (end / start) ** t
+
+def _levels_at(limits, t):
+    return {name: _interpolate(name, start, end, t) for name, (start, end) in limits.items()}
+
+def params_for_levels(base, levels):
+    """把各维度的取值转换为转换参数"""
+    params = dict(base)
+    params['width'] = max(2, int(round(base['width'] * levels["scale"])))
+    params['height'] = max(2, int(round(base['height'] * levels["scale"])))
+    params['fps'] = max(1, int(round(levels["fps"])))
+    params['colors'] = max(2, min(DEFAULT_COLORS, int(round(levels["colors"]))))
+    params['lossy'] = max(0, min(100, int(round(levels["lossy"]))))
+    return params
+
+def params_at(base, degradation):
+    """各维度按各自的降级程度取参数，degradation 为 {维度: t}（0为原参数，1为最低，缺省为0）"""
+    limits = _limits(base)
+    levels = {name: _interpolate(name, start, end, degradation.get(name, 0.0))
+              for name, (start, end) in limits.items()}
+    return params_for_levels(base, levels)
+
+def path_candidates(base, count):
+    """沿降级路径取count个候选参数（不含原参数，去重），按质量从高到低排列
+
+    候选按降级程度的平方分布，靠近原参数处更密：轻微超出目标时不必大幅降级。
+    """
+    limits = _limits(base)
+    candidates = []
+    seen = set()
+    for step in range(1, count + 1):
+        params = params_for_levels(base, _levels_at(limits, (step / count) ** 2))
+        key = _Evaluator.key(params)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+def quality_score(params, base):
+    """参数相对原参数的质量评分（0到1，越高越接近原参数）"""
+    limits = _limits(base)
+    values = {
+        "scale": params['width'] / base['width'],
+        "fps": params['fps'],
+        "colors": params.get('colors') or DEFAULT_COLORS,
+        "lossy": params.get('lossy') or DEFAULT_LOSSY
+    }
+    score = 0.0
+    for name, weight in QUALITY_WEIGHTS.items():
+        start, end = limits[name]
+        if start == end:
+            score += weight
+        elif name == "lossy":
+            score += weight * (end - values[name]) / (end - start)
+        else:
+            score += weight * math.log(values[name] / end) / math.log(start / end)
+    return max(0.0, min(1.0, score))
+
+class _Evaluator:
+    """带缓存和预算的大小评估"""
+
+    def __init__(self, estimate, budget):
+        self.estimate = estimate
+        self.budget = budget
+        self.evaluations = 0
+        self.cache = {}
+        self.params = {}
+
+    @staticmethod
+    def key(params):
+        return (params['width'], params['height'], params['fps'], params.get('colors'), params.get('lossy'))
+
+    def exhausted(self):
+        return self.evaluations >= self.budget
+
+    def __call__(self, params):
+        """返回预估大小，预算用完且未缓存时返回None"""
+        key = self.key(params)
+        if key in self.cache:
+            return self.cache[key]
+        if self.exhausted():
+            return None
+        self.evaluations += 1
+        size = self.estimate(params)
+        self.cache[key] = size
+        self.params[key] = params
+        return size
+
+    def results(self):
+        """已评估的 [(params, size)]"""
+        return [(self.params[key], size) for key, size in self.cache.items()]
+
+def _select_measured(evaluate, base, target_size, operator, measure):
+    """满足约束的已评估参数中，按质量评分取前几个实测质量并按实测质量选择，无法测量时返回None"""
+    satisfied = sorted(
+        ((params, size) for params, size in evaluate.results()
+         if size and is_satisfied(size, target_size, operator)),
+        key=lambda item: quality_score(item[0], base), reverse=True
+    )
+    candidates = []
+    for params, size in satisfied[:SOLVER_CONFIG["measure_limit"]]:
+        try:
+            measured = measure(params)
+        except Exception:
+            measured = None  # 单个参数测量失败不影响其他参数
+        if measured:
+            candidates.append(dict(measured, params=params, size=size))
+    return select_best(candidates)
+
+def solve_for_target(base_params, target_size, operator, estimate, budget=None, measure=None):
+    """求满足大小约束的最高质量参数
+
+    estimate(params) 返回预估大小（字节），base_params 必须包含width和height。
+    支持 '<'、'<=' 和 '='（其他约束只评估原参数）。
+    measure(params) 返回实测质量 {'ssim', 'psnr'}（只对已评估且满足约束的参数调用），
+    提供时按实测质量在满足约束的参数中选择。
+    返回 {'params', 'evaluations', 'estimated_size', 'margin', 'satisfied', 'quality', 'ssim', 'psnr'}，
+    margin 为目标大小与预估大小之差占目标大小的比例（正数表示低于目标），
+    quality 为相对原参数的质量评分，ssim/psnr 为实测质量（未测量时为None）。
+    """
+    evaluate = _Evaluator(estimate, budget or SOLVER_CONFIG["budget"])
+    base = dict(base_params)
+
+    def report(params, size, measured=None):
+        return {
+            'params': params,
+            'evaluations': evaluate.evaluations,
+            'estimated_size': size,
+            'margin': (target_size - size) / target_size if size and target_size else None,
+            'satisfied': bool(size) and is_satisfied(size, target_size, operator),
+            'quality': quality_score(params, base),
+            'ssim': measured['ssim'] if measured else None,
+            'psnr': measured['psnr'] if measured else None
+        }
+
+    def finish(params, size):
+        """求解结束：提供了measure时按实测质量在满足约束的参数中选择"""
+        if measure is not None:
+            chosen = _select_measured(evaluate, base, target_size, operator, measure)
+            if chosen is not None:
+                return report(chosen['params'], chosen['size'], chosen)
+        return report(params, size)
+
+    base_size = evaluate(base)
+    if not base_size or operator not in ('<', '<=', '=') or is_satisfied(base_size, target_size, operator):
+        return report(base, base_size)
+    if base_size < target_size:
+        # "="约束且原参数已明显偏小：不放大原视频
+        return report(base, base_size)
+
+    limits = _limits(base)
+
+    # 1. 二分降级程度：lo始终不满足（偏大），hi为已知最好的满足点
+    lo, hi = 0.0, 1.0
+    hi_params = params_for_levels(base, _levels_at(limits, hi))
+    hi_size = evaluate(hi_params)
+    if hi_size is None:
+        return report(base, base_size)
+    if not is_satisfied(hi_size, target_size, operator) and hi_size >= target_size:
+        # 降到最低仍然超过目标，返回最小的参数
+        return report(hi_params, hi_size)
+
+    best_t, best_params, best_size = hi, hi_params, hi_size
+    for _ in range(SOLVER_CONFIG["bisect_steps"]):
+        if evaluate.exhausted():
+            break
+        mid = (lo + hi) / 2
+        params = params_for_levels(base, _levels_at(limits, mid))
+        size = evaluate(params)
+        if size is None:
+            break
+        if is_satisfied(size, target_size, operator):
+            hi = best_t = mid
+            best_params, best_size = params, size
+        elif size >= target_size:
+            lo = mid
+        else:
+            # "="约束时降级过多（偏小），往原参数方向收缩
+            hi = mid
+    if not is_satisfied(best_size, target_size, operator):
+        return report(best_params, best_size)
+
+    # 2. 坐标上升：逐个维度向原参数恢复，仍满足约束则保留
+    levels = _levels_at(limits, best_t)
+    floor = _levels_at(limits, lo)
+    for name in ASCENT_ORDER:
+        for candidate in (limits[name][0], (levels[name] + floor[name]) / 2):
+            if candidate == levels[name]:
+                break
+            trial = dict(levels, **{name: candidate})
+            params = params_for_levels(base, trial)
+            size = evaluate(params)
+            if size is None:
+                return finish(best_params, best_size)
+            if is_satisfied(size, target_size, operator):
+                levels, best_params, best_size = trial, params, size
+                break
+
+    return finish(best_params, best_size)
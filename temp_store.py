@@ -0,0 +1,359 @@
+"""
+内容寻址的临时文件存储
+
+上传文件按内容哈希只保存一份，各会话只持有引用：
+- 相同内容的上传（即使来自不同用户）共用同一个文件
+- 重置时只释放当前会话的引用，不影响其他会话正在使用的文件
+- 超出全局字节配额时按LRU淘汰无引用的文件
+- 后台线程定期回收过期会话和无引用文件
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# 存储配置
+TEMP_STORE_CONFIG = {
+    "root": Path(__file__).with_name("temp_uploads"),
+    "quota_bytes": 2 * 1024 * 1024 * 1024,  # 全局配额 2GB
+    "session_ttl": 6 * 3600,  # 会话无活动6小时后释放其引用
+    "orphan_grace": 10 * 60,  # 无引用文件至少保留10分钟，方便重复上传命中
+    "reap_interval": 60  # 后台回收间隔（秒）
+}
+
+# 会话ID在session_state中的键名
+SESSION_ID_KEY = "temp_store_session_id"
+
+class TempStoreFull(OSError):
+    """配额不足且没有可淘汰的文件"""
+
+def session_id_from_state(state):
+    """从会话状态（如st.session_state）中获取或创建会话ID"""
+    session_id = state.get(SESSION_ID_KEY)
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        state[SESSION_ID_KEY] = session_id
+    return session_id
+
+def digest_bytes(data):
+    """计算内容哈希"""
+    return hashlib.sha256(data).hexdigest()
+
+def digest_file(path, chunk_size=1024 * 1024):
+    """分块计算文件的内容哈希"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def store_key(content_hash, suffix):
+    """存储中的键：内容哈希加扩展名（相同内容以不同扩展名保存为不同文件，调用方按扩展名选择解析方式）"""
+    return f"{content_hash}-{suffix[1:]}" if suffix else content_hash
+
+class TempStore:
+    """内容寻址、按会话计引用的临时文件存储"""
+
+    def __init__(self, root=None, quota_bytes=None, session_ttl=None,
+                 orphan_grace=None, reap_interval=None):
+        self.root = Path(root or TEMP_STORE_CONFIG["root"])
+        self.blob_dir = self.root / "store"
+        self.quota_bytes = quota_bytes or TEMP_STORE_CONFIG["quota_bytes"]
+        self.session_ttl = session_ttl or TEMP_STORE_CONFIG["session_ttl"]
+        self.orphan_grace = orphan_grace if orphan_grace is not None else TEMP_STORE_CONFIG["orphan_grace"]
+        self.reap_interval = reap_interval or TEMP_STORE_CONFIG["reap_interval"]
+
+        self._lock = threading.RLock()
+        # key -> {'path', 'size', 'last_access', 'refs', 'artifacts'}
+        self._entries = {}
+        # session_id -> {'keys', 'last_seen'}
+        self._sessions = {}
+        self._reaper = None
+
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """重启后登记已有文件（均视为无引用，可被淘汰）"""
+        for path in self.blob_dir.glob("*/*"):
+            if not path.is_file() or path.name.endswith(".tmp"):
+                continue
+            key = path.name.split(".", 1)[0]
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entry = self._entries.setdefault(key, {
+                'path': None,
+                'size': 0,
+                'last_access': stat.st_mtime,
+                'refs': set(),
+                'artifacts': {}
+            })
+            if path.name == key + path.suffix and len(path.suffixes) <= 1:
+                entry['path'] = path
+                entry['size'] = stat.st_size
+            else:
+                entry['artifacts'][path.name[len(key):]] = stat.st_size
+            entry['last_access'] = max(entry['last_access'], stat.st_mtime)
+
+        # 只有衍生文件、没有主文件的条目直接清理
+        for key in [k for k, e in self._entries.items() if e['path'] is None]:
+            self._delete_entry(key)
+
+    def _blob_path(self, key, suffix):
+        return self.blob_dir / key[:2] / f"{key}{suffix}"
+
+    def _entry_bytes(self, entry):
+        return entry['size'] + sum(entry['artifacts'].values())
+
+    def _delete_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return 0
+        freed = 0
+        # 只匹配本条目的文件（不带扩展名的键是其他键的前缀），不删除正在写入的临时文件
+        paths = [self._blob_path(key, "")] + list((self.blob_dir / key[:2]).glob(f"{key}.*"))
+        for path in paths:
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except OSError:
+                pass
+        return freed
+
+    def _touch_session(self, session_id):
+        session = self._sessions.setdefault(session_id, {'keys': set(), 'last_seen': 0})
+        session['last_seen'] = time.time()
+        return session
+
+    def put_bytes(self, session_id, data, filename):
+        """保存上传内容并为会话登记引用，返回文件路径"""
+        data = memoryview(data)
+        suffix = Path(filename).suffix.lower()
+        key = store_key(digest_bytes(data), suffix)
+
+        with self._lock:
+            path = self._add_ref(session_id, key)
+            if path is not None:
+                return path
+
+        # 写入临时文件时不持有锁，其他会话的登记、释放和回收不必等待大文件写完
+        path = self._blob_path(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            with self._lock:
+                # 写入期间其他会话可能已保存了相同内容
+                existing = self._add_ref(session_id, key)
+                if existing is not None:
+                    return existing
+                self._make_room(len(data))
+                os.replace(tmp_path, path)
+                self._register(session_id, key, path, len(data))
+                return path
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def put_file(self, session_id, source_path, filename):
+        """把已写好的文件移入存储（不读入内存）并为会话登记引用，返回文件路径"""
+        source_path = Path(source_path)
+        size = source_path.stat().st_size
+        suffix = Path(filename).suffix.lower()
+        key = store_key(digest_file(source_path), suffix)
+
+        with self._lock:
+            path = self._add_ref(session_id, key)
+            if path is not None:
+                source_path.unlink()
+                return path
+
+            self._make_room(size)
+
+            path = self._blob_path(key, suffix)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source_path, path)
+            self._register(session_id, key, path, size)
+            return path
+
+    def _add_ref(self, session_id, key):
+        """已保存的内容：为会话登记引用并返回文件路径，否则返回None（调用方持有锁）"""
+        session = self._touch_session(session_id)
+        entry = self._entries.get(key)
+        if entry is None or entry['path'] is None or not entry['path'].exists():
+            return None
+        entry['refs'].add(session_id)
+        entry['last_access'] = time.time()
+        session['keys'].add(key)
+        return entry['path']
+
+    def _register(self, session_id, key, path, size):
+        """登记新保存的文件（调用方持有锁）"""
+        self._entries[key] = {
+            'path': path,
+            'size': size,
+            'last_access': time.time(),
+            'refs': {session_id},
+            'artifacts': {}
+        }
+        self._touch_session(session_id)['keys'].add(key)
+
+    def key_for_path(self, path):
+        """由存储中的文件路径取回键，不在存储中时返回None"""
+        key = Path(path).name.split(".", 1)[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['path'] is not None and entry['path'].name == Path(path).name:
+                return key
+        return None
+
+    def artifact_path(self, key, suffix):
+        """与上传文件并列存放的衍生文件路径（如代理帧、索引）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return self._blob_path(key, suffix)
+
+    def register_artifact(self, key, suffix):
+        """登记衍生文件，使其计入配额并随主文件一同淘汰"""
+        path = self._blob_path(key, suffix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not path.exists():
+                return
+            entry['artifacts'][suffix] = path.stat().st_size
+            entry['last_access'] = time.time()
+            self._make_room(0)
+
+    def touch(self, key):
+        """记录一次访问，更新LRU顺序"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['last_access'] = time.time()
+
+    def touch_session(self, session_id):
+        """会话心跳，防止活跃会话被回收"""
+        with self._lock:
+            self._touch_session(session_id)
+
+    def contains(self, key):
+        """内容哈希对应的文件是否仍在存储中"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry['path'] is not None
+
+    def has_session(self, session_id):
+        """会话是否仍持有引用（未重置、未过期）"""
+        with self._lock:
+            return session_id in self._sessions
+
+    def release(self, session_id, key=None):
+        """释放会话的引用；key为None时释放该会话的全部引用"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return 0
+            keys = list(session['keys']) if key is None else [key]
+            for k in keys:
+                session['keys'].discard(k)
+                entry = self._entries.get(k)
+                if entry is not None:
+                    entry['refs'].discard(session_id)
+            if not session['keys']:
+                self._sessions.pop(session_id, None)
+            return len(keys)
+
+    def _make_room(self, incoming_bytes):
+        """按LRU淘汰无引用的文件，直到能容纳新内容"""
+        used = sum(self._entry_bytes(e) for e in self._entries.values())
+        if used + incoming_bytes <= self.quota_bytes:
+            return
+        candidates = sorted(
+            (e['last_access'], k) for k, e in self._entries.items() if not e['refs']
+        )
+        for _, key in candidates:
+            used -= self._entry_bytes(self._entries[key])
+            self._delete_entry(key)
+            if used + incoming_bytes <= self.quota_bytes:
+                return
+        if incoming_bytes and used + incoming_bytes > self.quota_bytes:
+            raise TempStoreFull("临时存储空间不足，请稍后重试")
+
+    def reap(self):
+        """回收过期会话的引用、超过保留期的无引用文件"""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items()
+                       if now - s['last_seen'] > self.session_ttl]
+            for session_id in expired:
+                self.release(session_id)
+
+            stale = [k for k, e in self._entries.items()
+                     if not e['refs'] and now - e['last_access'] > self.orphan_grace]
+            for key in stale:
+                self._delete_entry(key)
+
+            self._make_room(0)
+
+        # 清理旧版本遗留在根目录的平铺文件
+        for path in self.root.glob("*"):
+            try:
+                if path.is_file() and now - path.stat().st_mtime > self.session_ttl:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def start_reaper(self):
+        """启动后台回收线程（幂等）"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="temp-store-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception:
+                pass
+
+    def usage(self):
+        """存储使用情况"""
+        with self._lock:
+            return {
+                'bytes': sum(self._entry_bytes(e) for e in self._entries.values()),
+                'quota_bytes': self.quota_bytes,
+                'files': len(self._entries),
+                'referenced_files': sum(1 for e in self._entries.values() if e['refs']),
+                'sessions': len(self._sessions)
+            }
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_temp_store(root=None, reap=True):
+    """获取进程内共享的存储实例（同一根目录只创建一次）
+
+    reap=False 用于工作进程：工作进程不持有会话引用，不能回收服务进程中仍在使用的文件。
+    """
+    root = Path(root or TEMP_STORE_CONFIG["root"])
+    with _stores_lock:
+        store = _stores.get(root.resolve())
+        if store is None:
+            store = TempStore(root)
+            if reap:
+                store.start_reaper()
+            _stores[root.resolve()] = store
+        return store
@@ -11,6 +11,7 @@ import json
 from datetime import datetime
 import re
 from config import API_CONFIG, ERROR_MESSAGES, SUCCESS_MESSAGES, UPLOAD_CONFIG
+from temp_store import get_temp_store, session_id_from_state
 
 class AIClient:
     """AI客户端管理类"""
@@ -181,14 +182,14 @@ class FileManager:
             self.temp_dir.chmod(0o755)
         except:
             pass  # 忽略权限设置错误
+        # 内容寻址存储，各会话只持有引用
+        self.store = get_temp_store(self.temp_dir)
     
     def save_uploaded_file(self, uploaded_file):
         """保存上传的文件"""
         try:
-            file_path = self.temp_dir / uploaded_file.name
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            return file_path
+            session_id = session_id_from_state(st.session_state)
+            return self.store.put_bytes(session_id, uploaded_file.getbuffer(), uploaded_file.name)
         except Exception as e:
             st.error(f"{ERROR_MESSAGES['file_upload_failed']}: {e}")
             return None
@@ -261,14 +262,10 @@ class FileManager:
             return error_msg
     
     def cleanup_temp_files(self):
-        """清理临时文件"""
+        """释放当前会话的临时文件引用（其他会话的文件不受影响）"""
         try:
-            deleted_count = 0
-            for file_path in self.temp_dir.glob("*"):
-                if file_path.is_file():
-                    file_path.unlink()
-                    deleted_count += 1
-            return deleted_count
+            session_id = session_id_from_state(st.session_state)
+            return self.store.release(session_id)
         except Exception as e:
             return 0
 
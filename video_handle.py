@@ -0,0 +1,249 @@
+"""
+共享视频句柄
+
+同一内容的视频在进程内只探测、验证一次：验证结果、元数据和已打开的VideoCapture
+按内容哈希缓存，分析、预估、预览和转换共用同一个句柄，避免重复打开文件和解码首帧。
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from temp_store import digest_file
+from video_probe import probe_container
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+# 同时保留的句柄数量（每个句柄可能持有一个解码器）
+MAX_OPEN_HANDLES = 16
+
+# 临时存储中的文件以内容哈希（加扩展名）命名，可直接取用
+_CONTENT_HASH_NAME = re.compile(r"([0-9a-f]{64})(?:-.+)?")
+
+class VideoHandle:
+    """按内容哈希共享的视频句柄"""
+
+    def __init__(self, path, content_hash):
+        self.path = str(path)
+        self.content_hash = content_hash
+        self._lock = threading.RLock()
+        self._capture_lock = threading.RLock()
+        self._validation = None
+        self._container = None
+        self._container_loaded = False
+        self._metadata = None
+        self._cap = None
+
+    def _open_capture(self):
+        """打开（或复用）VideoCapture，调用方需持有_capture_lock"""
+        if self._cap is not None:
+            return self._cap
+        if not OPENCV_AVAILABLE:
+            return None
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        self._cap = cap
+        return cap
+
+    def validate(self):
+        """验证文件完整性，返回(是否有效, 说明)，结果缓存"""
+        with self._lock:
+            if self._validation is None:
+                self._validation = self._validate()
+            return self._validation
+
+    def _validate(self):
+        if not os.path.exists(self.path):
+            return False, "文件不存在"
+
+        file_size = os.path.getsize(self.path)
+        if file_size == 0:
+            return False, "文件为空"
+        if file_size < 1024:  # 小于1KB，可能是损坏的文件
+            return False, "文件太小，可能已损坏"
+
+        # MP4/MOV的容器表可以解析不代表解码器支持其编码（如部分构建中的AV1/HEVC），
+        # 容器表有效时同样解码第一帧确认
+        props = self.container_metadata()
+        container_valid = bool(props and not props['truncated'] and props['frame_count'] > 0
+                               and props['width'] > 0 and props['height'] > 0)
+
+        if not OPENCV_AVAILABLE:
+            return (True, "文件验证通过") if container_valid else (False, "OpenCV不可用")
+
+        # 容器有效却无法解码时，提示是编码格式不受支持
+        if container_valid and props.get('codec'):
+            undecodable = f"无法解码视频帧，可能不支持该编码格式（{props['codec']}）"
+        else:
+            undecodable = None
+
+        # 解码第一帧验证（只做一次，句柄保持打开供后续使用）
+        with self._capture_lock:
+            try:
+                cap = self._open_capture()
+                if cap is None:
+                    return False, undecodable or "无法打开视频文件"
+                ret = cap.grab()
+                frame = cap.retrieve()[1] if ret else None
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                if frame is None:
+                    return False, undecodable or "无法读取视频帧，文件可能已损坏"
+                return True, "文件验证通过"
+            except Exception as e:
+                self._release_capture()
+                return False, f"视频处理失败: {str(e)}"
+
+    def container_metadata(self):
+        """容器表元数据（仅MP4/MOV），无法解析时返回None"""
+        with self._lock:
+            if not self._container_loaded:
+                self._container = probe_container(self.path)
+                self._container_loaded = True
+            return self._container
+
+    def metadata(self):
+        """视频元数据：优先容器表，否则读取OpenCV属性；无法获取时返回None"""
+        with self._lock:
+            if self._metadata is None:
+                props = self.container_metadata()
+                if props is not None and not props['truncated']:
+                    self._metadata = props
+                else:
+                    self._metadata = self._opencv_metadata()
+            return self._metadata
+
+    def _opencv_metadata(self):
+        with self._capture_lock:
+            cap = self._open_capture()
+            if cap is None:
+                return None
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            return {
+                'fps': fps,
+                'frame_count': frame_count,
+                'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                'duration': frame_count / fps if fps > 0 else 0,
+                'file_size': os.path.getsize(self.path),
+                'keyframes': None,
+                'codec': None,
+                'vfr': False,
+                'truncated': False,
+                'source': 'opencv'
+            }
+
+    def reset(self):
+        """将共享的capture定位到开头"""
+        self.seek(0)
+
+    def seek(self, frame_index):
+        """将共享的capture定位到指定帧，已在该位置时不做任何操作"""
+        with self._capture_lock:
+            cap = self._open_capture()
+            if cap is None:
+                return False
+            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+                return True
+            return cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+    @contextmanager
+    def capture(self, start_frame=0):
+        """独占使用共享的capture，进入时定位到start_frame
+
+        用法：
+            with handle.capture() as cap:
+                ret, frame = cap.read()
+        无法打开时cap为None。
+        """
+        with self._capture_lock:
+            cap = self._open_capture()
+            if cap is not None:
+                self.seek(start_frame)
+            try:
+                yield cap
+            except Exception:
+                # 解码出错后capture状态不可信，丢弃并在下次重新打开
+                self._release_capture()
+                raise
+
+    def _release_capture(self):
+        if self._cap is not None:
+            try:
+                self._cap.release()
+            except Exception:
+                pass
+            self._cap = None
+
+    def release(self):
+        """释放解码器资源（缓存的验证结果和元数据保留）"""
+        with self._capture_lock:
+            self._release_capture()
+
+_handles = OrderedDict()
+# (路径, 文件大小, 修改时间) -> 内容哈希，与句柄相同按最近使用保留MAX_OPEN_HANDLES项
+_path_hashes = OrderedDict()
+_registry_lock = threading.Lock()
+
+def content_hash_for(path):
+    """获取文件的内容哈希：临时存储中的文件直接取文件名，其他文件计算后缓存"""
+    path = Path(path)
+    stem = path.name.split(".", 1)[0]
+    match = _CONTENT_HASH_NAME.fullmatch(stem)
+    if match:
+        return match.group(1)
+    stat = path.stat()
+    cache_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _registry_lock:
+        content_hash = _path_hashes.get(cache_key)
+        if content_hash is not None:
+            _path_hashes.move_to_end(cache_key)
+            return content_hash
+
+    # 计算哈希时不持有锁，其他文件的句柄不必等待
+    content_hash = digest_file(path)
+    with _registry_lock:
+        _path_hashes[cache_key] = content_hash
+        while len(_path_hashes) > MAX_OPEN_HANDLES:
+            _path_hashes.popitem(last=False)
+    return content_hash
+
+def get_video_handle(path):
+    """获取与文件内容对应的共享句柄"""
+    content_hash = content_hash_for(path)
+    with _registry_lock:
+        handle = _handles.get(content_hash)
+        if handle is not None and not os.path.exists(handle.path):
+            # 原文件已被淘汰，换用新路径
+            handle.release()
+            handle = None
+        if handle is None:
+            handle = VideoHandle(path, content_hash)
+            _handles[content_hash] = handle
+        _handles.move_to_end(content_hash)
+
+        while len(_handles) > MAX_OPEN_HANDLES:
+            _, evicted = _handles.popitem(last=False)
+            evicted.release()
+        return handle
+
+def release_video_handle(path):
+    """释放文件对应句柄持有的解码器"""
+    try:
+        content_hash = content_hash_for(path)
+    except OSError:
+        return
+    with _registry_lock:
+        handle = _handles.pop(content_hash, None)
+    if handle is not None:
+        handle.release()
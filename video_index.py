@@ -0,0 +1,240 @@
+"""
+帧时间戳与关键帧索引
+
+每个上传文件建立一次索引，记录每一帧（按显示顺序）的显示时间戳和是否为关键帧：
+- MP4/MOV直接由容器表（stts/ctts/stss）计算，无需解码
+- 其他容器用一次grab()遍历记录时间戳（关键帧未知，只按顺序读取）
+索引与上传文件并列保存。采样器据此按精确时间戳选帧，并规划对齐关键帧的跳转。
+"""
+
+import math
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from temp_store import get_temp_store
+from video_probe import ContainerParseError, parse_video_track
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+INDEX_SUFFIX = ".index.npz"
+
+# 目标帧之前的关键帧比当前位置超前这么多帧时才跳转，否则顺序grab更快
+SEEK_MIN_GAP = 24
+
+# 进程内缓存的索引数量
+INDEX_CACHE_SIZE = 32
+
+def output_timestamps(duration, fps, start_time=None, end_time=None, max_frames=None):
+    """按目标帧率计算输出帧的时间点（秒），正式转换和大小预估共用此规则"""
+    fps = max(1, fps)
+    start = max(0.0, start_time or 0.0)
+    end = duration if end_time is None else min(duration, end_time)
+    count = max(1, int(math.ceil((end - start) * fps - 1e-6))) if end > start else 1
+    if max_frames:
+        count = min(count, max_frames)
+    return start + np.arange(count) / fps
+
+class FrameIndex:
+    """按显示顺序排列的帧时间戳和关键帧标记"""
+
+    def __init__(self, pts, keyframe, source):
+        self.pts = np.asarray(pts, dtype=np.float64)
+        self.keyframe = np.asarray(keyframe, dtype=bool)
+        self.source = source
+        deltas = np.diff(self.pts)
+        # 帧间隔相差超过10%视为可变帧率
+        self.vfr = bool(len(deltas) and deltas.max() > deltas.min() * 1.1)
+
+    @property
+    def count(self):
+        return len(self.pts)
+
+    @property
+    def duration(self):
+        if self.count < 2:
+            return 0.0
+        return float(self.pts[-1] + (self.pts[-1] - self.pts[-2]))
+
+    @property
+    def keyframe_numbers(self):
+        return np.flatnonzero(self.keyframe)
+
+    def nearest_frames(self, times):
+        """离各时间点最近的帧号"""
+        times = np.asarray(times, dtype=np.float64)
+        if self.count == 1:
+            return np.zeros(len(times), dtype=np.int64)
+        right = np.clip(np.searchsorted(self.pts, times), 1, self.count - 1)
+        left = right - 1
+        choose_left = (times - self.pts[left]) <= (self.pts[right] - times)
+        return np.where(choose_left, left, right)
+
+    def select_frames(self, fps, start_time=None, end_time=None, max_frames=None):
+        """按目标帧率的精确时间点选帧，返回非递减的帧号（目标帧率高于源帧率时有重复）"""
+        times = output_timestamps(self.duration, fps, start_time, end_time, max_frames)
+        return self.nearest_frames(times)
+
+    def keyframe_before(self, frame_number):
+        """不晚于指定帧的最近关键帧"""
+        keyframes = self.keyframe_numbers
+        position = np.searchsorted(keyframes, frame_number, side='right') - 1
+        return int(keyframes[position]) if position >= 0 else 0
+
+    def save(self, path):
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, pts=self.pts, keyframe=self.keyframe, source=np.array(self.source))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['pts'], data['keyframe'], str(data['source']))
+
+def build_index_from_container(path):
+    """由MP4/MOV样本表计算索引，无法解析时返回None"""
+    try:
+        track = parse_video_track(path)
+    except (ContainerParseError, struct.error, OSError, IndexError, ValueError):
+        return None
+
+    sample_count = track['sample_count']
+    timescale = track['timescale']
+    if sample_count <= 0 or timescale <= 0:
+        return None
+
+    # 解码时间戳 = stts间隔累加，显示时间戳 = 解码时间戳 + ctts偏移
+    deltas = np.repeat(
+        np.array([delta for _, delta in track['stts']], dtype=np.int64),
+        np.array([count for count, _ in track['stts']], dtype=np.int64)
+    )[:sample_count]
+    if len(deltas) < sample_count:
+        return None
+    dts = np.concatenate(([0], np.cumsum(deltas)[:-1]))
+    if track['ctts']:
+        offsets = np.repeat(
+            np.array([offset for _, offset in track['ctts']], dtype=np.int64),
+            np.array([count for count, _ in track['ctts']], dtype=np.int64)
+        )[:sample_count]
+        if len(offsets) == sample_count:
+            dts = dts + offsets
+
+    is_key = np.zeros(sample_count, dtype=bool)
+    if track['stss'] is None:
+        is_key[:] = True
+    else:
+        key_samples = np.array(track['stss'], dtype=np.int64)
+        is_key[key_samples[(key_samples >= 0) & (key_samples < sample_count)]] = True
+
+    order = np.argsort(dts, kind='stable')
+    pts = (dts[order] - dts[order][0]) / timescale
+    keyframe = is_key[order]
+    keyframe[0] = True
+    return FrameIndex(pts, keyframe, 'container')
+
+def build_index_by_grab(handle):
+    """用一次grab()遍历记录每帧时间戳（不转换像素），关键帧只标记第一帧"""
+    metadata = handle.metadata() or {}
+    fallback_fps = metadata.get('fps') if 0 < (metadata.get('fps') or 0) <= 120 else 25.0
+    pts = []
+    with handle.capture() as cap:
+        if cap is None:
+            return None
+        while cap.grab():
+            position_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            if position_ms <= 0 and pts:
+                position_ms = (len(pts) / fallback_fps) * 1000
+            pts.append(position_ms / 1000)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    if len(pts) < 1:
+        return None
+    pts = np.maximum.accumulate(np.array(pts) - pts[0])
+    keyframe = np.zeros(len(pts), dtype=bool)
+    keyframe[0] = True
+    return FrameIndex(pts, keyframe, 'grab')
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_frame_index(handle, build=True):
+    """获取视频的帧索引：内存缓存 → 磁盘文件 → 现场建立（build=True时）"""
+    content_hash = handle.content_hash
+    with _indexes_lock:
+        index = _indexes.get(content_hash)
+        if index is not None:
+            _indexes.move_to_end(content_hash)
+            return index
+
+    store = get_temp_store()
+    key = store.key_for_path(handle.path)
+    path = store.artifact_path(key, INDEX_SUFFIX) if key else None
+    index = None
+    if path is not None and path.exists():
+        try:
+            index = FrameIndex.load(path)
+        except Exception:
+            index = None
+    if index is None and build:
+        index = build_index_from_container(handle.path)
+        if index is None and OPENCV_AVAILABLE:
+            index = build_index_by_grab(handle)
+        if index is not None and path is not None:
+            try:
+                index.save(path)
+                store.register_artifact(key, INDEX_SUFFIX)
+            except Exception:
+                pass
+    if index is None:
+        return None
+
+    with _indexes_lock:
+        _indexes[content_hash] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+def _seek_to_keyframe(cap, index, keyframe):
+    """跳转到关键帧并grab该帧，按时间戳校验是否定位准确"""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+    if not cap.grab():
+        return False
+    frame_interval = index.pts[1] - index.pts[0] if index.count > 1 else 0.04
+    actual = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+    return abs(actual - index.pts[keyframe]) <= frame_interval / 2
+
+def iter_frames(cap, index, frame_numbers):
+    """按递增的帧号读取帧，产出(帧号, BGR帧)
+
+    目标帧之前的关键帧远超当前位置时跳转到该关键帧，否则顺序grab跳过不需要的帧；
+    只有目标帧才做像素转换（retrieve）。可变帧率视频或跳转位置不准确时退回顺序读取。
+    """
+    allow_seek = index.source == 'container' and not index.vfr
+    position = max(0, int(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+
+    for target in frame_numbers:
+        target = int(target)
+        keyframe = index.keyframe_before(target) if allow_seek else 0
+        if target < position or (allow_seek and keyframe - position > SEEK_MIN_GAP):
+            if allow_seek and _seek_to_keyframe(cap, index, keyframe):
+                position = keyframe + 1
+            else:
+                allow_seek = False
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                position = 0
+
+        while position <= target:
+            if not cap.grab():
+                return
+            position += 1
+
+        ret, frame = cap.retrieve()
+        if not ret or frame is None:
+            return
+        yield target, frame
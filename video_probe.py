@@ -0,0 +1,272 @@
+"""
+MP4/MOV容器元数据快速探测
+
+只读取moov中的少量表（mvhd/tkhd/mdhd/stsd/stts/ctts/stss/stsz/stsc/stco），
+不启动解码器即可得到精确的时长、帧数、分辨率和关键帧位置。
+可变帧率（VFR）视频的帧数同样准确。无法解析的容器返回None，由调用方回退到OpenCV。
+"""
+
+import os
+import struct
+
+# 容器类型识别（ftyp之外也允许直接以这些box开头的老式MOV）
+_TOP_LEVEL_TYPES = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid', b'styp', b'sidx', b'moof', b'mfra'}
+
+# moov上限，防止异常文件导致读入过多数据
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+
+class ContainerParseError(Exception):
+    """容器结构无法解析"""
+
+def _read_box_header(buf, offset, end):
+    """解析box头，返回(类型, 数据起点, box终点)"""
+    if offset + 8 > end:
+        raise ContainerParseError("box头不完整")
+    size, box_type = struct.unpack_from(">I4s", buf, offset)
+    header = 8
+    if size == 1:
+        if offset + 16 > end:
+            raise ContainerParseError("box头不完整")
+        size = struct.unpack_from(">Q", buf, offset + 8)[0]
+        header = 16
+    elif size == 0:
+        size = end - offset
+    if size < header or offset + size > end:
+        raise ContainerParseError(f"box {box_type!r} 尺寸异常")
+    return box_type, offset + header, offset + size
+
+def _iter_boxes(buf, start, end):
+    offset = start
+    while offset + 8 <= end:
+        box_type, data_start, box_end = _read_box_header(buf, offset, end)
+        yield box_type, data_start, box_end
+        offset = box_end
+
+def _find_child(buf, start, end, box_type):
+    for child_type, data_start, box_end in _iter_boxes(buf, start, end):
+        if child_type == box_type:
+            return data_start, box_end
+    return None
+
+def _read_moov(f, file_size):
+    """按box头跳读顶层结构，只把moov读入内存"""
+    offset = 0
+    first = True
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        head = f.read(16)
+        if len(head) < 8:
+            break
+        size, box_type = struct.unpack_from(">I4s", head, 0)
+        if first and box_type not in _TOP_LEVEL_TYPES:
+            raise ContainerParseError("不是MP4/MOV容器")
+        first = False
+        header = 8
+        if size == 1:
+            if len(head) < 16:
+                break
+            size = struct.unpack_from(">Q", head, 8)[0]
+            header = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header:
+            raise ContainerParseError("顶层box尺寸异常")
+        if box_type == b'moov':
+            if size > MAX_MOOV_BYTES:
+                raise ContainerParseError("moov过大")
+            f.seek(offset)
+            data = f.read(size)
+            if len(data) < size:
+                raise ContainerParseError("moov不完整")
+            return data
+        offset += size
+    raise ContainerParseError("未找到moov（可能是分片MP4或文件不完整）")
+
+def _full_box_version(buf, start):
+    return buf[start]
+
+def _parse_mdhd(buf, start):
+    if _full_box_version(buf, start) == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, start + 4 + 16)
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, start + 4 + 8)
+    return timescale, duration
+
+def _parse_tkhd_rotated(buf, start):
+    """根据tkhd变换矩阵判断是否旋转了90/270度"""
+    matrix_offset = start + 4 + (32 if _full_box_version(buf, start) == 1 else 20) + 16
+    a, b = struct.unpack_from(">ii", buf, matrix_offset)
+    return a == 0 and abs(b) == 0x10000
+
+def _parse_stsd(buf, start):
+    """读取第一个视觉样本描述的编码格式和编码尺寸"""
+    entry_count = struct.unpack_from(">I", buf, start + 4)[0]
+    if entry_count < 1:
+        raise ContainerParseError("stsd为空")
+    entry = start + 8
+    codec = buf[entry + 4:entry + 8].decode('latin-1')
+    width, height = struct.unpack_from(">HH", buf, entry + 32)
+    return codec, width, height
+
+def _parse_pairs(buf, start):
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    values = struct.unpack_from(f">{2 * count}I", buf, start + 8)
+    return list(zip(values[0::2], values[1::2]))
+
+def _parse_ctts(buf, start):
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    values = struct.unpack_from(f">{2 * count}I", buf, start + 8)
+    # 偏移量按有符号数解释（版本0中也常见负值写法）
+    return [(n, struct.unpack(">i", struct.pack(">I", v))[0]) for n, v in zip(values[0::2], values[1::2])]
+
+def _parse_stss(buf, start):
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    return [n - 1 for n in struct.unpack_from(f">{count}I", buf, start + 8)]
+
+def _parse_stsz(buf, start):
+    sample_size, sample_count = struct.unpack_from(">II", buf, start + 4)
+    if sample_size:
+        return sample_count, [sample_size] * sample_count
+    return sample_count, list(struct.unpack_from(f">{sample_count}I", buf, start + 12))
+
+def _parse_stsc(buf, start):
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    values = struct.unpack_from(f">{3 * count}I", buf, start + 8)
+    return list(zip(values[0::3], values[1::3]))
+
+def _parse_chunk_offsets(buf, start, wide):
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    return list(struct.unpack_from(f">{count}{'Q' if wide else 'I'}", buf, start + 8))
+
+def _data_end_offset(sample_sizes, stsc, chunk_offsets):
+    """计算媒体数据在文件中的最远结束位置，用于检测截断"""
+    if not chunk_offsets or not stsc or not sample_sizes:
+        return 0
+    max_end = 0
+    sample_index = 0
+    for i, (first_chunk, per_chunk) in enumerate(stsc):
+        last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            if chunk - 1 >= len(chunk_offsets) or sample_index >= len(sample_sizes):
+                return max_end
+            chunk_bytes = sum(sample_sizes[sample_index:sample_index + per_chunk])
+            max_end = max(max_end, chunk_offsets[chunk - 1] + chunk_bytes)
+            sample_index += per_chunk
+    return max_end
+
+def parse_video_track(path):
+    """解析第一个视频轨道的样本表
+
+    返回包含timescale、duration、stts、ctts、stss、sample_sizes等原始表的字典；
+    无法解析时抛出ContainerParseError。
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        moov = _read_moov(f, file_size)
+
+    moov_start, moov_end = _read_box_header(moov, 0, len(moov))[1:]
+    for box_type, trak_start, trak_end in _iter_boxes(moov, moov_start, moov_end):
+        if box_type != b'trak':
+            continue
+        mdia = _find_child(moov, trak_start, trak_end, b'mdia')
+        if not mdia:
+            continue
+        hdlr = _find_child(moov, mdia[0], mdia[1], b'hdlr')
+        if not hdlr or moov[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            continue
+
+        mdhd = _find_child(moov, mdia[0], mdia[1], b'mdhd')
+        minf = _find_child(moov, mdia[0], mdia[1], b'minf')
+        stbl = _find_child(moov, minf[0], minf[1], b'stbl') if minf else None
+        if not mdhd or not stbl:
+            raise ContainerParseError("视频轨道缺少mdhd或stbl")
+
+        timescale, duration = _parse_mdhd(moov, mdhd[0])
+        tables = {}
+        for child_type, data_start, _ in _iter_boxes(moov, stbl[0], stbl[1]):
+            tables[child_type] = data_start
+        if b'stsd' not in tables or b'stts' not in tables or b'stsz' not in tables:
+            raise ContainerParseError("样本表不完整")
+
+        codec, width, height = _parse_stsd(moov, tables[b'stsd'])
+        tkhd = _find_child(moov, trak_start, trak_end, b'tkhd')
+        if tkhd and _parse_tkhd_rotated(moov, tkhd[0]):
+            width, height = height, width
+
+        sample_count, sample_sizes = _parse_stsz(moov, tables[b'stsz'])
+        stts = _parse_pairs(moov, tables[b'stts'])
+        if b'stco' in tables:
+            chunk_offsets = _parse_chunk_offsets(moov, tables[b'stco'], wide=False)
+        elif b'co64' in tables:
+            chunk_offsets = _parse_chunk_offsets(moov, tables[b'co64'], wide=True)
+        else:
+            chunk_offsets = []
+        stsc = _parse_stsc(moov, tables[b'stsc']) if b'stsc' in tables else []
+
+        return {
+            'timescale': timescale,
+            'duration': duration,
+            'codec': codec,
+            'width': width,
+            'height': height,
+            'sample_count': sample_count,
+            'sample_sizes': sample_sizes,
+            'stts': stts,
+            'ctts': _parse_ctts(moov, tables[b'ctts']) if b'ctts' in tables else [],
+            # 没有stss表表示每一帧都是关键帧
+            'stss': _parse_stss(moov, tables[b'stss']) if b'stss' in tables else None,
+            'data_end': _data_end_offset(sample_sizes, stsc, chunk_offsets),
+            'file_size': file_size
+        }
+
+    raise ContainerParseError("未找到视频轨道")
+
+def probe_container(path):
+    """从容器表中读取视频元数据，无法解析时返回None
+
+    返回的字典与analyze_video_properties的结果字段一致，另附：
+    keyframes（关键帧序号）、codec、vfr（是否可变帧率）、truncated（数据是否被截断）、source
+    """
+    try:
+        track = parse_video_track(path)
+    except (ContainerParseError, struct.error, OSError, IndexError, ValueError):
+        return None
+
+    timescale = track['timescale']
+    sample_count = track['sample_count']
+    if timescale <= 0 or sample_count <= 0:
+        return None
+
+    total_ticks = sum(count * delta for count, delta in track['stts'])
+    duration_ticks = track['duration'] if 0 < track['duration'] < 0xFFFFFFFF else total_ticks
+    if duration_ticks <= 0:
+        return None
+    duration = duration_ticks / timescale
+
+    deltas = {delta for count, delta in track['stts'] if count > 0}
+    if len(deltas) == 1:
+        fps = timescale / next(iter(deltas))
+    else:
+        fps = sample_count / (total_ticks / timescale) if total_ticks else sample_count / duration
+
+    keyframes = track['stss'] if track['stss'] is not None else list(range(sample_count))
+    # 与帧索引相同，帧间隔相差超过10%才视为可变帧率；复用器常把最后一帧单独写成一项，不计入
+    entries = [(count, delta) for count, delta in track['stts'] if count > 0]
+    if len(entries) > 1 and entries[-1][0] == 1:
+        entries = entries[:-1]
+    body = [delta for count, delta in entries]
+    vfr = bool(body) and max(body) > min(body) * 1.1
+
+    return {
+        'fps': fps,
+        'frame_count': sample_count,
+        'width': track['width'],
+        'height': track['height'],
+        'duration': duration,
+        'file_size': track['file_size'],
+        'keyframes': keyframes,
+        'codec': track['codec'],
+        'vfr': vfr,
+        'truncated': track['data_end'] > track['file_size'],
+        'source': 'container'
+    }
@@ -0,0 +1,221 @@
+"""
+低分辨率代理帧
+
+上传时对视频解码一次，生成缩小尺寸、带时间戳的帧集合（压缩的.npz，与上传文件并列存放）。
+大小预估、AI建议校验和约束调整都在代理帧上做试编码，不再反复从磁盘全分辨率解码原视频。
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from gif_codec import encode_options
+from gif_estimator import estimate_from_bursts
+from temp_store import get_temp_store
+from video_index import get_frame_index, iter_frames, output_timestamps
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+# 代理帧配置
+PROXY_CONFIG = {
+    "max_side": 256,  # 长边像素上限
+    "max_fps": 12,  # 采样帧率上限
+    "max_frames": 240,  # 帧数上限，超出时加大采样间隔以覆盖整个时间轴
+    "cache_size": 4  # 进程内缓存的代理数量
+}
+
+PROXY_SUFFIX = ".proxy.npz"
+
+# 从试编码尺寸外推到目标尺寸时的面积指数（经验值：尺寸越大，LZW每像素字节数越低）
+AREA_EXPONENT = 0.75
+
+class VideoProxy:
+    """代理帧集合"""
+
+    def __init__(self, frames, timestamps, source_fps, source_width, source_height, duration):
+        self.frames = frames  # uint8 [N, H, W, 3] RGB
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)  # 秒
+        self.source_fps = float(source_fps)
+        self.source_width = int(source_width)
+        self.source_height = int(source_height)
+        self.duration = float(duration)
+
+    @property
+    def count(self):
+        return len(self.frames)
+
+    @property
+    def width(self):
+        return self.frames.shape[2]
+
+    @property
+    def height(self):
+        return self.frames.shape[1]
+
+    def nearest_indices(self, times):
+        """取离各时间点最近的代理帧序号"""
+        times = np.asarray(times, dtype=np.float64)
+        right = np.clip(np.searchsorted(self.timestamps, times), 1, self.count - 1)
+        left = right - 1
+        choose_left = (times - self.timestamps[left]) <= (self.timestamps[right] - times)
+        return np.where(choose_left, left, right)
+
+    def save(self, path):
+        """保存为压缩的npz"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez_compressed(
+            tmp_path,
+            frames=self.frames,
+            timestamps=self.timestamps,
+            meta=np.array([self.source_fps, self.source_width, self.source_height, self.duration])
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            source_fps, source_width, source_height, duration = data['meta']
+            return cls(data['frames'], data['timestamps'], source_fps, source_width, source_height, duration)
+
+def build_proxy(handle):
+    """按帧索引从共享句柄读取均匀分布在时间轴上的帧生成代理，失败时返回None"""
+    if not OPENCV_AVAILABLE:
+        return None
+    metadata = handle.metadata()
+    index = get_frame_index(handle)
+    if not metadata or index is None:
+        return None
+
+    source_fps = metadata['fps'] if 0 < metadata['fps'] <= 120 else 25.0
+    width, height = metadata['width'], metadata['height']
+    if width <= 0 or height <= 0:
+        return None
+    duration = metadata.get('duration') or index.duration
+
+    # 采样帧数：既不超过帧率上限，也不超过帧数上限（超出时拉大间隔以覆盖整个时间轴）
+    proxy_fps = min(source_fps, PROXY_CONFIG["max_fps"])
+    count = max(2, min(PROXY_CONFIG["max_frames"], int(math.ceil(index.duration * proxy_fps))))
+    frame_numbers = np.unique(index.nearest_frames(np.arange(count) * index.duration / count))
+
+    scale = min(1.0, PROXY_CONFIG["max_side"] / max(width, height))
+    proxy_size = (max(2, int(round(width * scale))), max(2, int(round(height * scale))))
+
+    frames = []
+    timestamps = []
+    with handle.capture() as cap:
+        if cap is None:
+            return None
+        for frame_number, frame in iter_frames(cap, index, frame_numbers):
+            if (frame.shape[1], frame.shape[0]) != proxy_size:
+                frame = cv2.resize(frame, proxy_size, interpolation=cv2.INTER_AREA)
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            timestamps.append(index.pts[frame_number])
+
+    if len(frames) < 2:
+        return None
+
+    return VideoProxy(np.stack(frames), timestamps, source_fps, width, height, duration)
+
+_proxies = OrderedDict()
+_proxies_lock = threading.Lock()
+_build_locks = {}
+
+def proxy_path_for(video_path):
+    """代理文件路径：仅临时存储中的上传文件会持久化代理"""
+    store = get_temp_store()
+    key = store.key_for_path(video_path)
+    if key is None:
+        return None, None
+    return key, store.artifact_path(key, PROXY_SUFFIX)
+
+def get_proxy(handle, build=True):
+    """获取视频的代理帧：内存缓存 → 磁盘文件 → 现场生成（build=True时）"""
+    content_hash = handle.content_hash
+    with _proxies_lock:
+        proxy = _proxies.get(content_hash)
+        if proxy is not None:
+            _proxies.move_to_end(content_hash)
+            return proxy
+        build_lock = _build_locks.setdefault(content_hash, threading.Lock())
+
+    # 同一视频只生成一次，其他会话等待结果
+    try:
+        with build_lock:
+            with _proxies_lock:
+                proxy = _proxies.get(content_hash)
+            if proxy is None:
+                key, path = proxy_path_for(handle.path)
+                if path is not None and path.exists():
+                    try:
+                        proxy = VideoProxy.load(path)
+                    except Exception:
+                        proxy = None
+                if proxy is None and build:
+                    proxy = build_proxy(handle)
+                    if proxy is not None and path is not None:
+                        try:
+                            proxy.save(path)
+                            get_temp_store().register_artifact(key, PROXY_SUFFIX)
+                        except Exception:
+                            pass
+                if proxy is None:
+                    return None
+
+            with _proxies_lock:
+                _proxies[content_hash] = proxy
+                _proxies.move_to_end(content_hash)
+                while len(_proxies) > PROXY_CONFIG["cache_size"]:
+                    _proxies.popitem(last=False)
+            return proxy
+    finally:
+        # 生成结束（包括失败）后移除锁，锁表不随处理过的视频数增长
+        with _proxies_lock:
+            if _build_locks.get(content_hash) is build_lock:
+                del _build_locks[content_hash]
+
+def resize_frames(frames, size):
+    """批量缩放RGB帧"""
+    if (frames.shape[2], frames.shape[1]) == tuple(size):
+        return list(frames)
+    return [cv2.resize(frame, size, interpolation=cv2.INTER_AREA) for frame in frames]
+
+def encode_size_for_params(proxy, params):
+    """代理帧上的试编码尺寸，以及外推到目标尺寸的大小系数（不放大代理帧）"""
+    target_width = max(10, min(2000, params.get('width') or proxy.source_width))
+    target_height = max(10, min(2000, params.get('height') or proxy.source_height))
+    ratio = min(1.0, proxy.width / target_width, proxy.height / target_height)
+    size = (max(2, int(round(target_width * ratio))), max(2, int(round(target_height * ratio))))
+    area_scale = ((target_width * target_height) / (size[0] * size[1])) ** AREA_EXPONENT
+    return size, area_scale
+
+def estimate_size_from_proxy(proxy, params, output_frames, cancelled=None, bursts=None, burst_frames=None):
+    """在代理帧上对整个时间轴分层抽样试编码，外推到完整输出，返回gif_estimator的预估结果
+
+    bursts/burst_frames 覆盖默认的抽样层数和burst长度（批量评估时用更少的抽样换取速度）。
+    """
+    fps = max(1, min(30, params.get('fps', 10)))
+
+    # 与正式转换一致的输出时间点
+    times = output_timestamps(
+        proxy.duration, fps, params.get('start_time'), params.get('end_time'), output_frames
+    )
+    size, area_scale = encode_size_for_params(proxy, params)
+
+    def read_frames(positions):
+        indices = proxy.nearest_indices(times[positions])
+        # 代理帧率低于目标帧率时相邻位置会取到同一代理帧，顺延为不同的帧以保留帧间变化
+        order = np.arange(len(indices))
+        indices = np.minimum(np.maximum.accumulate(indices - order) + order, proxy.count - 1)
+        return resize_frames(proxy.frames[indices], size)
+
+    return estimate_from_bursts(read_frames, len(times), fps, scale=area_scale, cancelled=cancelled,
+                                bursts=bursts, burst_frames=burst_frames, **encode_options(params))
@@ -0,0 +1,159 @@
+"""
+关键帧缩略图
+
+上传后在视频信息下方显示一组沿时间轴分布的缩略图，帮助选择裁剪区间、判断内容：
+- 只解码关键帧：按帧索引挑选最接近均匀时间点的关键帧，逐个跳转后只grab/retrieve该帧，
+  不解码中间的预测帧，耗时与关键帧数量有关而与视频长度无关
+- 关键帧过少（如整个视频只有首帧是关键帧）或无法跳转（可变帧率、非MP4容器）时，
+  退回按均匀时间点顺序读取
+- 缩略图按内容哈希缓存（进程内 + 与上传文件并列的.npz），同一内容只生成一次
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from temp_store import get_temp_store
+from video_index import get_frame_index, iter_frames
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except Exception:
+    cv2 = None
+    OPENCV_AVAILABLE = False
+
+# 缩略图配置
+THUMBNAIL_CONFIG = {
+    "count": 12,  # 缩略图数量上限
+    "min_keyframes": 4,  # 关键帧少于此数时退回按均匀时间点读取
+    "max_side": 160,  # 长边像素上限
+    "cache_size": 16  # 进程内缓存的视频数量
+}
+
+THUMBNAIL_SUFFIX = ".thumbs.npz"
+
+def select_keyframes(index, count):
+    """离均匀时间点最近的关键帧（去重，按帧号递增）"""
+    keyframes = index.keyframe_numbers
+    times = (np.arange(count) + 0.5) * index.duration / count
+    key_pts = index.pts[keyframes]
+    right = np.clip(np.searchsorted(key_pts, times), 1, max(1, len(keyframes) - 1))
+    left = right - 1
+    if len(keyframes) > 1:
+        choose_left = (times - key_pts[left]) <= (key_pts[right] - times)
+        chosen = np.where(choose_left, left, right)
+    else:
+        chosen = np.zeros(count, dtype=np.int64)
+    return np.unique(keyframes[chosen])
+
+def build_thumbnails(handle):
+    """按帧索引生成缩略图，返回 {'frames', 'timestamps', 'keyframes_only', 'elapsed'}，失败时返回None
+
+    frames 为 uint8 [N, H, W, 3] RGB，timestamps 为各缩略图的显示时间（秒）。
+    """
+    if not OPENCV_AVAILABLE:
+        return None
+    started = time.perf_counter()
+    metadata = handle.metadata()
+    index = get_frame_index(handle)
+    if not metadata or index is None or metadata['width'] <= 0 or metadata['height'] <= 0:
+        return None
+
+    count = THUMBNAIL_CONFIG["count"]
+    keyframes_only = (index.source == 'container' and not index.vfr
+                      and len(index.keyframe_numbers) >= THUMBNAIL_CONFIG["min_keyframes"])
+    if keyframes_only:
+        frame_numbers = select_keyframes(index, count)
+    else:
+        times = (np.arange(count) + 0.5) * index.duration / count
+        frame_numbers = np.unique(index.nearest_frames(times))
+
+    width, height = metadata['width'], metadata['height']
+    scale = min(1.0, THUMBNAIL_CONFIG["max_side"] / max(width, height))
+    size = (max(2, int(round(width * scale))), max(2, int(round(height * scale))))
+
+    frames = []
+    timestamps = []
+    with handle.capture() as cap:
+        if cap is None:
+            return None
+        # 目标帧就是关键帧，iter_frames 跳转到该关键帧后只grab这一帧
+        for frame_number, frame in iter_frames(cap, index, frame_numbers):
+            if (frame.shape[1], frame.shape[0]) != size:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            timestamps.append(index.pts[frame_number])
+
+    if not frames:
+        return None
+    return {
+        'frames': np.stack(frames),
+        'timestamps': np.asarray(timestamps, dtype=np.float64),
+        'keyframes_only': keyframes_only,
+        'elapsed': time.perf_counter() - started
+    }
+
+def _save(thumbnails, path):
+    tmp_path = path.with_name(path.name + ".tmp.npz")
+    np.savez_compressed(
+        tmp_path,
+        frames=thumbnails['frames'],
+        timestamps=thumbnails['timestamps'],
+        keyframes_only=np.array(thumbnails['keyframes_only'])
+    )
+    tmp_path.replace(path)
+
+def _load(path):
+    with np.load(path) as data:
+        return {
+            'frames': data['frames'],
+            'timestamps': data['timestamps'],
+            'keyframes_only': bool(data['keyframes_only']),
+            'elapsed': 0.0
+        }
+
+_thumbnails = OrderedDict()
+_thumbnails_lock = threading.Lock()
+
+def get_thumbnails(handle, build=True):
+    """获取视频的缩略图：内存缓存 → 磁盘文件 → 现场生成（build=True时）"""
+    content_hash = handle.content_hash
+    with _thumbnails_lock:
+        thumbnails = _thumbnails.get(content_hash)
+        if thumbnails is not None:
+            _thumbnails.move_to_end(content_hash)
+            return thumbnails
+
+    store = get_temp_store()
+    key = store.key_for_path(handle.path)
+    path = store.artifact_path(key, THUMBNAIL_SUFFIX) if key else None
+    thumbnails = None
+    if path is not None and path.exists():
+        try:
+            thumbnails = _load(path)
+        except Exception:
+            thumbnails = None
+    if thumbnails is None and build:
+        thumbnails = build_thumbnails(handle)
+        if thumbnails is not None and path is not None:
+            try:
+                _save(thumbnails, path)
+                store.register_artifact(key, THUMBNAIL_SUFFIX)
+            except Exception:
+                pass
+    if thumbnails is None:
+        return None
+
+    with _thumbnails_lock:
+        _thumbnails[content_hash] = thumbnails
+        while len(_thumbnails) > THUMBNAIL_CONFIG["cache_size"]:
+            _thumbnails.popitem(last=False)
+    return thumbnails
+
+def format_timestamp(seconds):
+    """缩略图标注的时间（分:秒.十分之一秒）"""
+    minutes, seconds = divmod(max(0.0, float(seconds)), 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
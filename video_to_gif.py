@@ -6,6 +6,8 @@ from pathlib import Path
 import numpy as np
 from PIL import Image
 import io
+import html
+import shutil
 import time
 import gc
 import json
@@ -29,6 +31,34 @@ except Exception as e:
     # 静默处理其他异常
     pass
 
+from temp_store import get_temp_store, session_id_from_state
+from video_handle import get_video_handle
+from video_proxy import get_proxy
+from video_index import get_frame_index
+from size_calibration import get_calibration_store
+from size_solver import is_satisfied
+from background_estimator import BACKGROUND_CONFIG, BackgroundEstimator
+from conversion_jobs import FINISHED_STATES, JobQueueFull, get_job_queue
+from result_cache import get_result_cache
+from session_budget import artifacts_from_state, get_session_budget
+from pareto_explorer import explore
+from quality_metrics import is_dominated
+from progressive_preview import build_preview
+from video_thumbnails import THUMBNAIL_CONFIG, format_timestamp, get_thumbnails
+from batch_convert import BATCH_CONFIG, convert_batch
+import gif_engine
+from gif_engine import (convert_video, measure_params_quality, plan_output_frame_count, safe_encode_string,
+                        size_estimate_cache_key)
+from output_delivery import (fits_in_memory, prune_outputs, publish_output, read_output, store_output,
+                             store_output_file, withdraw_outputs)
+
+# 后台预估需要把会话的运行上下文绑定到工作线程，才能读写session_state
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    BACKGROUND_ESTIMATE_AVAILABLE = True
+except ImportError:
+    BACKGROUND_ESTIMATE_AVAILABLE = False
+
 # 尝试导入OpenAI
 try:
     from openai import OpenAI
@@ -208,21 +238,6 @@ def check_api_key():
     """检查API密钥是否已设置"""
     return st.session_state.get("api_key") is not None
 
-def safe_encode_string(text):
-    """安全地处理字符串编码，避免ASCII错误"""
-    if not text:
-        return ""
-    
-    try:
-        # 尝试编码为UTF-8然后解码，确保字符串是安全的
-        if isinstance(text, str):
-            return text.encode('utf-8').decode('utf-8')
-        else:
-            return str(text).encode('utf-8').decode('utf-8')
-    except (UnicodeEncodeError, UnicodeDecodeError):
-        # 如果出现编码问题，移除非ASCII字符
-        return ''.join(char for char in str(text) if ord(char) < 128)
-
 def test_api_connection():
     """测试API连接是否正常"""
     client = get_ai_client()
@@ -270,15 +285,17 @@ def init_session_state():
     """初始化会话状态"""
     if 'video_file' not in st.session_state:
         st.session_state.video_file = None
-    if 'gif_data' not in st.session_state:
-        st.session_state.gif_data = None
+    if 'gif_output' not in st.session_state:
+        st.session_state.gif_output = None
     if 'conversion_params' not in st.session_state:
         st.session_state.conversion_params = {
             'fps': 10,
             'quality': 85,
             'width': None,
             'height': None,
-            'optimize': True
+            'optimize': True,
+            'colors': 256,
+            'lossy': 0
         }
     if 'size_constraint' not in st.session_state:
         st.session_state.size_constraint = {
@@ -290,23 +307,38 @@ def init_session_state():
         }
     if 'ai_suggestions' not in st.session_state:
         st.session_state.ai_suggestions = []
+    
+    # 会话心跳，避免活跃会话的临时文件被后台回收
+    try:
+        get_temp_store().touch_session(session_id_from_state(st.session_state))
+    except Exception:
+        pass
 
 def reset_agent():
     """重置智能体状态 - 完全重置所有状态，包括上传的文件"""
     # 清理临时文件
     cleanup_temp_files()
     
+    # 取消进行中的后台预估和本会话的后台转换任务
+    if 'background_estimator' in st.session_state:
+        st.session_state.background_estimator.cancel()
+    get_job_queue().cancel_session(session_id_from_state(st.session_state))
+    
     # 清除所有可能影响UI的会话状态
     keys_to_clear = [
-        'video_file', 'gif_data', 'conversion_params', 'size_constraint', 
-        'ai_suggestions', 'uploaded_file', 'ai_suggestions_cache', 
-        'size_estimate_cache', 'last_params_state_key', 'cached_estimated_size',
-        'cached_constraint_satisfied', 'cached_constraint'
+        'video_file', 'gif_output', 'conversion_params', 'size_constraint', 
+        'ai_suggestions', 'uploaded_file', 'last_params_state_key',
+        'stored_upload', 'last_solver_report', 'background_estimator', 'shown_estimate_key',
+        'conversion_job', 'batch_job'
     ]
     
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
+    artifacts = session_artifacts()
+    for name in ('ai_suggestions_cache', 'size_estimate_cache', 'size_estimate_intervals', 'cached_panel_estimate',
+                 'conversion_preview'):
+        artifacts.discard(name)
     
     # 重新初始化会话状态
     init_session_state()
@@ -317,146 +349,11 @@ def reset_agent():
     # 强制重新运行页面，清除所有UI状态
     st.rerun()
 
-def validate_video_file(video_path):
-    """验证视频文件的完整性和可读性"""
-    try:
-        # 检查OpenCV是否可用
-        if not OPENCV_AVAILABLE or cv2 is None:
-            return False, "OpenCV不可用"
-            
-        # 检查文件是否存在
-        if not os.path.exists(video_path):
-            return False, "文件不存在"
-        
-        # 检查文件大小
-        file_size = os.path.getsize(video_path)
-        if file_size == 0:
-            return False, "文件为空"
-        
-        if file_size < 1024:  # 小于1KB，可能是损坏的文件
-            return False, "文件太小，可能已损坏"
-        
-        # 尝试打开视频文件进行基本验证
-        cap = None
-        try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                if cap:
-                    cap.release()
-                return False, "无法打开视频文件"
-            
-            # 尝试读取第一帧以验证文件完整性
-            ret, frame = cap.read()
-            if cap:
-                cap.release()
-            
-            if not ret or frame is None:
-                return False, "无法读取视频帧，文件可能已损坏"
-            
-            return True, "文件验证通过"
-            
-        except Exception as e:
-            if cap:
-                cap.release()
-            return False, f"视频处理失败: {str(e)}"
-        
-    except Exception as e:
-        return False, f"文件验证失败: {str(e)}"
-
 def analyze_video_properties(video_path):
-    """分析视频属性 - 增强版本，具有更强的错误处理"""
-    try:
-        # 检查OpenCV是否可用
-        if not OPENCV_AVAILABLE or cv2 is None:
-            st.error("❌ OpenCV不可用，无法分析视频文件")
-            return None
-            
-        # 首先验证视频文件
-        is_valid, message = validate_video_file(video_path)
-        if not is_valid:
-            st.error(f"❌ 视频文件验证失败: {message}")
-            return None
-        
-        # 使用更安全的方式打开视频
-        cap = None
-        try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                st.error("❌ 无法打开视频文件，可能是格式不支持或文件已损坏")
-                return None
-        except Exception as e:
-            st.error(f"❌ 打开视频文件失败: {str(e)}")
-            return None
-        
-        try:
-            # 获取基础视频属性，添加默认值防护
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            # 验证获取的属性是否合理
-            if fps <= 0 or fps > 120:  # FPS不合理
-                fps = 25.0  # 使用默认FPS
-                st.warning("⚠️ 检测到异常帧率，使用默认值25FPS")
-            
-            if frame_count <= 0:  # 帧数不合理
-                frame_count = 1
-                st.warning("⚠️ 无法获取准确帧数，使用估算值")
-            
-            if width <= 0 or height <= 0 or width > 4000 or height > 4000:  # 分辨率不合理
-                st.error("❌ 检测到异常的视频分辨率，无法处理此视频")
-                cap.release()
-                return None
-            
-            # 计算时长
-            duration = frame_count / fps if fps > 0 else 1.0
-            
-            # 获取文件大小
-            file_size = os.path.getsize(video_path)
-            
-            # 尝试读取一帧以进一步验证文件完整性
-            test_frame_read = False
-            try:
-                ret, frame = cap.read()
-                if ret and frame is not None:
-                    test_frame_read = True
-                # 回到开始位置
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            except Exception as e:
-                st.warning(f"⚠️ 读取测试帧时出现问题: {str(e)}")
-            
-            cap.release()
-            
-            if not test_frame_read:
-                st.error("❌ 无法读取视频帧，文件可能已损坏或格式不兼容")
-                return None
-            
-            video_props = {
-                'fps': fps,
-                'frame_count': frame_count,
-                'width': width,
-                'height': height,
-                'duration': duration,
-                'file_size': file_size
-            }
-            
-            # 显示成功信息
-            st.success("✅ 视频分析完成")
-            
-            return video_props
-            
-        except Exception as e:
-            cap.release()
-            st.error(f"❌ 分析视频属性时出错: {str(e)}")
-            return None
-            
-    except Exception as e:
-        st.error(f"❌ 视频分析失败: {str(e)}")
-        st.info("💡 这可能是由于视频文件损坏、格式不支持或编码问题导致的")
-        return None
+    """分析视频属性（分析流程见gif_engine），提示消息输出到页面"""
+    return gif_engine.analyze_video_properties(video_path, streamlit_notify)
 
-def generate_ai_suggestions(video_props, user_input=""):
+def generate_ai_suggestions(video_props, user_input="", video_path=None):
     """生成AI建议 - 使用真实AI大模型分析用户意图和视频特征"""
     
     # 检查API密钥
@@ -474,13 +371,12 @@ def generate_ai_suggestions(video_props, user_input=""):
     user_hash = hashlib.md5(user_input_safe.encode('utf-8')).hexdigest()[:8]
     cache_key = f"{video_props['width']}x{video_props['height']}_{video_props['fps']:.1f}fps_{video_props['duration']:.1f}s_{user_hash}"
     
-    # 检查会话状态中的缓存
-    if 'ai_suggestions_cache' not in st.session_state:
-        st.session_state.ai_suggestions_cache = {}
+    # 检查会话条目中的缓存（受会话内存预算管理，可能已被回收）
+    suggestions_cache = session_artifacts().setdefault('ai_suggestions_cache', {})
     
     # 如果缓存中存在相同的建议，直接返回
-    if cache_key in st.session_state.ai_suggestions_cache:
-        cached_suggestions = st.session_state.ai_suggestions_cache[cache_key]
+    if cache_key in suggestions_cache:
+        cached_suggestions = suggestions_cache[cache_key]
         st.success(f"✅ 已加载缓存的AI建议（{len(cached_suggestions)} 个方案）")
         return cached_suggestions
     
@@ -570,8 +466,8 @@ def generate_ai_suggestions(video_props, user_input=""):
                     # 如果是最后一次尝试
                     if attempt == max_retries - 1:
                         # 静默失败，使用默认建议
-                        fallback_suggestions = get_fallback_suggestions(video_props, user_input)
-                        st.session_state.ai_suggestions_cache[cache_key] = fallback_suggestions
+                        fallback_suggestions = get_fallback_suggestions(video_props, user_input, video_path)
+                        suggestions_cache[cache_key] = fallback_suggestions
                         return fallback_suggestions
                     else:
                         # 静默重试
@@ -581,8 +477,8 @@ def generate_ai_suggestions(video_props, user_input=""):
             
             # 如果ai_response为空，使用默认建议
             if not ai_response:
-                fallback_suggestions = get_fallback_suggestions(video_props, user_input)
-                st.session_state.ai_suggestions_cache[cache_key] = fallback_suggestions
+                fallback_suggestions = get_fallback_suggestions(video_props, user_input, video_path)
+                suggestions_cache[cache_key] = fallback_suggestions
                 return fallback_suggestions
             
             # 解析AI响应
@@ -617,7 +513,8 @@ def generate_ai_suggestions(video_props, user_input=""):
                                 adjusted_params = adjust_params_for_constraint(
                                     video_props, 
                                     suggestion['params'], 
-                                    constraint
+                                    constraint,
+                                    video_path
                                 )
                                 
                                 # 更新建议的参数为调整后的参数
@@ -627,7 +524,8 @@ def generate_ai_suggestions(video_props, user_input=""):
                                 satisfied, estimated_size = validate_params_against_constraint(
                                     video_props, 
                                     adjusted_params, 
-                                    constraint
+                                    constraint,
+                                    video_path
                                 )
                                 
                                 # 如果仍然不满足，调整约束
@@ -641,35 +539,37 @@ def generate_ai_suggestions(video_props, user_input=""):
                                     if "（预估" not in suggestion['description']:
                                         suggestion['description'] += f"（预估约{new_target_mb:.1f}MB）"
                                 
-                                # 添加预估大小信息
-                                suggestion['estimated_size'] = estimate_gif_size(video_props, adjusted_params)
+                                # 添加预估大小和实测质量信息
+                                suggestion['estimated_size'] = estimate_gif_size(video_props, adjusted_params, video_path)
+                                suggestion['measured_quality'] = measure_params_quality(adjusted_params, video_path)
                             
                             # 清理和标准化建议数据
                             sanitized_suggestion = sanitize_suggestion(suggestion)
                             validated_suggestions.append(sanitized_suggestion)
                     
                     if validated_suggestions:
+                        validated_suggestions = rank_suggestions_by_quality(validated_suggestions)
                         # 缓存有效的建议
-                        st.session_state.ai_suggestions_cache[cache_key] = validated_suggestions
+                        suggestions_cache[cache_key] = validated_suggestions
                         st.success(f"✅ AI成功生成了 {len(validated_suggestions)} 个专业建议")
                         return validated_suggestions
                     else:
                         st.warning("⚠️ AI生成的建议格式有误，使用默认建议")
-                        fallback_suggestions = get_fallback_suggestions(video_props, user_input)
+                        fallback_suggestions = get_fallback_suggestions(video_props, user_input, video_path)
                         # 也缓存备选建议
-                        st.session_state.ai_suggestions_cache[cache_key] = fallback_suggestions
+                        suggestions_cache[cache_key] = fallback_suggestions
                         return fallback_suggestions
                 
                 else:
                     st.warning("⚠️ AI响应格式异常，使用默认建议")
-                    fallback_suggestions = get_fallback_suggestions(video_props, user_input)
-                    st.session_state.ai_suggestions_cache[cache_key] = fallback_suggestions
+                    fallback_suggestions = get_fallback_suggestions(video_props, user_input, video_path)
+                    suggestions_cache[cache_key] = fallback_suggestions
                     return fallback_suggestions
                     
             except json.JSONDecodeError as e:
                 st.warning(f"⚠️ AI响应解析失败: {str(e)}")
-                fallback_suggestions = get_fallback_suggestions(video_props, user_input)
-                st.session_state.ai_suggestions_cache[cache_key] = fallback_suggestions
+                fallback_suggestions = get_fallback_suggestions(video_props, user_input, video_path)
+                suggestions_cache[cache_key] = fallback_suggestions
                 return fallback_suggestions
                 
     except Exception as e:
@@ -680,8 +580,8 @@ def generate_ai_suggestions(video_props, user_input=""):
         
         st.error(f"❌ AI分析失败: {error_msg}")
         st.info("💡 将使用默认建议作为备选方案")
-        fallback_suggestions = get_fallback_suggestions(video_props, user_input)
-        st.session_state.ai_suggestions_cache[cache_key] = fallback_suggestions
+        fallback_suggestions = get_fallback_suggestions(video_props, user_input, video_path)
+        suggestions_cache[cache_key] = fallback_suggestions
         return fallback_suggestions
 
 def validate_suggestion(suggestion, video_props):
@@ -799,6 +699,11 @@ def sanitize_suggestion(suggestion):
             except (ValueError, TypeError):
                 pass
         
+        # 保留实测质量（如果存在）
+        measured = suggestion.get('measured_quality')
+        if isinstance(measured, dict) and measured.get('ssim') is not None:
+            sanitized['measured_quality'] = {'ssim': float(measured['ssim']), 'psnr': float(measured['psnr'])}
+        
         return sanitized
         
     except Exception:
@@ -822,7 +727,17 @@ def sanitize_suggestion(suggestion):
             }
         }
 
-def get_fallback_suggestions(video_props, user_input=""):
+def rank_suggestions_by_quality(suggestions):
+    """按实测质量排列建议：存在文件不更大、质量明显更高的其他建议时排到后面（保持原有相对顺序）"""
+    candidates = [
+        {'size': suggestion['estimated_size'], 'ssim': suggestion['measured_quality']['ssim']}
+        if suggestion.get('estimated_size') and suggestion.get('measured_quality') else {}
+        for suggestion in suggestions
+    ]
+    order = sorted(range(len(suggestions)), key=lambda i: is_dominated(candidates[i], candidates))
+    return [suggestions[i] for i in order]
+
+def get_fallback_suggestions(video_props, user_input="", video_path=None):
     """获取备选建议（当AI失败时使用）- 基于实际预估的智能建议"""
     fps = video_props['fps']
     width = video_props['width']
@@ -888,10 +803,10 @@ def get_fallback_suggestions(video_props, user_input=""):
         }
         
         # 调整参数以满足大小约束
-        adjusted_params = adjust_params_for_constraint(video_props, template['params'], size_constraint)
+        adjusted_params = adjust_params_for_constraint(video_props, template['params'], size_constraint, video_path)
         
         # 验证调整后的参数
-        satisfied, estimated_size = validate_params_against_constraint(video_props, adjusted_params, size_constraint)
+        satisfied, estimated_size = validate_params_against_constraint(video_props, adjusted_params, size_constraint, video_path)
         
         # 如果仍然不满足约束，进一步调整目标大小
         if not satisfied and estimated_size:
@@ -916,367 +831,202 @@ def get_fallback_suggestions(video_props, user_input=""):
             'description': template['description'],
             'params': adjusted_params,
             'size_constraint': size_constraint,
-            'estimated_size': estimate_gif_size(video_props, adjusted_params)
+            'estimated_size': estimate_gif_size(video_props, adjusted_params, video_path),
+            'measured_quality': measure_params_quality(adjusted_params, video_path)
         }
         
         # 清理和标准化建议数据
         sanitized_suggestion = sanitize_suggestion(suggestion)
         suggestions.append(sanitized_suggestion)
     
-    return suggestions
+    return rank_suggestions_by_quality(suggestions)
 
-def get_real_gif_size_preview(video_path, params):
-    """通过真实转换获得准确的GIF文件大小预估 - 高性能优化版本，增强错误处理"""
-    cap = None
-    try:
-        # 检查OpenCV可用性
-        if not OPENCV_AVAILABLE or cv2 is None:
-            return None
-            
-        # 首先验证视频文件
-        is_valid, message = validate_video_file(video_path)
-        if not is_valid:
-            return None
-        
-        # 安全地打开视频文件
-        try:
-            cap = cv2.VideoCapture(video_path)
-        except Exception as e:
-            return None
-            
-        if not cap.isOpened():
-            if cap:
-                cap.release()
-            return None
-        
-        # 预分配变量，增加安全检查
-        fps = max(1, min(30, params.get('fps', 10)))  # 限制FPS范围
-        target_width = max(10, min(2000, params.get('width', 640)))  # 限制宽度范围
-        target_height = max(10, min(2000, params.get('height', 480)))  # 限制高度范围
-        quality = max(50, min(100, params.get('quality', 85)))  # 限制质量范围
-        
-        # 安全地获取视频属性
-        try:
-            original_fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        except Exception as e:
-            cap.release()
-            return None
-        
-        # 验证获取的属性
-        if original_fps <= 0 or original_fps > 120:
-            original_fps = 25.0  # 使用默认值
-        
-        if total_frames <= 0:
-            total_frames = 100  # 使用默认值
-        
-        # 计算采样间隔，添加边界检查
-        sample_interval = max(1, int(original_fps / fps)) if original_fps > 0 else 1
-        
-        # 限制预估时的帧数以提高速度和稳定性
-        max_preview_frames = min(30, total_frames // sample_interval)  # 大幅减少预估帧数
-        if max_preview_frames <= 0:
-            max_preview_frames = 5  # 最少处理5帧
-        
-        # 预分配帧数组
-        frames = []
-        frame_count = 0
-        processed_frames = 0
-        max_read_attempts = max_preview_frames * 3  # 防止无限循环
-        read_attempts = 0
-        
-        # 预设置resize插值方法
-        resize_interpolation = cv2.INTER_LINEAR
-        
-        # 安全的帧读取循环
-        while processed_frames < max_preview_frames and read_attempts < max_read_attempts:
-            try:
-                ret, frame = cap.read()
-                read_attempts += 1
-                
-                if not ret or frame is None:
-                    break
-                
-                # 按间隔采样
-                if frame_count % sample_interval == 0:
-                    try:
-                        # 验证帧的有效性
-                        if frame.shape[0] <= 0 or frame.shape[1] <= 0:
-                            frame_count += 1
-                            continue
-                        
-                        # 安全地调整尺寸
-                        if target_width and target_height:
-                            try:
-                                frame = cv2.resize(frame, (target_width, target_height), interpolation=resize_interpolation)
-                            except Exception as resize_e:
-                                # 如果resize失败，跳过这一帧
-                                frame_count += 1
-                                continue
-                        
-                        # 安全地进行颜色转换
-                        try:
-                            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        except Exception as color_e:
-                            # 如果颜色转换失败，跳过这一帧
-                            frame_count += 1
-                            continue
-                        
-                        # 转换为PIL图像
-                        try:
-                            pil_image = Image.fromarray(frame_rgb)
-                            frames.append(pil_image)
-                            processed_frames += 1
-                        except Exception as pil_e:
-                            # 如果PIL转换失败，跳过这一帧
-                            frame_count += 1
-                            continue
-                            
-                    except Exception as frame_e:
-                        # 处理单帧时的任何异常，继续处理下一帧
-                        pass
-                
-                frame_count += 1
-                
-            except Exception as read_e:
-                # 读取帧时的异常，尝试继续
-                read_attempts += 1
-                if read_attempts >= max_read_attempts:
-                    break
-                continue
-        
-        # 安全释放资源
-        if cap:
-            cap.release()
-        
-        # 检查是否成功处理了足够的帧
-        if not frames or len(frames) < 2:
-            return None
-        
-        # 安全地创建GIF
-        try:
-            gif_buffer = io.BytesIO()
-            gif_duration = max(50, int(1000 / fps))  # 确保duration不会太小
-            
-            # 使用更保守的参数以避免错误
-            frames[0].save(
-                gif_buffer,
-                format='GIF',
-                save_all=True,
-                append_images=frames[1:],
-                duration=gif_duration,
-                loop=0,
-                optimize=bool(params.get('optimize', True)),
-                quality=quality
-            )
-            
-            gif_buffer.seek(0)
-            gif_data = gif_buffer.getvalue()
-            
-            # 验证生成的GIF数据
-            if len(gif_data) > 0:
-                return len(gif_data)
-            else:
-                return None
-            
-        except Exception as gif_e:
-            return None
-        
-    except Exception as e:
-        # 捕获所有未预期的异常
-        if cap:
-            cap.release()
-        return None
+def estimate_gif_size(video_props, params, video_path=None, confirm=False, cancelled=None):
+    """预估GIF文件大小（预估流程见gif_engine），预估缓存保存在当前会话的条目中"""
+    return gif_engine.estimate_gif_size(video_props, params, video_path, confirm, cancelled, session_artifacts())
 
-def get_fallback_estimate_size(video_props, params):
-    """获取备用的文件大小估算"""
-    try:
-        # 基于视频属性和参数进行数学估算
-        width = params.get('width', 640)
-        height = params.get('height', 480)
-        fps = params.get('fps', 10)
-        quality = params.get('quality', 85)
-        duration = video_props.get('duration', 10)
-        
-        # 基础估算公式（经验值）
-        # 考虑分辨率、帧率、质量和时长
-        pixels_per_frame = width * height
-        total_frames = fps * duration
-        
-        # 每像素每帧的估算字节数（根据质量调整）
-        bytes_per_pixel_frame = (quality / 100) * 0.8  # 基础值
-        
-        # 计算基础大小
-        base_size = pixels_per_frame * total_frames * bytes_per_pixel_frame
-        
-        # 应用压缩因子（GIF压缩效率）
-        compression_factor = 0.3  # GIF的平均压缩率
-        estimated_size = base_size * compression_factor
-        
-        # 添加一些变化范围，确保估算在合理范围内
-        min_size = 10 * 1024  # 最小10KB
-        max_size = 50 * 1024 * 1024  # 最大50MB
-        
-        estimated_size = max(min_size, min(max_size, estimated_size))
-        
-        return int(estimated_size)
-        
-    except Exception as e:
-        # 如果备用估算也失败，返回保守估计
-        return video_props.get('file_size', 5 * 1024 * 1024) // 4
+def validate_params_against_constraint(video_props, params, size_constraint, video_path=None, confirm=False):
+    """验证参数是否能满足大小约束（使用当前会话的预估缓存）"""
+    return gif_engine.validate_params_against_constraint(
+        video_props, params, size_constraint, video_path, confirm, session_artifacts()
+    )
+
+def adjust_params_for_constraint(video_props, base_params, size_constraint, video_path=None):
+    """根据大小约束求解参数，求解过程记录到会话状态供界面显示"""
+    report = {}
+    params = gif_engine.adjust_params_for_constraint(
+        video_props, base_params, size_constraint, video_path, session_artifacts(), report
+    )
+    if report:
+        st.session_state.last_solver_report = report
+    return params
+
+def get_background_estimator():
+    """当前会话的后台预估器"""
+    if 'background_estimator' not in st.session_state:
+        st.session_state.background_estimator = BackgroundEstimator()
+    return st.session_state.background_estimator
+
+def compute_panel_estimate(video_props, params, size_constraint, video_path=None, cancelled=None):
+    """参数面板的预估（见gif_engine.compute_panel_estimate），使用当前会话的预估缓存，可在后台线程执行"""
+    return gif_engine.compute_panel_estimate(
+        video_props, params, size_constraint, video_path, cancelled, session_artifacts()
+    )
 
-def estimate_gif_size(video_props, params, video_path=None):
-    """预估GIF文件大小 - 使用真实转换获得准确预估，带备用机制"""
+def render_panel_estimate(panel_estimate, stale=False):
+    """显示参数面板的预估结果，stale=True时标记为旧参数的结果"""
+    estimated_size = panel_estimate['estimated_size']
+    estimate_interval = panel_estimate['interval']
+    satisfied = panel_estimate['satisfied']
+    constraint = panel_estimate['constraint']
     
-    # 验证输入参数
-    if not video_props or not params:
-        return 1024 * 1024  # 返回1MB作为默认值
+    if constraint:
+        target_size_mb = constraint['target_size'] / (1024 * 1024)
+        target_size_kb = constraint['target_size'] / 1024
+        
+        if target_size_mb >= 1:
+            target_display = f"{target_size_mb:.1f}MB"
+        else:
+            target_display = f"{target_size_kb:.0f}KB"
     
-    # 生成参数缓存键
-    try:
-        params_key = f"{params.get('width', 0)}x{params.get('height', 0)}_{params.get('fps', 10)}fps_{params.get('quality', 85)}q"
-    except Exception:
-        params_key = "default_params"
+    # 显示预估结果
+    estimated_mb = estimated_size / (1024 * 1024)
+    estimated_kb = estimated_size / 1024
     
-    # 初始化预估缓存
-    if 'size_estimate_cache' not in st.session_state:
-        st.session_state.size_estimate_cache = {}
+    if estimated_mb >= 1:
+        size_display = f"{estimated_mb:.2f}MB"
+    else:
+        size_display = f"{estimated_kb:.1f}KB"
     
-    # 检查缓存
-    if params_key in st.session_state.size_estimate_cache:
-        cached_size = st.session_state.size_estimate_cache[params_key]
-        if cached_size and cached_size > 0:
-            return cached_size
+    # 抽样预估附带95%置信区间
+    if estimate_interval and estimate_interval[1] > estimate_interval[0]:
+        low, high = estimate_interval
+        if estimated_mb >= 1:
+            size_display += f"（95%区间 {low / (1024 * 1024):.2f}–{high / (1024 * 1024):.2f}MB）"
+        else:
+            size_display += f"（95%区间 {low / 1024:.1f}–{high / 1024:.1f}KB）"
     
-    estimated_size = None
+    # 如果有约束，在一个信息中显示预估大小和约束状态
+    if constraint and constraint.get('enabled', False):
+        if satisfied:
+            st.success(f"✅ 基于当前参数文件转换后的预估大小为: {size_display} (满足约束 {constraint['operator']} {target_display})")
+        else:
+            st.warning(f"⚠️ 基于当前参数文件转换后的预估大小为: {size_display} (不满足约束 {constraint['operator']} {target_display})")
+    else:
+        st.info(f"📊 基于当前参数文件转换后的预估大小为: {size_display}")
     
-    # 首先尝试真实转换预估（只有在视频文件有效时）
-    if video_path and os.path.exists(video_path):
-        try:
-            # 验证视频文件状态
-            is_valid, _ = validate_video_file(video_path)
-            if is_valid:
-                estimated_size = get_real_gif_size_preview(video_path, params)
-        except Exception as e:
-            estimated_size = None
+    # 约束求解的评估次数和余量
+    solver_report = panel_estimate['solver_report']
+    if constraint and constraint.get('enabled', False) and solver_report and solver_report['margin'] is not None:
+        quality_note = f"，实测SSIM {solver_report['ssim']:.3f}" if solver_report.get('ssim') is not None else ""
+        st.caption(
+            f"🧮 参数求解：评估{solver_report['evaluations']}次，"
+            f"预估大小距目标余量 {solver_report['margin']:+.1%}{quality_note}"
+        )
     
-    # 如果真实转换失败，重试或使用保守估计
-    if estimated_size is None or estimated_size <= 0:
-        # 再次尝试真实转换预估，使用更宽松的参数
-        if video_path and os.path.exists(video_path):
+    if stale:
+        st.caption("⏳ 参数已变化，正在后台更新预估（当前显示的是上一次的结果）")
+
+def current_scale_ratio(video_info):
+    """当前参数对应的缩放比例（按滑块步长取整），应用建议或前沿参数后滑块随之更新"""
+    width = st.session_state.conversion_params.get('width')
+    if not width or not video_info.get('width'):
+        return 1.0
+    return max(0.1, min(2.0, round(width / video_info['width'], 1)))
+
+def format_size(size):
+    """字节数显示为MB或KB"""
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.2f}MB"
+    return f"{size / 1024:.1f}KB"
+
+def render_pareto_explorer(video_info, video_path):
+    """大小-质量帕累托前沿：在代理帧上评估参数网格，图表展示前沿，一键应用"""
+    with st.expander("📈 大小-质量权衡探索", expanded=False):
+        st.caption("在代理帧上评估分辨率、帧率、调色板颜色数和有损级别的组合，找出每个文件大小下质量最高的参数")
+        if not OPENCV_AVAILABLE or not video_path or not os.path.exists(video_path):
+            st.info("💡 需要OpenCV和已上传的视频才能探索参数")
+            return
+        
+        base = dict(st.session_state.conversion_params)
+        if not base.get('width') or not base.get('height'):
+            base.update(width=video_info['width'], height=video_info['height'])
+        base_key = size_estimate_cache_key(base, video_path)
+        
+        artifacts = session_artifacts()
+        previous = artifacts.get('pareto_result')
+        # 基准参数变化后前沿不再对应当前参数，重新探索（已评估的点仍由缓存复用）
+        if previous is not None and previous['base_key'] != base_key:
+            previous = None
+        
+        col_explore, col_refine = st.columns(2)
+        with col_explore:
+            start_clicked = st.button("🔍 开始探索", use_container_width=True, key="pareto_explore")
+        with col_refine:
+            refine_clicked = st.button(
+                "🔬 细化网格", use_container_width=True, key="pareto_refine",
+                help="在当前前沿附近加密网格，已评估的点直接复用（尚未探索时从初始网格开始）"
+            )
+        
+        if start_clicked or refine_clicked:
+            handle = get_video_handle(video_path)
+            proxy = get_proxy(handle)
+            if proxy is None:
+                st.warning("⚠️ 代理帧不可用，无法探索参数")
+                return
+            progress_bar = st.progress(0)
+            
+            def update_progress(done, total):
+                progress_bar.progress(done / max(1, total), text=f"正在评估参数组合... {done}/{total}")
+            
             try:
-                # 使用简化参数重试
-                simplified_params = params.copy()
-                simplified_params['width'] = min(simplified_params.get('width', 320), 320)
-                simplified_params['height'] = min(simplified_params.get('height', 240), 240)
-                simplified_params['fps'] = min(simplified_params.get('fps', 5), 5)
-                
-                estimated_size = get_real_gif_size_preview(video_path, simplified_params)
-                if estimated_size and estimated_size > 0:
-                    # 根据原始参数调整估算大小
-                    scale_factor = (params.get('width', 320) * params.get('height', 240)) / (simplified_params['width'] * simplified_params['height'])
-                    fps_factor = params.get('fps', 10) / simplified_params['fps']
-                    quality_factor = params.get('quality', 85) / 85
-                    
-                    estimated_size = int(estimated_size * scale_factor * fps_factor * quality_factor)
-            except Exception:
-                estimated_size = None
+                result = explore(
+                    proxy, handle.content_hash, base, plan_output_frame_count(video_info, base),
+                    (video_info['width'], video_info['height']),
+                    previous=previous if refine_clicked else None, progress=update_progress
+                )
+            except Exception as e:
+                st.error(f"❌ 参数探索失败: {str(e)}")
+                return
+            progress_bar.empty()
+            result['base_key'] = base_key
+            artifacts.put('pareto_result', result)
+            previous = result
+            st.caption(f"🧮 新评估{result['evaluated']}组参数，复用缓存{result['reused']}组，网格每维{result['levels']}个取值")
+        
+        if previous is None:
+            return
         
-        # 如果仍然失败，使用基于视频文件大小的保守估计
-        if estimated_size is None or estimated_size <= 0:
-            file_size = video_props.get('file_size', 5 * 1024 * 1024)
-            # 基于视频文件大小的简单估算：通常GIF是视频大小的1/3到1/2
-            estimated_size = max(10 * 1024, file_size // 3)  # 最少10KB
-    
-    # 验证估算结果的合理性
-    if estimated_size is None or estimated_size <= 0:
-        estimated_size = 1024 * 1024  # 默认1MB
-    
-    # 缓存结果
-    try:
-        st.session_state.size_estimate_cache[params_key] = estimated_size
-    except Exception:
-        pass  # 缓存失败不影响功能
-    
-    return estimated_size
-
-def validate_params_against_constraint(video_props, params, size_constraint, video_path=None):
-    """验证参数是否能满足大小约束"""
-    if not size_constraint or not size_constraint.get('enabled'):
-        return True, None
-    
-    estimated_size = estimate_gif_size(video_props, params, video_path)
-    target_size = size_constraint['target_size']
-    operator = size_constraint['operator']
-    
-    # 检查是否满足约束
-    satisfied = False
-    if operator == '<':
-        satisfied = estimated_size < target_size
-    elif operator == '<=':
-        satisfied = estimated_size <= target_size
-    elif operator == '>':
-        satisfied = estimated_size > target_size
-    elif operator == '>=':
-        satisfied = estimated_size >= target_size
-    elif operator == '=':
-        # 允许10%的误差
-        satisfied = abs(estimated_size - target_size) / target_size <= 0.1
-    
-    return satisfied, estimated_size
-
-def adjust_params_for_constraint(video_props, base_params, size_constraint, video_path=None):
-    """根据大小约束调整参数"""
-    if not size_constraint or not size_constraint.get('enabled'):
-        return base_params
-    
-    target_size = size_constraint['target_size']
-    operator = size_constraint['operator']
-    
-    # 只对小于类型的约束进行自动调整
-    if operator not in ['<', '<=']:
-        return base_params
-    
-    # 创建参数副本
-    adjusted_params = base_params.copy()
-    
-    # 预估当前参数的文件大小
-    current_estimated = estimate_gif_size(video_props, adjusted_params, video_path)
-    
-    if current_estimated <= target_size:
-        return adjusted_params
-    
-    # 需要压缩，计算压缩比例
-    compression_ratio = target_size / current_estimated
-    
-    # 保守的调整策略
-    if compression_ratio >= 0.8:
-        # 轻微调整
-        adjusted_params['quality'] = max(75, int(adjusted_params['quality'] * 0.95))
-        adjusted_params['fps'] = max(8, int(adjusted_params['fps'] * 0.9))
-    elif compression_ratio >= 0.6:
-        # 中等调整
-        scale_factor = compression_ratio ** 0.3
-        adjusted_params['width'] = max(160, int(adjusted_params['width'] * scale_factor))
-        adjusted_params['height'] = max(120, int(adjusted_params['height'] * scale_factor))
-        adjusted_params['quality'] = max(70, int(adjusted_params['quality'] * 0.9))
-        adjusted_params['fps'] = max(6, int(adjusted_params['fps'] * 0.8))
-    elif compression_ratio >= 0.4:
-        # 较大调整
-        scale_factor = compression_ratio ** 0.4
-        adjusted_params['width'] = max(120, int(adjusted_params['width'] * scale_factor))
-        adjusted_params['height'] = max(90, int(adjusted_params['height'] * scale_factor))
-        adjusted_params['quality'] = max(65, int(adjusted_params['quality'] * 0.85))
-        adjusted_params['fps'] = max(5, int(adjusted_params['fps'] * 0.7))
-    else:
-        # 激进调整
-        scale_factor = compression_ratio ** 0.5
-        adjusted_params['width'] = max(80, int(adjusted_params['width'] * scale_factor))
-        adjusted_params['height'] = max(60, int(adjusted_params['height'] * scale_factor))
-        adjusted_params['quality'] = max(60, int(adjusted_params['quality'] * 0.8))
-        adjusted_params['fps'] = max(4, int(adjusted_params['fps'] * 0.6))
-    
-    return adjusted_params
+        frontier = previous['frontier']
+        frontier_ids = {id(point) for point in frontier}
+        st.scatter_chart(
+            {
+                '预估大小(KB)': [point['size'] / 1024 for point in previous['points']],
+                '质量(SSIM)': [round(point['quality'], 3) for point in previous['points']],
+                '类型': ['帕累托前沿' if id(point) in frontier_ids else '其他组合' for point in previous['points']]
+            },
+            x='预估大小(KB)', y='质量(SSIM)', color='类型'
+        )
+        
+        constraint = st.session_state.size_constraint
+        st.markdown("**帕累托前沿**（同等大小下质量最高的参数，按大小排列）")
+        for i, point in enumerate(frontier):
+            params = point['params']
+            marker = ""
+            if constraint.get('enabled'):
+                marker = "✅ " if is_satisfied(point['size'], constraint['target_size'], constraint['operator']) else "⚠️ "
+            col_point, col_apply = st.columns([4, 1])
+            with col_point:
+                st.markdown(
+                    f"{marker}{params['width']}×{params['height']} · {params['fps']}FPS · {params['colors']}色 · "
+                    f"有损{params['lossy']} — 预估 {format_size(point['size'])} · SSIM {point['quality']:.3f} · PSNR {point['psnr']:.1f}dB"
+                )
+            with col_apply:
+                if st.button("应用", key=f"pareto_apply_{i}", use_container_width=True):
+                    st.session_state.conversion_params.update({
+                        name: params[name] for name in ('width', 'height', 'fps', 'colors', 'lossy')
+                    })
+                    st.rerun()
 
 def parse_size_constraint(operator, value, unit):
     """解析文件大小约束"""
@@ -1308,597 +1058,480 @@ def parse_size_constraint(operator, value, unit):
         'display': f"{value}{unit} {operator}"
     }
 
-def convert_video_to_gif(video_path, params, size_constraint=None):
-    """将视频转换为GIF - 高性能优化版本，增强错误处理"""
-    cap = None
+def streamlit_notify(kind, message):
+    """把转换过程的提示消息输出到页面（kind为st的消息函数名：success/info/warning/error/caption）"""
+    getattr(st, kind)(message)
+
+def streamlit_progress():
+    """页面进度条和状态文字，首次报告进度时才创建"""
+    elements = {}
+    
+    def update(fraction, text):
+        if 'bar' not in elements:
+            elements['bar'] = st.progress(0)
+            elements['text'] = st.empty()
+        if fraction is not None:
+            elements['bar'].progress(fraction)
+        elements['text'].text(text)
+    
+    return update
+
+def convert_video_to_gif(video_path, params, size_constraint=None, notify=None, progress=None):
+    """页面上的转换（转换流程见gif_engine）：notify/progress 为None时输出到页面，
+    后台线程中转换时传入不依赖页面的回调"""
+    return convert_video(video_path, params, size_constraint, notify or streamlit_notify, progress or streamlit_progress())
+
+def session_artifacts():
+    """当前会话的条目容器（大对象登记在这里，受会话内存预算管理）"""
+    return artifacts_from_state(st.session_state, session_id_from_state(st.session_state))
+
+def cleanup_temp_files():
+    """释放当前会话的临时文件引用和下载链接（其他会话的文件不受影响）"""
     try:
-        # 检查OpenCV可用性
-        if not OPENCV_AVAILABLE or cv2 is None:
-            st.error("❌ OpenCV不可用，无法进行视频转换")
-            return None
-            
-        # 首先验证视频文件
-        is_valid, message = validate_video_file(video_path)
-        if not is_valid:
-            st.error(f"❌ 视频文件验证失败: {message}")
-            return None
-        
-        # 安全地打开视频文件
-        try:
-            cap = cv2.VideoCapture(video_path)
-        except Exception as e:
-            st.error(f"❌ 无法打开视频文件: {str(e)}")
-            return None
-            
-        if not cap.isOpened():
-            st.error("❌ 无法打开视频文件，可能是格式不支持或文件已损坏")
-            return None
-        
-        # 预先分配变量，增加安全检查
-        fps = max(1, min(30, params.get('fps', 10)))
-        target_width = max(10, min(2000, params.get('width', 640)))
-        target_height = max(10, min(2000, params.get('height', 480)))
-        quality = max(50, min(100, params.get('quality', 85)))
-        
-        # 安全地获取视频属性
-        try:
-            original_fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        except Exception as e:
-            cap.release()
-            st.error(f"❌ 获取视频属性失败: {str(e)}")
+        session_id = session_id_from_state(st.session_state)
+        get_temp_store().release(session_id)
+        static_dir = get_static_dir()
+        if static_dir is not None:
+            withdraw_outputs(static_dir, session_id)
+    except Exception as e:
+        pass
+
+def get_static_dir():
+    """静态文件服务的目录（主脚本旁的static/），未启用静态文件服务时返回None"""
+    if not BACKGROUND_ESTIMATE_AVAILABLE:
+        return None
+    try:
+        ctx = get_script_run_ctx()
+        if ctx is None or not st.get_option("server.enableStaticServing"):
             return None
+        return Path(ctx.main_script_path).resolve().parent / "static"
+    except Exception:
+        return None
+
+def save_gif_output(gif_data, filename, session_id=None):
+    """把转换结果写入临时存储，会话状态只保存文件句柄（后台线程中调用时传入session_id）"""
+    try:
+        with Image.open(io.BytesIO(gif_data)) as img:
+            width, height = img.width, img.height
+    except Exception:
+        width = height = None
+    return store_output(
+        get_temp_store(), session_id or session_id_from_state(st.session_state), gif_data, filename,
+        width=width, height=height
+    )
+
+def gif_output_url(gif_output):
+    """转换结果的静态文件链接，静态文件服务不可用时返回None"""
+    static_dir = get_static_dir()
+    if static_dir is None:
+        return None
+    try:
+        prune_outputs(static_dir, get_temp_store())
+    except Exception:
+        pass
+    return publish_output(gif_output, static_dir, session_id_from_state(st.session_state))
+
+def render_gif_image(gif_output, caption=None):
+    """显示转换结果的GIF：静态文件链接优先，不可用时在会话内存上限内从磁盘读取"""
+    url = gif_output_url(gif_output)
+    if url:
+        st.markdown(
+            f'<img src="{html.escape(url)}" style="max-width: 100%; border-radius: 0.5rem;" '
+            f'alt="{html.escape(gif_output["filename"])}">',
+            unsafe_allow_html=True
+        )
+        if caption:
+            st.caption(caption)
+        return
+    if fits_in_memory(gif_output):
+        data = read_output(gif_output)
+        if data is not None:
+            st.image(data, caption=caption)
+
+def render_gif_download(gif_output):
+    """从磁盘交付GIF下载"""
+    render_output_download(gif_output, "📥 下载GIF文件", "image/gif", "点击下载转换完成的GIF文件")
+
+def render_output_download(gif_output, label, mime, help_text):
+    """从磁盘交付下载：静态文件链接优先，不可用时在会话内存上限内退回内存下载"""
+    url = gif_output_url(gif_output)
+
+    if url:
+        st.markdown(f"""
+        <div style="text-align: center;">
+            <a href="{html.escape(url)}" download="{html.escape(gif_output['filename'])}" style="
+                display: block;
+                background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
+                color: white;
+                padding: 0.5rem 1.5rem;
+                border-radius: 0.5rem;
+                text-decoration: none;
+                font-weight: 600;
+            ">{html.escape(label)}</a>
+        </div>
+        """, unsafe_allow_html=True)
+        return
+
+    if not fits_in_memory(gif_output):
+        st.warning("⚠️ 文件较大，需要启用静态文件服务（server.enableStaticServing）才能下载")
+        return
+    data = read_output(gif_output)
+    if data is None:
+        st.error("❌ 转换结果已过期，请重新转换")
+        return
+    st.download_button(
+        label=label,
+        data=data,
+        file_name=gif_output['filename'],
+        mime=mime,
+        use_container_width=True,
+        type="primary",
+        help=help_text
+    )
+
+def render_keyframe_thumbnails(video_path):
+    """在视频信息下方显示沿时间轴分布的关键帧缩略图（按内容哈希缓存，只解码关键帧）"""
+    try:
+        with st.spinner("🖼️ 正在生成关键帧缩略图..."):
+            thumbnails = get_thumbnails(get_video_handle(video_path))
+    except Exception:
+        thumbnails = None
+    if thumbnails is None:
+        return
+    
+    st.image(
+        list(thumbnails['frames']),
+        caption=[format_timestamp(t) for t in thumbnails['timestamps']],
+        width=THUMBNAIL_CONFIG["max_side"]
+    )
+    source = "关键帧" if thumbnails['keyframes_only'] else "均匀时间点"
+    st.caption(f"🖼️ {len(thumbnails['frames'])} 张{source}缩略图，可据此选择裁剪区间")
+
+def render_conversion_result(gif_output, celebrate=True, show_image=False):
+    """转换完成后的结果模块：文件大小、分辨率和下载（show_image时同时显示GIF）"""
+    st.markdown('<div class="success-card">', unsafe_allow_html=True)
+    st.success("✅ 转换完成！")
+    if celebrate:
+        st.balloons()
+    
+    if show_image:
+        render_gif_image(gif_output)
+    
+    # 转换完成后的信息模块
+    st.markdown("### 📊 转换结果")
+    col_info1, col_info2 = st.columns(2)
+    with col_info1:
+        gif_size = gif_output['size'] / (1024 * 1024)
+        gif_size_kb = gif_output['size'] / 1024
+        
+        if gif_size >= 1:
+            size_display = f"{gif_size:.2f} MB"
+        else:
+            size_display = f"{gif_size_kb:.1f} KB"
         
-        # 验证获取的属性
-        if original_fps <= 0 or original_fps > 120:
-            original_fps = 25.0
-            st.warning("⚠️ 检测到异常帧率，使用默认值25FPS")
-        
-        if total_frames <= 0:
-            total_frames = 100
-            st.warning("⚠️ 无法获取准确帧数，使用估算值")
-        
-        # 计算采样间隔
-        sample_interval = max(1, int(original_fps / fps)) if original_fps > 0 else 1
-        
-        # 限制最大帧数以提高速度和稳定性
-        max_frames = min(150, total_frames // sample_interval)
-        if max_frames <= 0:
-            max_frames = 10  # 最少处理10帧
-        
-        # 预分配帧数组
-        frames = []
-        frame_count = 0
-        processed_frames = 0
-        max_read_attempts = max_frames * 2  # 防止无限循环
-        read_attempts = 0
-        
-        # 创建进度条
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        update_interval = max(1, max_frames // 20)
-        
-        # 预设置resize插值方法
-        resize_interpolation = cv2.INTER_LINEAR
-        
-        # 安全的帧处理循环
-        while processed_frames < max_frames and read_attempts < max_read_attempts:
-            try:
-                ret, frame = cap.read()
-                read_attempts += 1
-                
-                if not ret or frame is None:
-                    break
-                
-                # 按间隔采样
-                if frame_count % sample_interval == 0:
-                    try:
-                        # 验证帧的有效性
-                        if frame.shape[0] <= 0 or frame.shape[1] <= 0:
-                            frame_count += 1
-                            continue
-                        
-                        # 安全地调整尺寸
-                        if target_width and target_height:
-                            try:
-                                frame = cv2.resize(frame, (target_width, target_height), interpolation=resize_interpolation)
-                            except Exception as resize_e:
-                                frame_count += 1
-                                continue
-                        
-                        # 安全地进行颜色转换
-                        try:
-                            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        except Exception as color_e:
-                            frame_count += 1
-                            continue
-                        
-                        # 转换为PIL图像
-                        try:
-                            pil_image = Image.fromarray(frame_rgb)
-                            frames.append(pil_image)
-                            processed_frames += 1
-                        except Exception as pil_e:
-                            frame_count += 1
-                            continue
-                        
-                        # 更新进度
-                        if processed_frames % update_interval == 0 or processed_frames == max_frames:
-                            try:
-                                progress = processed_frames / max_frames
-                                progress_bar.progress(progress)
-                                status_text.text(f"正在处理视频帧... {processed_frames}/{max_frames}")
-                            except Exception:
-                                pass  # 进度更新失败不影响转换
-                        
-                        # 内存管理
-                        if processed_frames % 50 == 0:
-                            gc.collect()
-                            
-                    except Exception as frame_e:
-                        # 处理单帧的异常，继续下一帧
-                        pass
-                
-                frame_count += 1
-                
-            except Exception as read_e:
-                # 读取帧的异常，尝试继续
-                read_attempts += 1
-                if read_attempts >= max_read_attempts:
-                    break
-                continue
-        
-        # 安全释放资源
-        if cap:
-            cap.release()
-        
-        # 检查是否成功处理了足够的帧
-        if not frames or len(frames) < 2:
-            st.error("❌ 没有提取到足够的有效帧，无法生成GIF")
-            st.info("💡 这可能是由于视频文件损坏或格式不兼容导致的")
+        st.metric("📊 输出文件大小", size_display)
+    
+    with col_info2:
+        if gif_output['width'] and gif_output['height']:
+            st.metric("📐 输出文件分辨率", f"{gif_output['width']}×{gif_output['height']}")
+        else:
+            st.metric("📐 输出文件分辨率", "未知")
+    
+    # 下载模块
+    st.markdown("### 📥 下载")
+    try:
+        render_gif_download(gif_output)
+    except Exception as e:
+        st.error(f"❌ 下载文件失败: {str(e)}")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def start_conversion_job(video_info, video_path, params, size_constraint, filename, preview=True):
+    """提交后台转换任务（preview时先在代理帧上生成低分辨率预览），会话状态只保存任务ID"""
+    params = dict(params)
+    size_constraint = dict(size_constraint)
+    queue = get_job_queue()
+    session_id = session_id_from_state(st.session_state)
+    
+    def run(job):
+        gif_data = convert_video(video_path, params, size_constraint, job.notify, job.progress,
+                                 cancelled=job.cancelled)
+        if not gif_data or job.cancelled():
             return None
-        
-        # 安全地创建GIF
+        job.progress(None, "正在保存转换结果...")
+        return save_gif_output(gif_data, filename, session_id)
+    
+    # 同一会话只显示最新一次转换，提交前取消旧的转换
+    previous = st.session_state.get('conversion_job')
+    job_id = queue.submit(session_id, run, kind="convert", label=filename)
+    if previous:
+        queue.cancel(previous['id'])
+    
+    artifacts = session_artifacts()
+    artifacts.discard('conversion_preview')
+    if preview:
         try:
-            status_text.text("正在生成GIF文件...")
-            gif_buffer = io.BytesIO()
-            
-            # 预设置GIF参数，添加安全检查
-            gif_duration = max(50, int(1000 / fps))  # 确保duration不会太小
-            
-            # 验证frames是否有效
-            if not frames or len(frames) == 0:
-                st.error("❌ 没有有效的帧数据")
-                return None
-            
-            # 安全地保存GIF
-            frames[0].save(
-                gif_buffer,
-                format='GIF',
-                save_all=True,
-                append_images=frames[1:] if len(frames) > 1 else [],
-                duration=gif_duration,
-                loop=0,
-                optimize=bool(params.get('optimize', True)),
-                quality=quality
+            # 只用已生成的代理帧，不为预览解码原视频
+            proxy = get_proxy(get_video_handle(video_path), build=False)
+            if proxy is not None:
+                artifacts.put('conversion_preview', build_preview(proxy, params, plan_output_frame_count(video_info, params)))
+        except Exception:
+            pass
+    
+    st.session_state.conversion_job = {'id': job_id, 'shown': False}
+    st.session_state.gif_output = None
+
+def describe_job_progress(status):
+    """任务进度条的文字：排队中时显示前面的任务数"""
+    if status['state'] == 'queued':
+        ahead = status.get('position', 0)
+        return f"⏳ 排队中，前面还有 {ahead} 个任务" if ahead else "⏳ 排队中，即将开始"
+    if status['cancel_requested']:
+        return "⏹️ 正在取消..."
+    return status['text']
+
+def render_conversion_job():
+    """显示后台转换任务：完成前显示预览、进度和取消按钮，完成后由完整质量的GIF替换预览"""
+    job = st.session_state.get('conversion_job')
+    if not job:
+        return
+    queue = get_job_queue()
+    status = queue.status(job['id'])
+    if status is None:
+        # 任务记录已被淘汰（结果已在首次显示时保存到会话状态）
+        if st.session_state.gif_output:
+            render_conversion_result(st.session_state.gif_output, celebrate=False, show_image=True)
+        return
+    
+    if status['state'] not in FINISHED_STATES:
+        preview = session_artifacts().get('conversion_preview')
+        if preview is not None:
+            st.image(
+                preview['data'],
+                caption=f"预览 {preview['width']}×{preview['height']} · {preview['fps']:.0f}FPS — 完整质量的GIF生成中，完成后自动替换"
             )
-            
-            gif_buffer.seek(0)
-            gif_data = gif_buffer.getvalue()
-            
-            # 验证生成的GIF数据
-            if not gif_data or len(gif_data) == 0:
-                st.error("❌ 生成的GIF文件为空")
-                return None
-                
-        except Exception as gif_e:
-            st.error(f"❌ 生成GIF文件时出错: {str(gif_e)}")
-            st.info("💡 请尝试调整参数（降低质量或分辨率）后重试")
-            return None
-        
-        # 检查文件大小约束
-        if size_constraint and size_constraint['enabled']:
-            gif_size = len(gif_data)
-            target_size = size_constraint['target_size']
-            operator = size_constraint['operator']
-            
-            # 显示当前GIF文件大小信息
-            gif_size_mb = gif_size / (1024 * 1024)
-            gif_size_kb = gif_size / 1024
-            target_size_mb = target_size / (1024 * 1024)
-            target_size_kb = target_size / 1024
-            
-            if gif_size_mb >= 1:
-                gif_size_display = f"{gif_size_mb:.2f}MB"
-            else:
-                gif_size_display = f"{gif_size_kb:.1f}KB"
-                
-            if target_size_mb >= 1:
-                target_size_display = f"{target_size_mb:.2f}MB"
-            else:
-                target_size_display = f"{target_size_kb:.1f}KB"
-            
-            # 强制优化逻辑 - 当设置为小于某数值时，强制调整到目标大小以下
-            if operator in ['<', '<=']:
-                if gif_size > target_size:
-                    status_text.text(f"正在智能优化GIF文件大小到 {target_size_display} 以下...")
-                    
-                    # 增加超时保护和错误处理
-                    try:
-                        optimized_data = optimize_gif_size(gif_data, target_size)
-                    except Exception as opt_e:
-                        st.error(f"❌ 优化过程失败: {str(opt_e)}")
-                        status_text.text("优化失败，返回原始文件")
-                        optimized_data = None
-                    if optimized_data:
-                        optimized_size = len(optimized_data)
-                        optimized_size_mb = optimized_size / (1024 * 1024)
-                        optimized_size_kb = optimized_size / 1024
-                        
-                        if optimized_size_mb >= 1:
-                            optimized_display = f"{optimized_size_mb:.2f}MB"
-                        else:
-                            optimized_display = f"{optimized_size_kb:.1f}KB"
-                        
-                        if optimized_size <= target_size:
-                            st.success(f"✅ 智能优化成功！文件大小从 {gif_size_display} 优化到 {optimized_display}")
-                        else:
-                            st.info(f"📊 文件大小: {optimized_display}")
-                            st.info("💡 已达到在保持可接受质量下的最佳压缩效果")
-                        
-                        return optimized_data
-                    else:
-                        st.warning("⚠️ 智能优化未能显著减小文件大小，返回原始文件")
-                        st.info("💡 建议：使用AI智能建议功能或手动调整参数（降低分辨率、帧率或质量）")
-                        return gif_data
-                else:
-                    st.success(f"✅ 文件大小 {gif_size_display} 已满足约束要求 ≤ {target_size_display}")
-            
-            elif operator in ['>', '>=']:
-                if gif_size < target_size:
-                    st.info(f"📊 文件大小 {gif_size_display} 小于目标 {target_size_display}")
-                else:
-                    st.success(f"✅ 文件大小 {gif_size_display} 已满足约束要求 {target_size_display}")
-            
-            elif operator == '=':
-                tolerance = 0.1  # 10%的容差
-                if abs(gif_size - target_size) / target_size > tolerance:
-                    if gif_size > target_size:
-                        status_text.text(f"正在优化GIF文件大小到 {target_size_display}...")
-                        
-                        # 增加错误处理
-                        try:
-                            optimized_data = optimize_gif_size(gif_data, target_size)
-                        except Exception as opt_e:
-                            st.error(f"❌ 优化过程失败: {str(opt_e)}")
-                            status_text.text("优化失败，返回原始文件")
-                            optimized_data = None
-                        if optimized_data:
-                            return optimized_data
-                        else:
-                            return gif_data
-                    else:
-                        st.info(f"📊 文件大小 {gif_size_display} 小于目标 {target_size_display}")
-                else:
-                    st.success(f"✅ 文件大小 {gif_size_display} 已满足约束要求 {target_size_display}")
-        
-        return gif_data
         
-    except Exception as e:
-        # 确保cap被正确释放
-        if cap:
-            cap.release()
+        @st.fragment(run_every=BACKGROUND_CONFIG["poll_interval"])
+        def show_conversion_progress():
+            current = queue.status(job['id'])
+            # 完成后整页刷新一次，显示结果模块
+            if current is None or current['state'] in FINISHED_STATES:
+                st.rerun()
+            st.progress(min(1.0, current['fraction']), text=describe_job_progress(current))
         
-        # 安全地处理异常信息
-        error_msg = safe_encode_string(str(e))
-        if not error_msg:
-            error_msg = "未知错误"
-            
-        st.error(f"❌ 视频转换失败: {error_msg}")
-        st.info("💡 这可能是由于以下原因导致的：")
-        st.info("   • 视频文件损坏或格式不兼容")
-        st.info("   • 参数设置不当（分辨率过大、质量过高等）")
-        st.info("   • 系统内存不足")
-        st.info("   • 请尝试上传不同的视频文件或调整参数")
-        return None
+        show_conversion_progress()
+        if not status['cancel_requested']:
+            if st.button("⏹️ 取消转换", key="conversion_cancel", help="转换在后台进行，刷新或切换页面不会中断"):
+                queue.cancel(job['id'])
+                st.rerun()
+        return
+    
+    first_view = not job['shown']
+    if first_view:
+        job['shown'] = True
+        st.session_state.gif_output = status['result']
+        session_artifacts().discard('conversion_preview')
+    
+    if status['state'] == 'cancelled':
+        st.info("⏹️ 转换已取消")
+        return
+    for kind, message in status['messages']:
+        streamlit_notify(kind, message)
+    gif_output = st.session_state.gif_output
+    if gif_output:
+        render_conversion_result(gif_output, celebrate=first_view, show_image=True)
+    else:
+        if status['error']:
+            st.error(f"❌ 视频转换失败: {status['error']}")
+        st.error("❌ 转换失败")
+        st.info("💡 请检查视频文件格式或调整参数")
 
-def optimize_gif_size(gif_data, target_size_bytes):
-    """优化GIF文件大小 - 增强版本，提升稳定性和内存管理"""
-    try:
-        original_size = len(gif_data)
-        
-        # 如果目标大小已经满足，直接返回
-        if original_size <= target_size_bytes:
-            return gif_data
-        
-        # 计算压缩比例
-        compression_ratio = target_size_bytes / original_size
+def start_batch_conversion(uploaded_files, preset, size_constraint):
+    """保存上传的视频并提交后台批量转换任务（任务中由进程池转换，页面轮询每个文件的进度）"""
+    session_id = session_id_from_state(st.session_state)
+    store = get_temp_store()
+    files = []
+    for uploaded in uploaded_files:
+        path = store.put_bytes(session_id, uploaded.getbuffer(), uploaded.name)
+        files.append({'path': str(path), 'name': uploaded.name})
+    
+    file_states = [{'name': f['name'], 'status': 'queued', 'fraction': 0.0, 'text': "等待中"} for f in files]
+    work_dir = Path(BATCH_CONFIG["work_dir"]) / f"{session_id}-{time.time_ns()}"
+    
+    def run(job):
+        finished = []
         
-        # 将GIF数据转换为PIL图像 - 增强错误处理
-        gif_buffer = None
-        frames = []
-        durations = []
+        def on_update(number, changes):
+            file_states[number].update(changes)
+            if changes.get('status') in ('done', 'failed', 'cancelled'):
+                finished.append(number)
+            job.update(files=[dict(item) for item in file_states])
+            job.progress(len(finished) / len(file_states), f"已完成 {len(finished)}/{len(file_states)} 个文件")
         
         try:
-            gif_buffer = io.BytesIO(gif_data)
-            with Image.open(gif_buffer) as img:
-                # 限制最大帧数以控制内存使用 - 根据压缩比例动态调整
-                max_frames = min(100, max(10, int(200 * compression_ratio)))
-                frame_count = 0
-                
-                try:
-                    while frame_count < max_frames:
-                        try:
-                            # 复制帧并获取持续时间
-                            frame_copy = img.copy()
-                            frames.append(frame_copy)
-                            durations.append(img.info.get('duration', 100))
-                            
-                            # 尝试移动到下一帧
-                            img.seek(len(frames))
-                            frame_count += 1
-                            
-                        except EOFError:
-                            # 到达文件末尾，正常结束
-                            break
-                        except Exception as frame_e:
-                            # 单帧处理失败，跳过该帧
-                            break
-                            
-                except Exception as seek_e:
-                    # 如果没有获取到任何帧，返回原始数据
-                    if not frames:
-                        return gif_data
-                        
-        except Exception as gif_e:
-            st.error(f"❌ GIF文件解析失败: {str(gif_e)}")
-            return gif_data
+            summary = convert_batch(files, preset, size_constraint, work_dir / "gifs.zip", on_update, job.cancelled)
+            output = None
+            if summary['converted']:
+                output = store_output_file(store, session_id, summary['zip_path'], "gifs.zip")
+            return {'summary': summary, 'output': output}
         finally:
-            # 确保缓冲区被清理
-            if gif_buffer:
-                try:
-                    gif_buffer.close()
-                except:
-                    pass
-        
-        if not frames:
-            return gif_data
-        
-        target_size_mb = target_size_bytes / (1024 * 1024)
-        
-        # 智能优化策略 - 优先保持质量，减少尝试次数
-        strategies = []
-        
-        # 根据压缩比例智能选择最优策略
-        if compression_ratio >= 0.8:
-            # 轻微压缩 - 保持高质量
-            strategies = [
-                {'scale': 0.9, 'quality': 90, 'fps_reduction': 0.9},
-                {'scale': 0.85, 'quality': 85, 'fps_reduction': 0.85}
-            ]
-        elif compression_ratio >= 0.5:
-            # 中等压缩 - 平衡质量和大小
-            strategies = [
-                {'scale': 0.75, 'quality': 80, 'fps_reduction': 0.75},
-                {'scale': 0.65, 'quality': 70, 'fps_reduction': 0.65}
-            ]
-        elif compression_ratio >= 0.3:
-            # 高压缩 - 优先满足大小要求
-            strategies = [
-                {'scale': 0.55, 'quality': 65, 'fps_reduction': 0.55},
-                {'scale': 0.45, 'quality': 55, 'fps_reduction': 0.45}
-            ]
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    job_id = get_job_queue().submit(session_id, run, kind="batch", label=f"{len(files)} 个文件",
+                                    detail={'files': [dict(item) for item in file_states]})
+    st.session_state.batch_job = {'id': job_id, 'shown': False}
+
+def render_batch_files(detail):
+    """每个文件一行：状态、进度和结果"""
+    icons = {'queued': "⏳", 'running': "🔄", 'done': "✅", 'failed': "❌", 'cancelled': "⏹️"}
+    for item in detail.get('files', []):
+        icon = icons.get(item['status'], "⏳")
+        if item['status'] == 'done':
+            text = f"{icon} {item['name']} → {item['archive_name']} · {format_size(item['size'])}"
+            if item.get('width') and item.get('height'):
+                text += f" · {item['width']}×{item['height']}"
+            text += f" · {item['elapsed']:.1f}秒"
+        elif item['status'] in ('failed', 'cancelled'):
+            text = f"{icon} {item['name']} — {item.get('error') or '转换失败'}"
         else:
-            # 极限压缩 - 确保满足大小要求
-            strategies = [
-                {'scale': 0.35, 'quality': 50, 'fps_reduction': 0.35},
-                {'scale': 0.25, 'quality': 40, 'fps_reduction': 0.25}
-            ]
-        
-        best_result = None
-        best_quality_score = 0
-        
-        for i, strategy in enumerate(strategies):
-            optimized_buffer = None
-            resized_frames = []
-            
-            try:
-                # 计算新的尺寸
-                new_width = max(10, int(frames[0].width * strategy['scale']))
-                new_height = max(10, int(frames[0].height * strategy['scale']))
-                
-                # 减少帧数
-                frame_interval = max(1, int(1 / strategy['fps_reduction']))
-                optimized_frames = frames[::frame_interval]
-                optimized_durations = [durations[j] for j in range(0, len(durations), frame_interval)]
-                
-                # 确保至少有一帧
-                if not optimized_frames:
-                    optimized_frames = [frames[0]]
-                    optimized_durations = [durations[0] if durations else 100]
-                
-                # 调整帧尺寸 - 增强错误处理
-                for frame in optimized_frames:
-                    try:
-                        resized_frame = frame.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                        resized_frames.append(resized_frame)
-                    except Exception as resize_e:
-                        # 如果某帧缩放失败，跳过该帧
-                        continue
-                
-                # 确保有足够的帧
-                if not resized_frames:
-                    continue
-                
-                # 保存优化后的GIF - 增强错误处理
-                try:
-                    optimized_buffer = io.BytesIO()
-                    resized_frames[0].save(
-                        optimized_buffer,
-                        save_all=True,
-                        append_images=resized_frames[1:] if len(resized_frames) > 1 else [],
-                        duration=optimized_durations[0] if optimized_durations else 100,
-                        loop=0,
-                        optimize=True,
-                        quality=int(strategy['quality'])
-                    )
-                    
-                    optimized_buffer.seek(0)
-                    optimized_data = optimized_buffer.getvalue()
-                    optimized_size = len(optimized_data)
-                    
-                    # 检查是否满足大小要求
-                    if optimized_size <= target_size_bytes:
-                        # 计算质量评分 (尺寸比例 * 质量比例 * 帧数比例)
-                        quality_score = (strategy['scale'] ** 2) * (strategy['quality'] / 100) * strategy['fps_reduction']
-                        
-                        # 如果质量更好，更新最佳结果
-                        if quality_score > best_quality_score:
-                            best_quality_score = quality_score
-                            best_result = optimized_data
-                            
-                        # 如果质量已经很高，清理资源后返回
-                        if quality_score > 0.8:
-                            # 清理当前策略的资源
-                            for frame in resized_frames:
-                                try:
-                                    frame.close()
-                                except:
-                                    pass
-                            return optimized_data
-                            
-                except Exception as save_e:
-                    # GIF保存失败，继续下一个策略
-                    continue
-                        
-            except Exception as strategy_e:
-                # 整个策略失败，继续下一个
-                continue
-            finally:
-                # 清理当前策略的资源
-                try:
-                    for frame in resized_frames:
-                        try:
-                            frame.close()
-                        except:
-                            pass
-                    if optimized_buffer:
-                        optimized_buffer.close()
-                except:
-                    pass
-        
-        # 如果找到了满足要求的结果，返回最佳质量的那个
-        if best_result:
-            return best_result
-        
-        # 如果所有策略都无法满足要求，使用最激进的策略
-        final_buffer = None
-        final_resized_frames = []
-        
-        try:
-            final_scale = max(0.1, compression_ratio ** 0.5)  # 使用平方根来平衡
-            final_quality = max(30, int(compression_ratio * 100))
-            
-            new_width = max(10, int(frames[0].width * final_scale))
-            new_height = max(10, int(frames[0].height * final_scale))
-            
-            # 大幅减少帧数
-            frame_interval = max(1, int(1 / (compression_ratio * 0.5)))
-            optimized_frames = frames[::frame_interval]
-            optimized_durations = [durations[j] for j in range(0, len(durations), frame_interval)]
-            
-            # 确保至少有一帧
-            if not optimized_frames:
-                optimized_frames = [frames[0]]
-                optimized_durations = [durations[0] if durations else 100]
-            
-            # 调整帧尺寸
-            for frame in optimized_frames:
-                try:
-                    resized_frame = frame.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    final_resized_frames.append(resized_frame)
-                except Exception as resize_e:
-                    continue
+            text = f"{icon} {item['name']} — {item['text']}"
+        st.progress(min(1.0, item['fraction']), text=text)
+
+def render_batch_job():
+    """显示批量转换：进行中时轮询每个文件的进度，完成后显示汇总和ZIP下载"""
+    job = st.session_state.get('batch_job')
+    if not job:
+        return
+    queue = get_job_queue()
+    status = queue.status(job['id'])
+    if status is None:
+        return
+    
+    st.markdown("### 📦 批量转换进度")
+    if status['state'] not in FINISHED_STATES:
+        fragment = getattr(st, 'fragment', None)
+        if fragment is not None:
+            @fragment(run_every=BACKGROUND_CONFIG["poll_interval"])
+            def show_batch_progress():
+                current = queue.status(job['id'])
+                # 完成后整页刷新一次，显示汇总和下载
+                if current is None or current['state'] in FINISHED_STATES:
+                    st.rerun()
+                if current['state'] == 'queued':
+                    st.caption(describe_job_progress(current))
+                render_batch_files(current['detail'])
             
-            # 确保有帧可用
-            if final_resized_frames:
-                final_buffer = io.BytesIO()
-                final_resized_frames[0].save(
-                    final_buffer,
-                    save_all=True,
-                    append_images=final_resized_frames[1:] if len(final_resized_frames) > 1 else [],
-                    duration=optimized_durations[0] if optimized_durations else 100,
-                    loop=0,
-                    optimize=True,
-                    quality=final_quality
-                )
-                
-                final_buffer.seek(0)
-                final_data = final_buffer.getvalue()
-                
-                if len(final_data) <= target_size_bytes:
-                    return final_data
-                    
-        except Exception as e:
-            # 记录错误但不影响返回值
-            pass
-        finally:
-            # 清理最终策略的资源
-            try:
-                for frame in final_resized_frames:
-                    try:
-                        frame.close()
-                    except:
-                        pass
-                if final_buffer:
-                    final_buffer.close()
-            except:
-                pass
-        
-        # 如果仍然无法满足要求，返回最佳结果或原始数据
-        result = None
-        if best_result:
-            st.warning("⚠️ 无法完全达到目标大小，使用最佳优化结果")
-            result = best_result
+            show_batch_progress()
         else:
-            st.warning("⚠️ 无法达到目标大小，返回原始文件")
-            result = gif_data
-        
-        return result
-        
-    except Exception as e:
-        st.error(f"❌ 优化失败: {str(e)}")
-        return gif_data
-    finally:
-        # 清理所有原始帧
-        try:
-            for frame in frames:
-                try:
-                    frame.close()
-                except:
-                    pass
-        except:
-            pass
-        
-        # 强制垃圾回收
+            # 不支持片段轮询的Streamlit版本：显示当前进度，由用户手动刷新（任务在后台照常执行）
+            if status['state'] == 'queued':
+                st.caption(describe_job_progress(status))
+            render_batch_files(status['detail'])
+            if st.button("🔄 刷新进度", key="batch_refresh"):
+                st.rerun()
+        if not status['cancel_requested']:
+            if st.button("⏹️ 取消剩余文件", key="batch_cancel", help="正在转换的文件会完成，尚未开始的文件不再转换"):
+                queue.cancel(job['id'])
+                st.rerun()
+        else:
+            st.info("⏹️ 已取消，等待正在转换的文件完成...")
+        return
+    
+    render_batch_files(status['detail'])
+    result = status['result']
+    if not result:
+        if status['state'] == 'cancelled':
+            st.info("⏹️ 批量转换已取消")
+        else:
+            st.error(f"❌ 批量转换失败: {status['error'] or '未知错误'}")
+        return
+    
+    summary = result['summary']
+    output = result['output']
+    st.success(
+        f"✅ 批量转换完成：成功 {summary['converted']} 个，失败 {summary['failed']} 个"
+        + (f"，取消 {summary['cancelled']} 个" if summary['cancelled'] else "")
+    )
+    st.caption(f"⏱️ 用时 {summary['elapsed']:.1f}秒 · {summary['workers']} 个进程 · GIF合计 {format_size(summary['bytes'])}")
+    if not job['shown']:
+        job['shown'] = True
+        if summary['converted']:
+            st.balloons()
+    if output:
         try:
-            gc.collect()
-        except:
-            pass
+            render_output_download(output, "📦 下载全部GIF（ZIP）", "application/zip", "点击下载打包好的全部GIF文件")
+        except Exception as e:
+            st.error(f"❌ 下载文件失败: {str(e)}")
 
-def cleanup_temp_files():
-    """清理临时文件"""
-    try:
-        temp_dir = Path("temp_uploads")
-        if temp_dir.exists():
-            for file_path in temp_dir.glob("*"):
-                try:
-                    if file_path.is_file():
-                        file_path.unlink()
-                except Exception as e:
-                    pass
-    except Exception as e:
-        pass
+def run_batch_app():
+    """批量转换：多个视频使用同一组参数预设和大小约束，在进程池中转换并打包为ZIP"""
+    st.markdown("### 📁 批量上传")
+    uploaded_files = st.file_uploader(
+        "选择多个视频文件",
+        type=['mp4', 'avi', 'mov', 'mkv'],
+        accept_multiple_files=True,
+        help=f"一次最多{BATCH_CONFIG['max_files']}个文件，所有文件使用下面同一组参数和大小约束",
+        key="batch_files"
+    )
+    if uploaded_files and len(uploaded_files) > BATCH_CONFIG["max_files"]:
+        st.warning(f"⚠️ 一次最多转换{BATCH_CONFIG['max_files']}个文件，只转换前{BATCH_CONFIG['max_files']}个")
+        uploaded_files = uploaded_files[:BATCH_CONFIG["max_files"]]
+    
+    st.markdown("### ⚙️ 批量参数")
+    st.info("💡 缩放比例相对每个视频自身的分辨率，其余参数对所有文件相同")
+    defaults = st.session_state.conversion_params
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        fps = st.slider("帧率 (FPS)", min_value=1, max_value=30, value=defaults.get('fps', 10), key="batch_fps",
+                        help="控制GIF播放速度，建议8-15FPS，数值越高动画越流畅但文件越大")
+        quality = st.slider("质量", min_value=50, max_value=100, value=defaults.get('quality', 85), key="batch_quality",
+                            help="控制GIF画质，数值越高画质越好但文件越大")
+        colors = st.slider("调色板颜色数", min_value=16, max_value=256, value=defaults.get('colors', 256),
+                           key="batch_colors", help="GIF每帧最多256色，减少颜色数可显著减小文件，但渐变处会出现色带")
+    with col2:
+        scale_ratio = st.slider("缩放比例", min_value=0.1, max_value=2.0, value=0.5, step=0.1, key="batch_scale",
+                                help="相对每个视频原始分辨率的比例，1.0为原始尺寸")
+        lossy = st.slider("有损级别", min_value=0, max_value=100, value=defaults.get('lossy', 0), key="batch_lossy",
+                          help="忽略细微的帧间变化以缩小文件，0为无损，数值越高文件越小但画面可能出现拖影")
+        optimize = st.checkbox("启用优化", value=defaults.get('optimize', True), key="batch_optimize",
+                               help="优化GIF文件大小，建议启用")
+    
+    col_constraint1, col_constraint2, col_constraint3 = st.columns([1, 1, 1])
+    with col_constraint1:
+        operator = st.selectbox("比较符号", ["<", ">", "=", "<=", ">="], key="batch_operator",
+                                help="每个GIF的文件大小约束条件")
+    with col_constraint2:
+        size_value = st.number_input("数值", min_value=0.1, max_value=1000.0, value=5.0, step=0.1,
+                                     key="batch_size_value", help="输入目标文件大小数值")
+    with col_constraint3:
+        size_unit = st.selectbox("单位", ["MB", "KB", "B"], key="batch_size_unit", help="选择文件大小单位")
+    size_constraint = parse_size_constraint(operator, size_value, size_unit)
+    if size_constraint:
+        size_constraint['enabled'] = True
+        st.success(f"✅ 约束设置: {size_constraint['display']}")
+    else:
+        size_constraint = {'enabled': False}
+    
+    job = st.session_state.get('batch_job')
+    status = get_job_queue().status(job['id']) if job else None
+    running = status is not None and status['state'] not in FINISHED_STATES
+    if st.button(f"🚀 开始批量转换（{len(uploaded_files or [])} 个文件）", type="primary",
+                 use_container_width=True, disabled=not uploaded_files or running, key="batch_start"):
+        preset = {
+            'fps': fps,
+            'quality': quality,
+            'scale': scale_ratio,
+            'optimize': optimize,
+            'colors': colors,
+            'lossy': lossy
+        }
+        try:
+            start_batch_conversion(uploaded_files, preset, size_constraint)
+        except JobQueueFull as e:
+            st.warning(f"⚠️ {str(e)}")
+        except Exception as e:
+            st.error(f"❌ 启动批量转换失败: {str(e)}")
+    
+    render_batch_job()
 
 def setup_api_key():
     """设置API密钥"""
@@ -2078,6 +1711,14 @@ def check_system_requirements():
 
 def run_main_app():
     """运行主要的应用逻辑"""
+    mode = st.radio(
+        "转换模式", ["单个视频", "批量转换"], horizontal=True, key="conversion_mode",
+        help="批量转换：多个视频使用同一组参数和大小约束，在进程池中转换，完成后打包为ZIP下载"
+    )
+    if mode == "批量转换":
+        run_batch_app()
+        return
+    
     # 文件上传区域
     st.markdown("### 📁 文件上传")
     
@@ -2089,14 +1730,19 @@ def run_main_app():
     )
     
     if uploaded_file:
-        # 保存上传的文件
-        temp_dir = Path("temp_uploads")
-        temp_dir.mkdir(exist_ok=True)
-        
-        input_path = temp_dir / uploaded_file.name
+        # 保存上传的文件（按内容去重，当前会话持有引用）
         try:
-            with open(input_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            upload_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}_{uploaded_file.size}"
+            stored = st.session_state.get('stored_upload')
+            if stored and stored['id'] == upload_id and Path(stored['path']).exists():
+                input_path = Path(stored['path'])
+            else:
+                input_path = get_temp_store().put_bytes(
+                    session_id_from_state(st.session_state),
+                    uploaded_file.getbuffer(),
+                    uploaded_file.name
+                )
+                st.session_state.stored_upload = {'id': upload_id, 'path': str(input_path)}
         except Exception as e:
             st.error(f"❌ 文件保存失败: {str(e)}")
             return
@@ -2113,6 +1759,16 @@ def run_main_app():
             st.info("💡 请尝试上传不同的视频文件")
             video_info = None
         
+        # 上传时建立帧索引并生成低分辨率代理帧，后续预估和建议都在代理帧上试编码
+        if video_info:
+            try:
+                with st.spinner("🎞️ 正在生成预览代理帧..."):
+                    handle = get_video_handle(input_path)
+                    get_frame_index(handle)
+                    get_proxy(handle)
+            except Exception:
+                pass  # 代理生成失败时预估会回退到原视频
+        
         # 显示文件信息
         if video_info:
             try:
@@ -2133,6 +1789,8 @@ def run_main_app():
                     st.metric("文件大小", size_display)
             except Exception as e:
                 st.warning(f"⚠️ 获取文件信息失败: {str(e)}")
+            
+            render_keyframe_thumbnails(input_path)
     
     # AI智能建议区域
     if uploaded_file and video_info:
@@ -2151,18 +1809,18 @@ def run_main_app():
             if st.button("🎯 获取AI建议", use_container_width=True):
                 try:
                     with st.spinner("AI正在分析并生成建议..."):
-                        suggestions = generate_ai_suggestions(video_info, user_input)
+                        suggestions = generate_ai_suggestions(video_info, user_input, input_path)
                         if suggestions:
                             st.session_state.ai_suggestions = suggestions
                         else:
                             st.warning("⚠️ 未能生成AI建议，将使用默认建议")
-                            fallback_suggestions = get_fallback_suggestions(video_info, user_input)
+                            fallback_suggestions = get_fallback_suggestions(video_info, user_input, input_path)
                             st.session_state.ai_suggestions = fallback_suggestions
                 except Exception as e:
                     st.error(f"❌ 生成AI建议时出错: {str(e)}")
                     st.info("💡 将使用默认建议作为替代方案")
                     try:
-                        fallback_suggestions = get_fallback_suggestions(video_info, user_input)
+                        fallback_suggestions = get_fallback_suggestions(video_info, user_input, input_path)
                         st.session_state.ai_suggestions = fallback_suggestions
                     except Exception as fallback_error:
                         st.error(f"❌ 生成默认建议也失败了: {str(fallback_error)}")
@@ -2171,8 +1829,7 @@ def run_main_app():
         with col_ai2:
             if st.button("🔄 重新分析", use_container_width=True, help="清除缓存并重新获取AI建议"):
                 # 清除AI建议缓存
-                if 'ai_suggestions_cache' in st.session_state:
-                    st.session_state.ai_suggestions_cache.clear()
+                session_artifacts().discard('ai_suggestions_cache')
                 if 'ai_suggestions' in st.session_state:
                     del st.session_state.ai_suggestions
                 
@@ -2218,6 +1875,11 @@ def run_main_app():
                                 # 如果预估大小信息有问题，跳过显示
                                 pass
                             
+                            # 添加实测质量信息
+                            measured = suggestion.get('measured_quality')
+                            if measured:
+                                size_info_parts.append(f"SSIM: {measured['ssim']:.3f}")
+                            
                             # 添加约束信息
                             try:
                                 if ('size_constraint' in suggestion and 
@@ -2354,7 +2016,7 @@ def run_main_app():
                     "缩放比例", 
                     min_value=0.1, 
                     max_value=2.0, 
-                    value=1.0,
+                    value=current_scale_ratio(video_info),
                     step=0.1,
                     help="控制GIF分辨率比例，1.0为原始尺寸，数值越大画质越好但文件越大"
                 )
@@ -2369,6 +2031,26 @@ def run_main_app():
                 target_width = 640
                 target_height = 480
         
+        col3, col4 = st.columns([1, 1])
+        
+        with col3:
+            colors = st.slider(
+                "调色板颜色数",
+                min_value=16,
+                max_value=256,
+                value=st.session_state.conversion_params.get('colors', 256),
+                help="GIF每帧最多256色，减少颜色数可显著减小文件，但渐变处会出现色带"
+            )
+        
+        with col4:
+            lossy = st.slider(
+                "有损级别",
+                min_value=0,
+                max_value=100,
+                value=st.session_state.conversion_params.get('lossy', 0),
+                help="忽略细微的帧间变化以缩小文件，0为无损，数值越高文件越小但画面可能出现拖影"
+            )
+        
         optimize = st.checkbox(
             "启用优化", 
             value=st.session_state.conversion_params.get('optimize', True),
@@ -2381,7 +2063,9 @@ def run_main_app():
             'quality': quality,
             'width': target_width,
             'height': target_height,
-            'optimize': optimize
+            'optimize': optimize,
+            'colors': colors,
+            'lossy': lossy
         })
         
         # 文件大小约束设置
@@ -2460,106 +2144,117 @@ def run_main_app():
             # 生成参数状态键，避免重复计算
             params_state_key = f"{st.session_state.conversion_params}_{st.session_state.size_constraint.get('enabled', False)}_{st.session_state.size_constraint.get('value', 0)}"
             
-            # 检查是否需要重新计算
-            if 'last_params_state_key' not in st.session_state or st.session_state.last_params_state_key != params_state_key:
-                with st.spinner("🔄 正在预估参数，请稍后..."):
-                    # 根据当前约束调整参数
-                    if st.session_state.size_constraint.get('enabled', False):
-                        constraint = st.session_state.size_constraint.copy()
-                        
-                        # 确保约束包含target_size字段
-                        if 'target_size' not in constraint:
-                            unit_multipliers = {
-                                'B': 1,
-                                'KB': 1024,
-                                'MB': 1024 * 1024,
-                                'GB': 1024 * 1024 * 1024
-                            }
-                            multiplier = unit_multipliers.get(constraint.get('unit', 'MB').upper(), 1024 * 1024)
-                            constraint['target_size'] = constraint.get('value', 5.0) * multiplier
-                        
-                        # 基于约束调整参数
-                        adjusted_params = adjust_params_for_constraint(
-                            video_info, 
-                            st.session_state.conversion_params, 
-                            constraint,
-                            current_video_path
-                        )
-                        
-                        # 使用调整后的参数进行预估
-                        estimated_size = estimate_gif_size(video_info, adjusted_params, current_video_path)
-                        
-                        # 验证是否满足约束
-                        satisfied, _ = validate_params_against_constraint(
-                            video_info, 
-                            adjusted_params, 
-                            constraint,
-                            current_video_path
-                        )
-                        
-                        # 显示约束信息
-                        target_size_mb = constraint['target_size'] / (1024 * 1024)
-                        target_size_kb = constraint['target_size'] / 1024
-                        
-                        if target_size_mb >= 1:
-                            target_display = f"{target_size_mb:.1f}MB"
-                        else:
-                            target_display = f"{target_size_kb:.0f}KB"
-                        
-                        # 更新会话状态中的参数为调整后的参数
-                        st.session_state.conversion_params.update(adjusted_params)
-                        
+            fragment = getattr(st, 'fragment', None)
+            if fragment is not None and BACKGROUND_ESTIMATE_AVAILABLE:
+                # 后台预估：参数面板不等待试编码，结果到达前显示上一次结果并标记为已过期
+                params_snapshot = dict(st.session_state.conversion_params)
+                constraint_snapshot = dict(st.session_state.size_constraint)
+                estimator = get_background_estimator()
+                script_ctx = get_script_run_ctx()
+                estimator.submit(
+                    params_state_key,
+                    lambda cancelled: compute_panel_estimate(
+                        video_info, params_snapshot, constraint_snapshot, current_video_path, cancelled
+                    ),
+                    prepare_thread=lambda thread: add_script_run_ctx(thread, script_ctx)
+                )
+                
+                @fragment(run_every=BACKGROUND_CONFIG["poll_interval"])
+                def show_background_estimate():
+                    status = estimator.status()
+                    if status['result'] is not None and status['result']['value']:
+                        render_panel_estimate(status['result']['value'], stale=status['stale'])
                     else:
-                        # 没有约束时，使用原始参数
-                        estimated_size = estimate_gif_size(video_info, st.session_state.conversion_params, current_video_path)
-                        satisfied = True
-                        constraint = None
-                    
-                    # 缓存计算结果
-                    st.session_state.last_params_state_key = params_state_key
-                    st.session_state.cached_estimated_size = estimated_size
-                    st.session_state.cached_constraint_satisfied = satisfied
-                    st.session_state.cached_constraint = constraint
+                        st.info("⏳ 正在后台预估文件大小，您可以继续调整参数...")
+                    # 新结果到达后整页刷新一次，停止轮询并让转换使用调整后的参数
+                    if not status['stale'] and st.session_state.get('shown_estimate_key') != params_state_key:
+                        st.session_state.shown_estimate_key = params_state_key
+                        result = status['result']['value'] if status['result'] else None
+                        if result and result['adjusted_params']:
+                            st.session_state.conversion_params.update(result['adjusted_params'])
+                        st.rerun()
+                
+                if estimator.status()['stale'] or st.session_state.get('shown_estimate_key') != params_state_key:
+                    show_background_estimate()
+                else:
+                    render_panel_estimate(estimator.status()['result']['value'])
             
             else:
-                # 使用缓存的结果
-                estimated_size = st.session_state.cached_estimated_size
-                satisfied = st.session_state.cached_constraint_satisfied
-                constraint = st.session_state.cached_constraint
-                if constraint:
-                    target_size_mb = constraint['target_size'] / (1024 * 1024)
-                    target_size_kb = constraint['target_size'] / 1024
-                    
-                    if target_size_mb >= 1:
-                        target_display = f"{target_size_mb:.1f}MB"
-                    else:
-                        target_display = f"{target_size_kb:.0f}KB"
-            
-            # 显示预估结果
-            estimated_mb = estimated_size / (1024 * 1024)
-            estimated_kb = estimated_size / 1024
+                # 检查是否需要重新计算（不支持后台预估时同步计算）
+                panel_estimate = session_artifacts().get('cached_panel_estimate')
+                if panel_estimate is None or st.session_state.get('last_params_state_key') != params_state_key:
+                    with st.spinner("🔄 正在预估参数，请稍后..."):
+                        panel_estimate = compute_panel_estimate(
+                            video_info,
+                            st.session_state.conversion_params,
+                            st.session_state.size_constraint,
+                            current_video_path
+                        )
+                        if panel_estimate['adjusted_params']:
+                            # 更新会话状态中的参数为调整后的参数
+                            st.session_state.conversion_params.update(panel_estimate['adjusted_params'])
+                        
+                        # 缓存计算结果
+                        st.session_state.last_params_state_key = params_state_key
+                        session_artifacts().put('cached_panel_estimate', panel_estimate)
+                
+                render_panel_estimate(panel_estimate)
             
-            if estimated_mb >= 1:
-                size_display = f"{estimated_mb:.2f}MB"
-            else:
-                size_display = f"{estimated_kb:.1f}KB"
+            # 显示调整提示
+            st.info("💡 提示：降低帧率、分辨率、调色板颜色数或提高有损级别可以减小文件大小")
             
-            # 如果有约束，在一个信息中显示预估大小和约束状态
-            if constraint and constraint.get('enabled', False):
-                if satisfied:
-                    st.success(f"✅ 基于当前参数文件转换后的预估大小为: {size_display} (满足约束 {constraint['operator']} {target_display})")
-                else:
-                    st.warning(f"⚠️ 基于当前参数文件转换后的预估大小为: {size_display} (不满足约束 {constraint['operator']} {target_display})")
-            else:
-                st.info(f"📊 基于当前参数文件转换后的预估大小为: {size_display}")
+            # 大小-质量帕累托前沿
+            render_pareto_explorer(video_info, current_video_path)
             
-            # 显示调整提示
-            st.info("💡 提示：降低质量、帧率或分辨率可以减小文件大小")
+            # 预估模型随真实转换结果持续校准，显示其滚动误差
+            try:
+                calibration_store = get_calibration_store()
+                calibration = calibration_store.running_error() if calibration_store else None
+                if calibration and calibration['samples'] > 0:
+                    st.caption(
+                        f"📈 预估模型校准：最近{calibration['samples']}次转换的平均误差 "
+                        f"{calibration['corrected_error']:.0%}（校准前 {calibration['raw_error']:.0%}）"
+                    )
+            except Exception:
+                pass
+        
+        # 结果缓存的效果
+        try:
+            result_cache = get_result_cache()
+            cache_metrics = result_cache.metrics() if result_cache else None
+            if cache_metrics and cache_metrics['hit_rate'] is not None:
+                st.caption(
+                    f"⚡ 结果缓存：命中率 {cache_metrics['hit_rate']:.0%}"
+                    f"（{cache_metrics['hits']}/{cache_metrics['hits'] + cache_metrics['misses']}），"
+                    f"已节省 {cache_metrics['bytes_saved'] / (1024 * 1024):.1f}MB 的重复转换"
+                )
+        except Exception:
+            pass
+        
+        # 会话内存预算使用情况
+        try:
+            budget_usage = get_session_budget().usage()
+            session_usage = budget_usage['sessions'].get(session_id_from_state(st.session_state))
+            if session_usage:
+                st.caption(
+                    f"🧠 会话内存：本会话 {session_usage['resident_bytes'] / (1024 * 1024):.1f}MB"
+                    f" / 上限 {budget_usage['session_bytes'] / (1024 * 1024):.0f}MB，"
+                    f"全部会话 {budget_usage['resident_bytes'] / (1024 * 1024):.1f}MB"
+                )
+        except Exception:
+            pass
         
         # 转换按钮
         st.markdown("---")
         st.markdown("### 🚀 开始转换")
         
+        # 后台转换任务需要片段轮询（st.fragment），不可用时在脚本线程中同步转换
+        jobs_available = getattr(st, 'fragment', None) is not None
+        progressive = jobs_available and st.checkbox(
+            "⚡ 渐进预览", value=True, key="progressive_preview",
+            help="先显示低分辨率预览，完整质量的GIF在后台生成，完成后自动替换预览"
+        )
+        
         col_btn1, col_btn2, col_btn3 = st.columns([2, 1, 1])
         
         with col_btn1:
@@ -2567,63 +2262,41 @@ def run_main_app():
                 # 创建输出文件名
                 output_filename = f"{uploaded_file.name.rsplit('.', 1)[0]}.gif"
                 
-                # 显示转换进度
-                with st.spinner("🔄 正在转换视频为GIF..."):
-                    gif_data = convert_video_to_gif(
-                        input_path, 
-                        st.session_state.conversion_params,
-                        st.session_state.size_constraint
-                    )
-                    
-                    if gif_data:
-                        st.session_state.gif_data = gif_data
-                        
-                        # 分模块展示结果
-                        st.markdown('<div class="success-card">', unsafe_allow_html=True)
-                        st.success("✅ 转换完成！")
-                        st.balloons()
-                        
-                        # 转换完成后的信息模块
-                        st.markdown("### 📊 转换结果")
-                        col_info1, col_info2 = st.columns(2)
-                        with col_info1:
-                            gif_size = len(gif_data) / (1024 * 1024)
-                            gif_size_kb = len(gif_data) / 1024
-                            
-                            if gif_size >= 1:
-                                size_display = f"{gif_size:.2f} MB"
-                            else:
-                                size_display = f"{gif_size_kb:.1f} KB"
-                            
-                            st.metric("📊 输出文件大小", size_display)
+                if jobs_available:
+                    try:
+                        start_conversion_job(
+                            video_info, input_path, st.session_state.conversion_params,
+                            st.session_state.size_constraint, output_filename, preview=progressive
+                        )
+                    except JobQueueFull as e:
+                        st.warning(f"⚠️ {str(e)}")
+                else:
+                    # 显示转换进度
+                    with st.spinner("🔄 正在转换视频为GIF..."):
+                        gif_data = convert_video_to_gif(
+                            input_path, 
+                            st.session_state.conversion_params,
+                            st.session_state.size_constraint
+                        )
                         
-                        with col_info2:
-                            # 获取GIF分辨率信息
+                        gif_output = None
+                        if gif_data:
                             try:
-                                gif_buffer = io.BytesIO(gif_data)
-                                with Image.open(gif_buffer) as img:
-                                    st.metric("📐 输出文件分辨率", f"{img.width}×{img.height}")
+                                gif_output = save_gif_output(gif_data, output_filename)
                             except Exception as e:
-                                st.metric("📐 输出文件分辨率", "未知")
+                                st.error(f"❌ 保存转换结果失败: {str(e)}")
+                            # 字节只在本次运行中使用，会话状态只保留磁盘上的文件句柄
+                            del gif_data
+                        st.session_state.gif_output = gif_output
                         
-                        # 下载模块
-                        st.markdown("### 📥 下载")
-                        try:
-                            st.download_button(
-                                label="📥 下载GIF文件",
-                                data=gif_data,
-                                file_name=output_filename,
-                                mime="image/gif",
-                                use_container_width=True,
-                                type="primary",
-                                help="点击下载转换完成的GIF文件"
-                            )
-                        except Exception as e:
-                            st.error(f"❌ 下载文件失败: {str(e)}")
-                        st.markdown('</div>', unsafe_allow_html=True)
-                    else:
-                        st.error("❌ 转换失败")
-                        st.info("💡 请检查视频文件格式或调整参数")
+                        if gif_output:
+                            render_conversion_result(gif_output)
+                        else:
+                            st.error("❌ 转换失败")
+                            st.info("💡 请检查视频文件格式或调整参数")
+            
+            if jobs_available:
+                render_conversion_job()
         
         with col_btn2:
             st.markdown("""